@@ -0,0 +1,260 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""Measures the throughput of the CLI at scale: generates valid and invalid
+sources of truth of each size for each bundled model, validates each with
+`CLI.run` in a new interpreter, and writes the rows per second, peak RSS and
+time per stage of each run to a JSON results file.  With `--compare`, the
+change in rows per second from an earlier results file is printed.
+
+Usage, from the root of the repository:
+```
+python benchmarks/scale.py [--rows N ...] [--models MODULE ...]
+    [--data-dir DIR] [--results FILE] [--compare FILE] [-- CLI ARGS]
+```
+
+Arguments after `--`, such as `--workers 4` or `--reader arrow`, are passed
+to the CLI of each run.  Sources are generated in `--data-dir`, and reused by
+later runs with the same directory; 10 million rows of a model take up to
+5 GB for both sources.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Iterator, Optional
+
+# Bundled models and a valid and an invalid source of truth for each
+MODELS = {
+    'models/cluster_registry.py': (
+        'sources_of_truth/cluster_registry/cluster_reg_sot_valid.csv',
+        'sources_of_truth/cluster_registry/cluster_reg_sot_invalid.csv'),
+    'models/platform.py': (
+        'sources_of_truth/platform/platform_valid.csv',
+        'sources_of_truth/platform/platform_invalid.csv'),
+    'models/example_model.py': (
+        'sources_of_truth/example/valid.csv',
+        'sources_of_truth/example/invalid.csv'),
+}
+
+ROWS = [10_000, 1_000_000, 10_000_000]
+
+# In invalid sources, one row in `INVALID_EVERY` is a row of the model's
+# invalid source of truth, and one in `DUPLICATE_EVERY` repeats the cluster
+# name of the row before it
+INVALID_EVERY = 100
+DUPLICATE_EVERY = 1000
+
+
+def generate_rows(valid: list[dict[str, str]], invalid: list[dict[str, str]],
+                  rows: int) -> Iterator[dict[str, str]]:
+    """Cycles through the rows of a valid source of truth, with a distinct
+    cluster name for each, and through those of an invalid one if given"""
+    for i in range(rows):
+        if invalid and i % INVALID_EVERY == INVALID_EVERY - 1:
+            row = invalid[i // INVALID_EVERY % len(invalid)]
+        else:
+            row = valid[i % len(valid)]
+        name = i - 1 if invalid and i % DUPLICATE_EVERY == 1 else i
+        yield dict(row, cluster_name=f'cluster{name}')
+
+
+def generate_source(path: str, module: str, rows: int,
+                    invalid: bool) -> None:
+    """Writes a source of truth of `rows` rows for a bundled model, unless
+    one was written already"""
+    if os.path.exists(path):
+        return
+    sources = []
+    for source in MODELS[module][:2 if invalid else 1]:
+        with open(source, newline='', encoding='utf-8') as f:
+            sources.append(list(csv.DictReader(f)))
+    fieldnames = list(sources[0][0])
+    with open(f'{path}.tmp', 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(generate_rows(
+            sources[0], sources[1] if invalid else [], rows))
+    os.replace(f'{path}.tmp', path)
+
+
+def run_one(module: str, source: str, cli_args: list[str]) -> dict[str, Any]:
+    """Validates a source in this interpreter, which should do nothing else
+
+    Returns:
+        exit code, time per stage in seconds and peak RSS in bytes
+    """
+    # pylint: disable=import-outside-toplevel
+    stages = {}
+    start = time.perf_counter()
+    from csv_validator.arguments import parse_args
+    from csv_validator.cli import run_validation
+    from csv_validator.loader import load_validator_model
+    stages['import'] = time.perf_counter() - start
+
+    # Log records are formatted as by the CLI, but not printed
+    logger = logging.getLogger('scale')
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        handler = logging.StreamHandler(devnull)
+        handler.setFormatter(logging.Formatter('%(levelname)-7s %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+        args = parse_args([source, '-m', module, *cli_args])
+        start = time.perf_counter()
+        model = load_validator_model(args.validator_module, logger)
+        stages['load_model'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        exit_code = run_validation(args, logger, model)
+        stages['validate'] = time.perf_counter() - start
+
+    return {'exit_code': exit_code, 'stages': stages,
+            'peak_rss': peak_rss(resource.RUSAGE_SELF),
+            'peak_rss_workers': peak_rss(resource.RUSAGE_CHILDREN)}
+
+
+def peak_rss(who: int) -> int:
+    """Returns the peak RSS of this process, or of the largest of its
+    terminated child processes, in bytes"""
+    # Kilobytes on Linux, bytes on macOS
+    rss = resource.getrusage(who).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def measure(module: str, source: str, rows: int,
+            cli_args: list[str]) -> dict[str, Any]:
+    """Validates a source with `run_one` in a new interpreter
+
+    Returns:
+        result of the run
+    """
+    process = subprocess.run(
+        [sys.executable, __file__, '--run-one', module, source, '--',
+         *cli_args], capture_output=True, text=True, check=True)
+    result = json.loads(process.stdout)
+    seconds = sum(result['stages'].values())
+    result.update(rows_per_second=rows / result['stages']['validate'],
+                  seconds=seconds)
+    return result
+
+
+def commit() -> Optional[str]:
+    """Returns the commit checked out in the working directory, if any"""
+    process = subprocess.run(['git', 'rev-parse', 'HEAD'],
+                             capture_output=True, text=True, check=False)
+    return process.stdout.strip() or None
+
+
+def case(result: dict[str, Any]) -> tuple[str, str, int]:
+    """Returns what identifies the run of a result across results files"""
+    return result['model'], result['variant'], result['rows']
+
+
+def run_all(args: argparse.Namespace,
+            baseline: dict[tuple[str, str, int], dict[str, Any]]
+            ) -> list[dict[str, Any]]:
+    """Generates each source and validates it, printing each result
+
+    Returns:
+        results of the runs
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tempdir:
+        data_dir = args.data_dir or tempdir
+        os.makedirs(data_dir, exist_ok=True)
+        print(f"{'model':<26} {'variant':<8} {'rows':>10} {'rows/s':>10} "
+              f"{'peak RSS':>10} {'load s':>7} {'run s':>8} {'change':>7}")
+        for module in args.models:
+            stem = os.path.splitext(os.path.basename(module))[0]
+            for rows in args.rows:
+                for variant in ('valid', 'invalid'):
+                    source = os.path.join(data_dir,
+                                          f'{stem}_{variant}_{rows}.csv')
+                    generate_source(source, module, rows, variant == 'invalid')
+                    result = {'model': module, 'variant': variant,
+                              'rows': rows,
+                              **measure(module, source, rows, args.cli_args)}
+                    results.append(result)
+                    print_result(stem, result, baseline.get(case(result)))
+    return results
+
+
+def print_result(stem: str, result: dict[str, Any],
+                 earlier: Optional[dict[str, Any]]) -> None:
+    """Prints a result, and its change in rows per second from an earlier
+    result of the same run if any"""
+    change = ''
+    if earlier is not None:
+        change = \
+            f"{result['rows_per_second'] / earlier['rows_per_second'] - 1:+.1%}"
+    print(f"{stem:<26} {result['variant']:<8} {result['rows']:>10} "
+          f"{result['rows_per_second']:>10.0f} "
+          f"{max(result['peak_rss'], result['peak_rss_workers']) / 2 ** 20:>7.0f}"
+          f" MB {result['stages']['load_model']:>7.3f} "
+          f"{result['stages']['validate']:>8.2f} {change:>7}")
+
+
+def main() -> None:
+    """Runs each benchmark and writes the results file"""
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('\n\n', maxsplit=1)[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=ROWS)
+    parser.add_argument('--models', nargs='+', default=list(MODELS),
+                        choices=list(MODELS))
+    parser.add_argument('--data-dir',
+                        help='directory to keep generated sources in')
+    parser.add_argument('--results', help='results file to write; defaults '
+                        'to scale-<commit>.json')
+    parser.add_argument('--compare', help='earlier results file')
+    parser.add_argument('--run-one', nargs=2, metavar=('MODULE', 'SOURCE'),
+                        help=argparse.SUPPRESS)
+    parser.add_argument('cli_args', nargs='*', metavar='CLI_ARGS')
+    args = parser.parse_args()
+
+    if args.run_one:
+        module, source = args.run_one
+        json.dump(run_one(module, source, args.cli_args), sys.stdout)
+        return
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = {case(result): result
+                        for result in json.load(f)['results']}
+
+    head = commit()
+    results = run_all(args, baseline)
+
+    path = args.results or f'scale-{(head or "unknown")[:12]}.json'
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'commit': head, 'python': platform.python_version(),
+                   'platform': platform.platform(),
+                   'cli_args': args.cli_args, 'results': results},
+                  f, indent=2)
+    print(f'Results written to {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""Measures the cold start of the CLI, for `validate_csv --help` and for a
+one-row source of truth, and fails if either is over its budget.  Over
+budget, the slowest imports reported by `python -X importtime` are listed.
+
+Usage, from the root of the repository:
+```
+python benchmarks/startup.py [--repeat N] [--help-budget S] [--row-budget S]
+```
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Budgets for the cold start of each command, in seconds.  `--help` imports
+# nothing but the standard library; a one-row source imports pydantic and
+# the internal model, but not pyarrow.
+HELP_BUDGET = 0.15
+ROW_BUDGET = 0.4
+
+# Number of imports listed when a command is over budget
+_SLOWEST_IMPORTS = 10
+
+_ONE_ROW = 'cluster_name,cluster_group,cluster_tags\nUS75911CLS01,prod-us,corp\n'
+
+
+def cold_start(args: list[str], repeat: int) -> float:
+    """Runs the CLI in a new interpreter
+
+    Returns:
+        fastest wall time in seconds
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-m', 'csv_validator', *args],
+                       capture_output=True, check=False)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def slowest_imports(args: list[str]) -> list[tuple[int, str]]:
+    """Runs the CLI with `-X importtime`
+
+    Returns:
+        (cumulative µs, module) of the slowest imports, slowest first
+    """
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-m', 'csv_validator', *args],
+        capture_output=True, text=True, check=False).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:_SLOWEST_IMPORTS]
+
+
+def main() -> int:
+    """Prints the cold start of each command against its budget
+
+    Returns:
+        exit code: 1 if any command is over budget
+    """
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('\n\n', maxsplit=1)[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--help-budget', type=float, default=HELP_BUDGET)
+    parser.add_argument('--row-budget', type=float, default=ROW_BUDGET)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        source = os.path.join(tempdir, 'one_row.csv')
+        with open(source, 'w', encoding='utf-8') as f:
+            f.write(_ONE_ROW)
+
+        over = False
+        print(f"{'command':<30} {'seconds':>8} {'budget':>8}")
+        for name, command, budget in [
+                ('validate_csv --help', ['--help'], args.help_budget),
+                ('validate_csv one_row.csv', [source], args.row_budget)]:
+            seconds = cold_start(command, args.repeat)
+            print(f'{name:<30} {seconds:>8.3f} {budget:>8.3f}')
+            if seconds > budget:
+                over = True
+                print('  over budget; slowest imports:')
+                for cumulative, module in slowest_imports(command):
+                    print(f'  {cumulative / 1e3:>10.1f} ms  {module}')
+    return 1 if over else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
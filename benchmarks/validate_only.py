@@ -0,0 +1,91 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""Measures the per-row saving of validating rows without constructing model
+instances (`BatchValidator(validate_only=True)`, used when no output CSV is
+requested) for each bundled model.
+
+Usage, from the root of the repository:
+```
+python benchmarks/validate_only.py [--rows N] [--repeat N]
+```
+"""
+import argparse
+import csv
+import time
+
+from csv_validator.defaults import DEFAULT_BATCH_SIZE
+from csv_validator.engine import BatchValidator
+from csv_validator.loader import get_validator_module
+from csv_validator.uniqueness import UniqueScope
+
+# Bundled models and a valid source of truth for each
+MODELS = {
+    'models/cluster_registry.py':
+        'sources_of_truth/cluster_registry/cluster_reg_sot_valid.csv',
+    'models/platform.py': 'sources_of_truth/platform/platform_valid.csv',
+    'models/example_model.py': 'sources_of_truth/example/valid.csv',
+}
+
+
+def load_rows(source: str, count: int) -> list[dict[str, str]]:
+    """Repeats the rows of a source of truth up to `count` rows, with a
+    distinct cluster name for each"""
+    with open(source, encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    return [dict(rows[i % len(rows)], cluster_name=f'cluster{i}')
+            for i in range(count)]
+
+
+def time_per_row(validator: BatchValidator, rows: list[dict[str, str]],
+                 repeat: int) -> float:
+    """Returns the best time of `repeat` runs to validate all rows, in
+    microseconds per row"""
+    best = float('inf')
+    for _ in range(repeat):
+        context = UniqueScope()
+        start = time.perf_counter()
+        for idx in range(0, len(rows), DEFAULT_BATCH_SIZE):
+            _, errors = validator.validate(
+                rows[idx:idx + DEFAULT_BATCH_SIZE], context=context)
+            assert not errors, errors
+        best = min(best, time.perf_counter() - start)
+    return best / len(rows) * 1e6
+
+
+def main() -> None:
+    """Prints the time per row with and without model instances"""
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('\n\n', maxsplit=1)[0])
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'model':<30} {'models µs/row':>14} {'validate-only':>14} "
+          f"{'saving':>8}")
+    for module, source in MODELS.items():
+        model = get_validator_module(module).SourceOfTruthModel
+        rows = load_rows(source, args.rows)
+        full = time_per_row(BatchValidator(model), rows, args.repeat)
+        fast = BatchValidator(model, validate_only=True)
+        assert fast.validate_only
+        fields = time_per_row(fast, rows, args.repeat)
+        print(f'{module:<30} {full:>14.2f} {fields:>14.2f} '
+              f'{(full - fields) / full:>8.1%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+"""Times each helper validator and annotated type through a pydantic
+`TypeAdapter`, on realistic and adversarial inputs, and writes the time per
+value of each to a JSON results file.  With `--compare`, the change from an
+earlier results file is printed, and the exit code is 1 if any case is
+slower by more than `--threshold`.
+
+Usage, from the root of the repository:
+```
+python benchmarks/validators.py [--values N] [--repeat N] [--results FILE]
+    [--compare FILE] [--threshold FRACTION]
+```
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Annotated, Any, Callable, NamedTuple
+
+import pydantic
+
+from csv_validator.helpers import (IP, EmailAddress, coerce_empty_str_to_none,
+                                   coerce_splt_commas_rtn_set_strs, unique,
+                                   validate_ipv4_address)
+from csv_validator.model import ClusterName, ClusterTags, OptionalStrippedStr
+from csv_validator.uniqueness import UniqueScope
+
+# Slowdown of a case from an earlier results file that fails the comparison
+THRESHOLD = 0.25
+
+# Inputs of a case, by label: a function of n returning n values
+Inputs = dict[str, Callable[[int], list[Any]]]
+
+
+class Case(NamedTuple):
+    """Helper or annotated type to time
+
+    Attributes:
+        name: name of the helper or type
+        annotation: function returning the type to validate values as, called
+            for each repeat so that `unique()` validators start empty
+        inputs: inputs to validate
+        context: whether values are validated with a `UniqueScope` as the
+            validation context, as the CLI does
+    """
+    name: str
+    annotation: Callable[[], Any]
+    inputs: Inputs
+    context: bool = True
+
+
+def _cycle(values: list[str]) -> Callable[[int], list[str]]:
+    """Returns inputs of n values cycling through `values`"""
+    return lambda n: [values[i % len(values)] for i in range(n)]
+
+
+def _plain(validator: Callable) -> Any:
+    """Returns a type validated by nothing but a helper validator"""
+    return Annotated[Any, pydantic.PlainValidator(validator)]
+
+
+def _names(n: int) -> list[str]:
+    return [f'US{i:05}CLS01' for i in range(n)]
+
+
+_IPS: Inputs = {
+    'address': lambda n: [f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}'
+                          for i in range(n)],
+    'cidr': _cycle(['10.128.0.0/10', '192.168.0.0/16', '142.3.16.153/32']),
+    'out of range': _cycle(['333.333.333.333', '10.0.0.256']),
+    'not an address': _cycle(['ham sandwich', '', '10.0.0', 'a.b.c.d/x']),
+    'long': _cycle(['1.' * 2000 + '1']),
+}
+
+_TAGS: Inputs = {
+    'few': _cycle(['corp,donotupgrade', 'corp', 'drivethruduallane,corp']),
+    'empty': _cycle(['']),
+    'many': _cycle([','.join(f' tag{i} ' for i in range(500))]),
+    'many repeated': _cycle([',,'.join(['corp'] * 1000)]),
+}
+
+_STRINGS: Inputs = {
+    'short': _cycle(['prod-us', ' prod-us ', 'de40d60db7817487611b7c2f4']),
+    'empty': _cycle(['']),
+    'long': _cycle([' ' * 100 + 'x' * 10_000 + ' ' * 100]),
+}
+
+CASES = [
+    Case('validate_ipv4_address', lambda: _plain(validate_ipv4_address),
+         _IPS),
+    Case('coerce_splt_commas_rtn_set_strs',
+         lambda: _plain(coerce_splt_commas_rtn_set_strs), _TAGS),
+    Case('coerce_empty_str_to_none', lambda: _plain(coerce_empty_str_to_none),
+         _STRINGS),
+    Case('unique()', lambda: _plain(unique()), {
+        'distinct': _names,
+        'duplicates': _cycle(['US75911CLS01']),
+        'long': lambda n: [f'{i}' + 'x' * 10_000 for i in range(n)],
+    }, context=False),
+    Case('unique() in a UniqueScope', lambda: _plain(unique()), {
+        'distinct': _names,
+        'duplicates': _cycle(['US75911CLS01']),
+    }),
+    Case('EmailAddress', lambda: EmailAddress, {
+        'valid': _cycle(['iam@some-domain.fun', ' first.last+tag@example.co ']),
+        'invalid': _cycle(['iam@', 'not an address', '@example.com']),
+        'long': _cycle(['a' * 10_000 + '@example.com']),
+        'long invalid': _cycle(['a.' * 5_000 + '@']),
+    }),
+    Case('IP', lambda: IP, _IPS),
+    Case('ClusterName', lambda: ClusterName, {
+        'distinct': _names,
+        'padded': lambda n: [f'  {name}  ' for name in _names(n)],
+        'duplicates': _cycle(['US75911CLS01']),
+        'too long': lambda n: [f'{i:010}' * 4 for i in range(n)],
+        'long': lambda n: [f'{i}' + 'x' * 10_000 for i in range(n)],
+    }),
+    Case('ClusterTags', lambda: ClusterTags, _TAGS),
+    Case('OptionalStrippedStr', lambda: OptionalStrippedStr, _STRINGS),
+]
+
+
+def time_case(case: Case, values: list[Any], repeat: int) -> tuple[float, int]:
+    """Validates each value with a new `TypeAdapter` of the case's type, the
+    best of `repeat` times
+
+    Returns:
+        nanoseconds per value, and the number of values that are invalid
+    """
+    best, errors = float('inf'), 0
+    for _ in range(repeat):
+        validate = pydantic.TypeAdapter(case.annotation()).validate_python
+        context = UniqueScope() if case.context else None
+        errors = 0
+        start = time.perf_counter_ns()
+        for value in values:
+            try:
+                validate(value, context=context)
+            except pydantic.ValidationError:
+                errors += 1
+        best = min(best, time.perf_counter_ns() - start)
+    return best / len(values), errors
+
+
+def main() -> int:
+    """Prints the time per value of each case and writes the results file
+
+    Returns:
+        exit code: 1 if any case is slower than in the compared results file
+    """
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('\n\n', maxsplit=1)[0])
+    parser.add_argument('--values', type=int, default=2_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--results', default='validators.json',
+                        help='results file to write')
+    parser.add_argument('--compare', help='earlier results file')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = {(result['case'], result['input']): result
+                        for result in json.load(f)['results']}
+
+    results = []
+    slower = False
+    print(f"{'case':<33} {'input':<15} {'ns/value':>10} {'invalid':>8} "
+          f"{'change':>7}")
+    for case in CASES:
+        for label, inputs in case.inputs.items():
+            ns, errors = time_case(case, inputs(args.values), args.repeat)
+            results.append({'case': case.name, 'input': label,
+                            'ns_per_value': ns, 'invalid': errors})
+            change = ''
+            earlier = baseline.get((case.name, label))
+            if earlier is not None:
+                ratio = ns / earlier['ns_per_value'] - 1
+                change = f'{ratio:+.1%}'
+                slower = slower or ratio > args.threshold
+            print(f'{case.name:<33} {label:<15} {ns:>10.0f} {errors:>8} '
+                  f'{change:>7}')
+
+    with open(args.results, 'w', encoding='utf-8') as f:
+        json.dump({'values': args.values, 'pydantic': pydantic.VERSION,
+                   'results': results}, f, indent=2)
+    return 1 if slower else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,461 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import argparse
+import math
+import os
+import pathlib
+from typing import IO, Optional, Self
+
+from csv_validator.defaults import (DEFAULT_BATCH_SIZE, DEFAULT_CACHE_SIZE,
+                                    DEFAULT_SUMMARY_TOP)
+
+
+class LazyFileType(argparse.FileType):
+    """Subclasses `argparse.FileType` in order to provide a way to lazily open
+    files for reading/writing from arguments.  Initializes the same as the
+    parent, but provides `open` method which returns the file object.
+
+    Usage:
+    ```
+    parser = argparse.ArgumentParser()
+    parser.add_argument('f', type=LazyFileType('w'))
+    args = parser.parse_args()
+
+    with args.f.open() as f:
+        for line in foo:
+            ...
+    ```
+
+    Provides an alternate constructor for use with the `default` kwarg to
+    `ArgumentParser.add_argument`.
+
+    Usage:
+    ```
+    parser.add_argument('-f', type=LazyFileType('w'),
+                        default=LazyFileType.default('some_file.txt')
+    ```
+    """
+
+    def __call__(self, string: str) -> Self:  # type: ignore
+        self.filename = string  # pylint: disable=attribute-defined-outside-init
+
+        if 'r' in self._mode or 'x' in self._mode:
+            if not pathlib.Path(self.filename).exists():
+                m = (f"can't open {self.filename}:  No such file or directory: "
+                     f"'{self.filename}'")
+                raise argparse.ArgumentTypeError(m)
+
+        return self
+
+    def open(self) -> IO:
+        """Opens and returns file for reading
+                :rtype: io.TextIOWrapper
+        """
+        return open(self.filename, self._mode, self._bufsize, self._encoding,
+                    self._errors)
+
+    @classmethod
+    def default(cls, string: str, **kwargs) -> Self:
+        """Alternate constructor for a default argument to argparse argument
+
+        Args:
+            string: filename to open
+            **kwargs: arguments to `__init__`
+
+        Returns:
+            instance of `LazyFileType`
+        """
+        inst = cls(**kwargs)
+        inst.filename = string  # pylint: disable=attribute-defined-outside-init
+        return inst
+
+
+def positive_int(string: str) -> int:
+    """Argument type for integers greater than zero
+
+    Args:
+        string: argument value
+
+    Returns:
+        value as int
+
+    Raises:
+        argparse.ArgumentTypeError: if value is not a positive integer
+    """
+    try:
+        value = int(string)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(
+            f"invalid positive int value: '{string}'") from e
+    if value < 1:
+        raise argparse.ArgumentTypeError(
+            f"invalid positive int value: '{string}'")
+    return value
+
+
+def positive_float(string: str) -> float:
+    """Argument type for a positive number
+
+    Args:
+        string: argument value
+
+    Returns:
+        value as float
+
+    Raises:
+        argparse.ArgumentTypeError: if value is not a positive number
+    """
+    try:
+        value = float(string)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(
+            f"invalid positive float value: '{string}'") from e
+    if not math.isfinite(value) or value <= 0:
+        raise argparse.ArgumentTypeError(
+            f"invalid positive float value: '{string}'")
+    return value
+
+
+# Suffixes accepted by `byte_size`
+_SIZE_SUFFIXES = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def byte_size(string: str) -> int:
+    """Argument type for a number of bytes, optionally with a K, M or G
+    suffix for KiB, MiB or GiB
+
+    Args:
+        string: argument value
+
+    Returns:
+        value in bytes as int
+
+    Raises:
+        argparse.ArgumentTypeError: if value is not a positive size
+    """
+    multiplier = 1
+    number = string.strip()
+    suffix = number[-1:].upper()
+    if suffix in _SIZE_SUFFIXES:
+        multiplier = _SIZE_SUFFIXES[suffix]
+        number = number[:-1]
+    try:
+        value = int(number) * multiplier
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(
+            f"invalid size value: '{string}'") from e
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"invalid size value: '{string}'")
+    return value
+
+
+def add_validation_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adds the arguments for how sources of truth are validated, shared by
+    the CLI and its `batch` mode
+
+    Args:
+        parser: argument parser
+    """
+    parser.add_argument(
+        '--batch-size',
+        metavar='N',
+        type=positive_int,
+        default=DEFAULT_BATCH_SIZE,
+        help='Number of CSV rows to validate per call to the validation '
+             f'model; default {DEFAULT_BATCH_SIZE}')
+    parser.add_argument(
+        '--memory-limit',
+        metavar='SIZE',
+        type=byte_size,
+        help='Memory to allow for checking fields validated with unique(), '
+             'in bytes or with a K, M or G suffix; past this, values are '
+             'checked by an external sort in temporary files and duplicates '
+             'are reported after all rows; not used with --max-errors or '
+             '--max-error-rate; default no limit')
+    parser.add_argument(
+        '--dictionary-encode',
+        action='store_true',
+        help='Validate each distinct value of fields with validator functions '
+             'or enums once, reusing the result for later rows with the same '
+             'value; fields whose validators depend on other fields or on '
+             'earlier rows, such as unique(), are validated on every row')
+    parser.add_argument(
+        '--columnar',
+        action='store_true',
+        help='Check the length, pattern, whitespace and case constraints of '
+             'string fields a column at a time with pyarrow; requires the '
+             'columnar extra')
+    parser.add_argument(
+        '--reader',
+        choices=('csv', 'arrow'),
+        default='csv',
+        help="Parser for the rows of the source CSV; 'arrow' parses them with "
+             "pyarrow's streaming CSV reader where that gives the same rows "
+             "and line numbers as the csv module, and falls back to the csv "
+             "module otherwise; it is not faster than the csv module, as "
+             "rows are converted to dicts for validation; requires the "
+             "columnar extra; default csv")
+    parser.add_argument(
+        '--cache-dir',
+        metavar='DIR',
+        help='Directory to cache results in; a later run of an unchanged '
+             'source with the same model and options replays the cached '
+             'result and output, and without -o or --workers, rows known to '
+             'be valid are not validated again, though values of fields '
+             'validated with unique() are still checked across all rows')
+    parser.add_argument(
+        '--since',
+        metavar='REV',
+        help='Validate only the rows added or changed since the git revision '
+             'REV of the source, presuming the source was valid at REV; '
+             'values of fields validated with unique() are still checked '
+             'across all rows, and all rows are validated if the model has '
+             'changed since REV; not used with -o or --workers')
+    parser.add_argument(
+        '--cache-size',
+        metavar='SIZE',
+        type=byte_size,
+        default=DEFAULT_CACHE_SIZE,
+        help='Most space taken by cached results in --cache-dir, in bytes or '
+             'with a K, M or G suffix; the results used least recently are '
+             'evicted past this; default 1G')
+    parser.add_argument(
+        '--max-errors',
+        metavar='N',
+        type=positive_int,
+        help='Stop reading the source after the row with its Nth error, '
+             'e.g. 1 to stop at the first invalid row')
+    parser.add_argument(
+        '--max-error-rate',
+        metavar='P',
+        type=positive_float,
+        help='Stop reading the source once it has more than P errors per '
+             'row, counting its rows as the lines after the header, e.g. '
+             '0.01 to stop after 1 error in 100 rows')
+    parser.add_argument(
+        '--summary',
+        action='store_true',
+        help='Count the errors found in rows by column and error type, and '
+             'the values with the most errors in each column, in constant '
+             'memory, and log a table of them at the end rather than logging '
+             'each error')
+    parser.add_argument(
+        '--summary-top',
+        metavar='K',
+        type=positive_int,
+        default=DEFAULT_SUMMARY_TOP,
+        help='Number of values with the most errors to report for each '
+             f'column with --summary; default {DEFAULT_SUMMARY_TOP}')
+
+
+def check_validation_arguments(parser: argparse.ArgumentParser,
+                               args: argparse.Namespace) -> None:
+    """Checks the combinations of the arguments added by
+    `add_validation_arguments`, exiting with a usage error if one isn't used
+
+    Args:
+        parser: parser the arguments were parsed with
+        args: parsed arguments
+    """
+    if args.memory_limit is not None and (
+            args.max_errors is not None or args.max_error_rate is not None):
+        # Duplicates checked by the external sort are only found after the
+        # last row, past where reading would have stopped
+        parser.error('--max-errors and --max-error-rate are not used with '
+                     '--memory-limit')
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    """
+    Constructs an argument parser, parses args, and returns the arg namespace.
+    Args:
+        argv: arguments to parse; default those of the process
+    Returns:
+        object: argparse.Namespace.
+    """
+    parser = argparse.ArgumentParser(
+        description='Validate source of truth CSV schemas and data using '
+                    'built-in and dynamically-imported validation models')
+    parser.add_argument(
+        'source',
+        metavar='SOURCE_OF_TRUTH.CSV',
+        type=LazyFileType(),
+        default=LazyFileType('source_of_truth.csv'),
+        help='Path to source of truth CSV file')
+    parser.add_argument(
+        '-m', '--validator-module',
+        metavar='MODULE_OR_PYTHON_FILE',
+        help='Module name or path to Python file containing source of truth '
+             'model; if not provided, only the required default columns are '
+             'validated using the internal validation model')
+    parser.add_argument(
+        '-o', '--output',
+        metavar='output_source_of_truth.csv',
+        type=LazyFileType(mode='w'),
+        help='Optional file to dump validated, normalized data output from '
+             'the validation model as CSV')
+    parser.add_argument(
+        '-v', '--verbose',
+        action='count',
+        help='increase output verbosity; -vv for max verbosity',
+        default=0)
+    parser.add_argument(
+        '--workers',
+        metavar='N',
+        type=positive_int,
+        default=1,
+        help='Number of processes to validate rows with; the source CSV is '
+             'split into shards on record boundaries which are validated in '
+             'parallel; default 1')
+    add_validation_arguments(parser)
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Log the time spent in each stage of validation, such as '
+             'parsing rows, validating them and writing the output CSV, and '
+             'in the validator functions of each field of the model, slowest '
+             'first; with --workers, the time spent validating shards in the '
+             'workers is counted as one stage')
+    parser.add_argument(
+        '--profile-output',
+        metavar='FILE',
+        help='Write a cProfile profile of the run to FILE, to read with the '
+             'pstats module; implies --profile')
+    parser.add_argument(
+        '--row-latency',
+        action='store_true',
+        help='Time the validation of each row, validating rows one at a time '
+             'rather than in batches, and log the 50th, 90th and 99th '
+             'percentiles and the maximum; rows found in the cache or '
+             'unchanged since --since are not timed; not used with --workers')
+    parser.add_argument(
+        '--slow-row-ms',
+        metavar='MS',
+        type=positive_float,
+        help='Log a warning for each row that takes longer than MS '
+             'milliseconds to validate, with the field that took longest; '
+             'implies --row-latency')
+    parser.add_argument(
+        '--errors-format',
+        choices=('text', 'ndjson'),
+        default='text',
+        help="Format of the errors found in rows; 'ndjson' writes them to "
+             "--errors-file as a JSON object per line, with the line, "
+             "cluster_name, column, type, message and input of each error, "
+             "rather than logging them; default text")
+    parser.add_argument(
+        '--errors-file',
+        metavar='PATH',
+        help='File to write errors to with --errors-format ndjson')
+    parser.add_argument(
+        '--socket',
+        metavar='PATH',
+        help='Validate with the daemon started by `validate_csv serve '
+             '--socket PATH`, which keeps models loaded between runs, rather '
+             'than in this process; if the daemon can\'t be reached, the '
+             'source is validated in this process')
+    args = parser.parse_args(argv)
+    if (args.errors_format == 'ndjson') != (args.errors_file is not None):
+        parser.error('--errors-file is required with, and only used with, '
+                     '--errors-format ndjson')
+    if args.summary and args.errors_format == 'ndjson':
+        parser.error('--summary is not used with --errors-format ndjson')
+    check_validation_arguments(parser, args)
+    return args
+
+
+def parse_serve_args(argv: Optional[list[str]] = None) \
+        -> argparse.Namespace:
+    """
+    Constructs the argument parser of `validate_csv serve`, parses args, and
+    returns the arg namespace.
+    Args:
+        argv: arguments to parse, after `serve`
+    Returns:
+        object: argparse.Namespace.
+    """
+    parser = argparse.ArgumentParser(
+        prog='validate_csv serve',
+        description='Run a daemon which validates sources of truth for '
+                    '`validate_csv --socket PATH`, keeping their models '
+                    'loaded between runs')
+    parser.add_argument(
+        '--socket',
+        metavar='PATH',
+        required=True,
+        help='Path to create the daemon\'s Unix socket at')
+    parser.add_argument(
+        '-v', '--verbose',
+        action='count',
+        help='increase output verbosity',
+        default=0)
+    return parser.parse_args(argv)
+
+
+def parse_batch_args(argv: Optional[list[str]] = None) \
+        -> argparse.Namespace:
+    """
+    Constructs the argument parser of `validate_csv batch`, parses args, and
+    returns the arg namespace.
+    Args:
+        argv: arguments to parse, after `batch`
+    Returns:
+        object: argparse.Namespace.
+    """
+    parser = argparse.ArgumentParser(
+        prog='validate_csv batch',
+        description='Validate many source of truth CSVs in a pool of worker '
+                    'processes, each loading each model once, and summarize '
+                    'the results')
+    parser.add_argument(
+        'sources',
+        metavar='GLOB',
+        nargs='*',
+        help='Paths or glob patterns of source of truth CSVs to validate '
+             'with the model of -m; ** matches any number of directories')
+    parser.add_argument(
+        '-m', '--validator-module',
+        metavar='MODULE_OR_PYTHON_FILE',
+        help='Module name or path to Python file containing the source of '
+             'truth model for GLOBs; if not provided, the internal validation '
+             'model is used')
+    parser.add_argument(
+        '--manifest',
+        metavar='FILE',
+        help='JSON file mapping validator modules to lists of paths or glob '
+             'patterns of the sources to validate with them, e.g. '
+             '{"models/platform.py": ["sources_of_truth/platform/*.csv"]}; '
+             'relative paths are relative to the manifest, and "" is the '
+             'internal validation model')
+    parser.add_argument(
+        '-v', '--verbose',
+        action='count',
+        help='increase output verbosity; -vv for max verbosity',
+        default=0)
+    parser.add_argument(
+        '--jobs',
+        metavar='N',
+        type=positive_int,
+        default=os.cpu_count() or 1,
+        help='Number of worker processes to validate sources with; default '
+             'the number of CPUs')
+    add_validation_arguments(parser)
+    args = parser.parse_args(argv)
+    if not args.sources and args.manifest is None:
+        parser.error('no sources given; pass GLOBs or --manifest')
+    check_validation_arguments(parser, args)
+    return args
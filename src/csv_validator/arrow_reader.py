@@ -0,0 +1,249 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import codecs
+import csv
+import logging
+import mmap
+import re
+from typing import IO, Iterator, Optional
+
+from csv_validator.parallel import LITERAL_QUOTE, QUOTED_FIELD
+
+try:
+    import pyarrow as pa  # type: ignore[import-untyped]
+    import pyarrow.compute as pc  # type: ignore[import-untyped]
+    import pyarrow.csv as pa_csv  # type: ignore[import-untyped]
+except ImportError:  # pragma: no cover
+    pa = pc = pa_csv = None
+
+# pylint: disable=no-member
+# pyarrow's compute functions are generated when it is imported
+
+# A source which `csv.reader` reads without error in strict mode: quoted
+# fields are closed, and their closing quote is followed by a delimiter or
+# the end of the record.  pyarrow accepts more than this, e.g. `"a"b` as `ab`.
+_STRICT_RECORDS = re.compile(
+    rb'(?:' + QUOTED_FIELD + rb'(?=[,\r\n]|\Z)|[^"]++|' + LITERAL_QUOTE
+    + rb')*+')
+
+# As `_STRICT_RECORDS`, for a source whose quoted fields don't span lines, so
+# that each record is a single line
+_SINGLE_LINE_RECORDS = re.compile(
+    rb'(?:(?<![^,\n])"(?:[^"\r\n]++|"")*+"(?=[,\r\n]|\Z)|[^"]++|'
+    + LITERAL_QUOTE + rb')*+')
+
+# A carriage return that doesn't end a line with a newline; these end records
+# for pyarrow, but lines are counted by newlines
+_LONE_CARRIAGE_RETURN = re.compile(rb'\r(?!\n)')
+
+
+def open_reader(f: IO, path: str, logger: logging.Logger) -> csv.DictReader:
+    """Returns a reader for the rows of a source CSV which parses them with
+    pyarrow where it can, see `ArrowReader`.  Sources that pyarrow can't parse
+    as `csv.DictReader` would, as far as can be told without parsing them, are
+    read by `csv.DictReader` itself.
+
+    Args:
+        f: source CSV opened in text mode
+        path: path to the source CSV, for pyarrow to read
+        logger: logger for the choice of parser
+
+    Returns:
+        reader for the source
+    """
+    reason = _unsupported(path)
+    if reason is None:
+        return ArrowReader(f, path, logger)
+    logger.debug(f'Parsing source CSV with the csv module: {reason}')
+    return csv.DictReader(f, dialect='excel', strict=True)
+
+
+class ArrowReader(csv.DictReader):
+    """`csv.DictReader` which parses the rows of a source CSV with pyarrow's
+    streaming CSV reader, a block at a time.  The header is read by
+    `csv.DictReader` itself.
+
+    Rows are parsed by pyarrow only where the result is the same as that of
+    `csv.DictReader` in the 'excel' dialect in strict mode, with the same line
+    numbers: every record is a single line, there are no blank lines, every
+    row has a value for each field, and no value is longer than
+    `csv.field_size_limit()`.  Sources with quoting errors, blank lines or
+    values spanning lines should be read by `csv.DictReader` from the start
+    so that it reports them as usual; see `open_reader`.  Should pyarrow fail
+    to parse a block, or parse it differently, the rows from the start of
+    that block on are read by `csv.DictReader`.
+    """
+    _path: str
+    _encoding: str
+    _logger: logging.Logger
+    _rows: Optional[Iterator[dict[str, str]]]
+    _fallback: bool
+
+    def __init__(self, f: IO, path: str, logger: logging.Logger):
+        """
+        Args:
+            f: source CSV opened in text mode
+            path: path to the source CSV, for pyarrow to read
+            logger: logger for the choice of parser
+        """
+        super().__init__(f, dialect='excel', strict=True)
+        self._path = path
+        self._encoding = codecs.lookup(
+            getattr(f, 'encoding', None) or 'utf-8').name
+        self._logger = logger
+        self._rows = None
+        self._fallback = False
+
+    @property  # type: ignore[override]
+    def fieldnames(self) -> Optional[list[str]]:
+        # `csv.DictReader` resets `line_num` to that of its `csv.reader`,
+        # which only reads the header when rows are parsed by pyarrow
+        line_num = self.line_num
+        # pylint: disable-next=assignment-from-no-return
+        fieldnames = csv.DictReader.fieldnames.fget(self)  # type: ignore
+        if self._rows is not None and not self._fallback:
+            self.line_num = line_num
+        return fieldnames
+
+    @fieldnames.setter
+    def fieldnames(self, value: list[str]) -> None:
+        csv.DictReader.fieldnames.fset(self, value)  # type: ignore
+
+    def __next__(self) -> dict[str, str]:
+        if self._rows is None and not self._fallback:
+            self._rows = self._read()
+            self._fallback = self._rows is None
+        if not self._fallback:
+            assert self._rows is not None
+            try:
+                return next(self._rows)
+            except StopIteration:
+                # pyarrow stopped short of the end of the source
+                if not self._fallback:
+                    raise
+        return super().__next__()
+
+    def _read(self) -> Optional[Iterator[dict[str, str]]]:
+        """Starts parsing the rows of the source with pyarrow
+
+        Returns:
+            iterator over rows, or None if the rows should be read by
+            `csv.DictReader`
+        """
+        if not self.fieldnames:
+            return None
+        columns = [f'f{idx}' for idx in range(len(self.fieldnames))]
+        try:
+            # Parses the first block
+            batches = pa_csv.open_csv(
+                self._path,
+                read_options=pa_csv.ReadOptions(
+                    column_names=columns, skip_rows=1,
+                    encoding='utf8' if self._encoding == 'utf-8'
+                    else self._encoding),
+                convert_options=pa_csv.ConvertOptions(
+                    column_types=dict.fromkeys(columns, pa.string()),
+                    strings_can_be_null=False))
+        except (pa.ArrowInvalid, UnicodeDecodeError) as e:
+            # Ragged rows, or not valid in the source's encoding
+            self._logger.debug(f'Parsing source CSV with the csv module: '
+                               f'{str(e).splitlines()[0]}')
+            return None
+
+        self._logger.debug('Parsing source CSV with pyarrow')
+        return self._rows_from(batches)
+
+    def _rows_from(self, batches: 'pa_csv.CSVStreamingReader') \
+            -> Iterator[dict[str, str]]:
+        """Converts the rows of record batches parsed by pyarrow to dicts as
+        returned by `csv.DictReader`, keeping `line_num` up to date.  Stops
+        at a batch that pyarrow can't parse as `csv.DictReader` would, once
+        the `csv.reader` has skipped the rows before it."""
+        fieldnames = list(self.fieldnames or ())
+        limit = csv.field_size_limit()
+        # Every record is a single line
+        line_num = self.reader.line_num
+        while True:
+            try:
+                batch = batches.read_next_batch()
+            except StopIteration:
+                return
+            except (pa.ArrowInvalid, UnicodeDecodeError) as e:
+                reason: Optional[str] = str(e).splitlines()[0]
+            else:
+                reason = _mismatch(batch, limit)
+            if reason is not None:
+                self._logger.debug(f'Parsing source CSV with the csv module '
+                                   f'from line {line_num + 1}: {reason}')
+                batches.close()
+                self._fallback = True
+                while self.reader.line_num < line_num:
+                    if next(self.reader, None) is None:
+                        break
+                return
+            columns = [column.to_pylist() for column in batch.columns]
+            for values in zip(*columns):
+                line_num += 1
+                self.line_num = line_num
+                yield dict(zip(fieldnames, values))
+
+
+def _unsupported(path: str) -> Optional[str]:
+    """Checks a source for anything pyarrow can't parse as `csv.DictReader`
+    would, without parsing it
+
+    Returns:
+        why the source can't be parsed by pyarrow, or None
+    """
+    if pa is None:
+        return 'pyarrow is not installed'
+    with open(path, 'rb') as f:
+        if not f.seek(0, 2):
+            return 'empty'
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm.find(b'"') >= 0 and not _SINGLE_LINE_RECORDS.fullmatch(
+                    mm):  # type: ignore[call-overload]
+                if not _STRICT_RECORDS.fullmatch(
+                        mm):  # type: ignore[call-overload]
+                    return 'quoting error'
+                return 'values with newlines'
+            if _LONE_CARRIAGE_RETURN.search(
+                    mm):  # type: ignore[call-overload]
+                return 'carriage return without newline'
+            # `csv.reader` skips blank lines, but counts them
+            if mm[:1] == b'\n' or mm[:2] == b'\r\n' or \
+                    mm.find(b'\n\n') >= 0 or mm.find(b'\n\r\n') >= 0:
+                return 'blank lines'
+    return None
+
+
+def _mismatch(batch: 'pa.RecordBatch', limit: int) -> Optional[str]:
+    """Checks a batch of rows parsed by pyarrow for values that
+    `csv.DictReader` would parse differently
+
+    Args:
+        batch: rows parsed by pyarrow
+        limit: `csv.field_size_limit()`
+
+    Returns:
+        why the rows don't match, or None
+    """
+    for column in batch.columns:
+        longest = pc.max(pc.binary_length(column)).as_py()
+        if longest is not None and longest > limit:
+            return 'value longer than the field size limit'
+    return None
@@ -0,0 +1,245 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, NamedTuple, Optional
+
+from csv_validator.arguments import LazyFileType
+from csv_validator.loader import ModelCache, Runner
+from csv_validator.logs import flush_logs
+from csv_validator.parallel import RecordCollector
+
+# Status of a source of truth by the exit code of validating it
+_STATUSES = {0: 'valid', -1: 'invalid'}
+
+
+class Source(NamedTuple):
+    """A source of truth to validate in a batch"""
+    path: str
+    # module name or path to Python file, or None for the internal model
+    validator_module: Optional[str]
+    size: int
+
+
+class SourceResult(NamedTuple):
+    """Result of validating a source of truth in a batch"""
+    source: Source
+    exit_code: int
+    seconds: float
+    # log records of validating the source
+    records: list[logging.LogRecord]
+
+
+def find_sources(args: argparse.Namespace) -> list[Source]:
+    """Finds the sources of truth of a batch, from the globs and manifest of
+    `validate_csv batch`
+
+    Args:
+        args: arguments of `validate_csv batch`
+
+    Returns:
+        sources, largest first
+
+    Raises:
+        ValueError: if the manifest can't be read, or a pattern matches no
+            files
+    """
+    patterns = [(args.validator_module, pattern) for pattern in args.sources]
+    if args.manifest is not None:
+        patterns.extend(read_manifest(args.manifest))
+
+    sources: dict[tuple[str, Optional[str]], Source] = {}
+    for module, pattern in patterns:
+        paths = [p for p in glob.glob(pattern, recursive=True)
+                 if os.path.isfile(p)]
+        if not paths:
+            raise ValueError(f"no files match '{pattern}'")
+        for path in paths:
+            key = (os.path.realpath(path), module)
+            if key not in sources:
+                sources[key] = Source(path=os.path.normpath(path),
+                                      validator_module=module,
+                                      size=os.path.getsize(path))
+    # The largest are started first, so that they don't finish last
+    return sorted(sources.values(), key=lambda s: (-s.size, s.path))
+
+
+def read_manifest(path: str) -> list[tuple[Optional[str], str]]:
+    """Reads a manifest mapping validator modules to lists of paths or glob
+    patterns of sources of truth, as a JSON object.  Relative paths are
+    relative to the manifest, and "" is the internal validation model.
+
+    Args:
+        path: path to the manifest
+
+    Returns:
+        (validator module, pattern) for each pattern
+
+    Raises:
+        ValueError: if the manifest can't be read
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"can't read manifest '{path}': {e}") from e
+    if not isinstance(manifest, dict) or not all(
+            isinstance(v, list) and all(isinstance(p, str) for p in v)
+            for v in manifest.values()):
+        raise ValueError(f"manifest '{path}' is not an object mapping "
+                         f"validator modules to lists of patterns")
+
+    base = os.path.dirname(path)
+    patterns: list[tuple[Optional[str], str]] = []
+    for module, module_patterns in manifest.items():
+        # A module name is imported as it is
+        module_path = os.path.join(base, module)
+        if module and os.path.isfile(module_path):
+            module = module_path
+        patterns.extend((module or None, os.path.join(base, pattern))
+                        for pattern in module_patterns)
+    return patterns
+
+
+def run_batch(args: argparse.Namespace, logger: logging.Logger,
+              run: Runner) -> int:
+    """Validates the sources of truth of a batch in a pool of `args.jobs`
+    worker processes, which keep the models they load.  The log of each
+    source is handled as it's validated, with messages prefixed by its path,
+    and a summary of all sources is written to standard output.
+
+    Args:
+        args: arguments of `validate_csv batch`
+        logger: logger
+        run: validates a source of truth
+
+    Returns:
+        CLI exit code as int: 1 if any source couldn't be validated, or else
+        -1 if any source is invalid, or else 0
+    """
+    try:
+        sources = find_sources(args)
+    except ValueError as e:
+        logger.error(f'Error finding sources: {e}')
+        return 1
+    logger.debug(f'Validating {len(sources)} sources with up to '
+                 f'{args.jobs} workers')
+
+    results = []
+    if args.jobs == 1 or len(sources) == 1:
+        _init_batch_worker(run, logger.getEffectiveLevel())
+        for source in sources:
+            results.append(_validate_source(source, args))
+            _handle_records(results[-1], logger)
+    else:
+        with ProcessPoolExecutor(
+                max_workers=min(args.jobs, len(sources)),
+                initializer=_init_batch_worker,
+                initargs=(run, logger.getEffectiveLevel())) as executor:
+            futures = [executor.submit(_validate_source, source, args)
+                       for source in sources]
+            for future in as_completed(futures):
+                results.append(future.result())
+                _handle_records(results[-1], logger)
+
+    _write_summary(results)
+    codes = {result.exit_code for result in results}
+    if codes - set(_STATUSES):
+        return 1
+    return -1 if -1 in codes else 0
+
+
+def _handle_records(result: SourceResult, logger: logging.Logger) -> None:
+    """Handles the log records of a source, prefixing them with its path"""
+    for record in result.records:
+        # Records are prepared by `RecordCollector`, with their message
+        # formatted already
+        record.msg = f'{result.source.path}: {record.msg}'
+        logger.handle(record)
+
+
+def _write_summary(results: list[SourceResult]) -> None:
+    """Writes the status of each source of a batch, by path, and a count of
+    each status to standard output, after the log lines of the sources"""
+    flush_logs()
+    counts = dict.fromkeys([*_STATUSES.values(), 'failed'], 0)
+    for result in sorted(results, key=lambda r: r.source.path):
+        status = _STATUSES.get(result.exit_code, 'failed')
+        counts[status] += 1
+        sys.stdout.write(f'{status:<8} {result.seconds:8.2f}s  '
+                         f'{result.source.path}\n')
+    sys.stdout.write(
+        f'{len(results)} sources: '
+        f'{', '.join(f'{count} {status}' for status, count in counts.items())}'
+        f'\n')
+
+
+# State of a batch worker process, set up by `_init_batch_worker`
+_batch_worker: dict[str, Any] = {}
+
+
+def _init_batch_worker(run: Runner, log_level: int) -> None:
+    """Initializer for batch worker processes.  Keeps the models loaded by
+    the process, and collects log records so that they may be returned to the
+    parent process.
+
+    Args:
+        run: validates a source of truth
+        log_level: effective level of the parent process' logger
+    """
+    collector = RecordCollector()
+    # Not registered with `logging.getLogger`, so that records are only
+    # collected
+    logger = logging.Logger('csv_validator.batch', log_level)
+    logger.addHandler(collector)
+    _batch_worker.update(run=run, models=ModelCache(), collector=collector,
+                         logger=logger)
+
+
+def _validate_source(source: Source, args: argparse.Namespace) \
+        -> SourceResult:
+    """Validates a source of truth of a batch in a worker process
+
+    Args:
+        source: source of truth to validate
+        args: arguments of `validate_csv batch`
+
+    Returns:
+        result of validating the source
+    """
+    models: ModelCache = _batch_worker['models']
+    collector: RecordCollector = _batch_worker['collector']
+    source_args = argparse.Namespace(**vars(args))
+    source_args.source = LazyFileType.default(source.path)
+    source_args.validator_module = source.validator_module
+    source_args.output = None
+    source_args.workers = 1
+    source_args.profile, source_args.profile_output = False, None
+    source_args.row_latency, source_args.slow_row_ms = False, None
+    source_args.errors_format, source_args.errors_file = 'text', None
+    start = time.perf_counter()
+    exit_code = models.validate(source_args, _batch_worker['logger'],
+                                _batch_worker['run'])
+    return SourceResult(source=source, exit_code=exit_code,
+                        seconds=time.perf_counter() - start,
+                        records=collector.drain())
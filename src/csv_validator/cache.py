@@ -0,0 +1,670 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import enum
+import hashlib
+import inspect
+import json
+import logging
+import marshal
+import os
+import pickle
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Hashable
+from typing import Any, Iterable, NamedTuple, Optional, Tuple, Type
+
+import pydantic
+
+from csv_validator.engine import BatchErrors, BatchValidator
+from csv_validator.uniqueness import UniqueCollector, UniqueValue
+
+# Name of the cache's database within the cache directory
+CACHE_FILE = 'rows.sqlite3'
+
+# Number of models whose rows are kept in the cache; the rows of the models
+# used least recently are deleted past this
+MAX_CACHED_MODELS = 8
+
+# Most rows looked up in a single query, well within SQLite's limit on the
+# number of parameters
+_LOOKUP_CHUNK_SIZE = 500
+
+# Valid rows buffered before they are written to the cache.  Rows are keyed
+# by digests in no particular order, so each write touches most pages of the
+# cache; fewer, larger writes are much faster.
+_WRITE_BUFFER_SIZE = 100_000
+
+# Bytes of the cache's database read through a memory map rather than by
+# system calls, which makes looking rows up a little faster
+_MMAP_SIZE = 256 * 1024 * 1024
+
+# Seconds to wait for another process writing to the cache
+_LOCK_TIMEOUT = 30
+
+# Addresses in the reprs of objects, and the ids that pydantic appends to the
+# references of models and enums in core schemas; neither is the same from
+# one process to the next
+_ADDRESS = re.compile(r' at 0x[0-9a-fA-F]+')
+_REF_ID = re.compile(r':\d+$')
+
+# Modules whose source is covered by the versions of Python and pydantic
+_VERSIONED_MODULES = sys.stdlib_module_names | {'pydantic', 'pydantic_core'}
+
+# Files of a result in a `ResultCache`
+_RESULT_FILE = 'result.json'
+_OUTPUT_FILE = 'output.csv'
+
+# Attributes of the log records kept in a `ResultCache`
+_RECORD_ATTRIBUTES = ('name', 'levelno', 'levelname', 'msg', 'line_num')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS models (
+    model TEXT PRIMARY KEY,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS valid_rows (
+    model TEXT NOT NULL,
+    row BLOB NOT NULL,
+    unique_values BLOB NOT NULL,
+    PRIMARY KEY (model, row)
+) WITHOUT ROWID;
+'''
+
+# Values of a row's unique fields, as (field, validated value)
+CachedValues = list[tuple[str, Hashable]]
+
+
+def model_fingerprint(model: Type[pydantic.BaseModel]) -> str:
+    """Returns a fingerprint of a model which changes whenever the model may
+    validate rows differently: a hash of its core schema, of the source of
+    the modules defining the model and the functions and classes in its
+    schema, and of the versions of Python and pydantic.
+
+    Validators whose results depend on anything but the row, such as the
+    current date or the contents of other files, aren't covered.
+
+    Args:
+        model: model rows are validated against
+
+    Returns:
+        hex digest
+    """
+    files: set[str] = set()
+    schema = _model_schema(model, files)
+    digest = hashlib.sha256()
+    digest.update(f'{sys.version}\n{pydantic.VERSION}\n'.encode())
+    digest.update(json.dumps(schema).encode())
+    # Sources are hashed without their paths, which differ between checkouts
+    for source in sorted(_file_source(path) for path in files):
+        digest.update(f'\n{len(source)}\n'.encode())
+        digest.update(source)
+    return digest.hexdigest()
+
+
+def model_source_files(model: Type[pydantic.BaseModel]) -> list[str]:
+    """Returns the paths to the source of the modules covered by the model's
+    `model_fingerprint`, but for those versioned with Python or pydantic
+
+    Args:
+        model: model rows are validated against
+
+    Returns:
+        list of paths
+    """
+    files: set[str] = set()
+    _model_schema(model, files)
+    return sorted(files)
+
+
+def _model_schema(model: Type[pydantic.BaseModel], files: set[str]) -> Any:
+    """Returns a model's core schema as data which is the same in every
+    process, adding the source files of the modules defining the model and
+    the functions and classes in its schema to `files`"""
+    _add_source_file(model, files)
+    return _stable(model.__pydantic_core_schema__, files)
+
+
+def _stable(obj: Any, files: set[str]) -> Any:
+    """Converts part of a core schema to JSON-serializable data which is the
+    same in every process, adding the source files of the modules which
+    define its functions and classes to `files`"""
+    if isinstance(obj, dict):
+        return {k: _REF_ID.sub('', v)
+                if k in ('ref', 'schema_ref') and isinstance(v, str)
+                else _stable(v, files) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_stable(v, files) for v in obj]
+    if isinstance(obj, enum.Enum):
+        _add_source_file(type(obj), files)
+        return repr(obj)
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+
+    func = getattr(obj, '__func__', obj)
+    module = getattr(func, '__module__', None)
+    _add_source_file(func, files)
+    name = getattr(func, '__qualname__', None)
+    if not isinstance(name, str):
+        return _ADDRESS.sub('', repr(obj))
+    # Arguments of validator factories, e.g. `max_length(5)`, live in the
+    # closures of the validators they return
+    closure = []
+    for cell in getattr(func, '__closure__', None) or ():
+        try:
+            value = cell.cell_contents
+        except ValueError:
+            continue
+        if value is None or isinstance(value, (bool, int, float, str)):
+            closure.append(value)
+    return [module, name, *closure]
+
+
+def _add_source_file(obj: Any, files: set[str]) -> None:
+    """Adds the path to the source of the module defining a function or
+    class to `files`, unless it is versioned with Python or pydantic or its
+    source can't be found"""
+    name = getattr(obj, '__module__', None)
+    if not isinstance(name, str):
+        name = ''
+    module = sys.modules.get(name)
+    code = getattr(obj, '__code__', None)
+    if code is not None:
+        path = code.co_filename
+    elif module is not None and _defines(module, obj):
+        path = _module_file(module)
+    else:
+        path = _class_file(obj)
+    if path is None or not os.path.isfile(path):
+        return
+    if module is not None and name.partition('.')[0] in _VERSIONED_MODULES \
+            and path == _module_file(module):
+        return
+    files.add(path)
+
+
+def _defines(module: Any, obj: Any) -> bool:
+    """Whether an object is found in a module by its qualified name"""
+    found = module
+    for part in getattr(obj, '__qualname__', '<>').split('.'):
+        found = getattr(found, part, None)
+    return found is obj
+
+
+def _class_file(obj: Any) -> Optional[str]:
+    """Returns the path to the source of a class by that of its methods, as
+    modules loaded from a path may not be in `sys.modules`, or may share
+    their name with another, or None if it has none"""
+    if not isinstance(obj, type):
+        return None
+    for value in vars(obj).values():
+        code = getattr(getattr(value, '__func__', value), '__code__', None)
+        if code is not None:
+            return code.co_filename
+    return None
+
+
+def _module_file(module: Any) -> Optional[str]:
+    """Returns the path to the source of a module, or None if it has none"""
+    try:
+        return inspect.getsourcefile(module)
+    except TypeError:
+        return None
+
+
+def _file_source(path: str) -> bytes:
+    """Returns the contents of a source file, or nothing if it can't be
+    read"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return b''
+
+
+def row_digests(rows: list[dict[str, str]]) -> list[bytes]:
+    """Returns a digest of the raw content of each of a batch of CSV rows,
+    field names included
+
+    Args:
+        rows: CSV rows as dicts in the form of {field_name: value}
+
+    Returns:
+        16-byte digest of each row
+    """
+    # Rows nearly always share their field names, which are hashed once.
+    # Version 0 of the marshal format is used as later versions mark interned
+    # and repeated strings, which depend on how the row was read.
+    headers: dict[tuple[str, ...], Any] = {}
+    digests = []
+    for row in rows:
+        fields = tuple(row)
+        header = headers.get(fields)
+        if header is None:
+            header = headers[fields] = hashlib.blake2b(
+                marshal.dumps(fields, 0), digest_size=16)
+        digest = header.copy()
+        digest.update(marshal.dumps(tuple(row.values()), 0))
+        digests.append(digest.digest())
+    return digests
+
+
+class KnownRows(ABC):
+    """Rows known to be valid against a model, which needn't be validated
+    again, with the values of their unique fields"""
+    # describes the rows, for logging how many rows were known
+    description = 'known to be valid'
+    hits: int
+    misses: int
+
+    @abstractmethod
+    def lookup(self, rows: list[dict[str, str]], digests: list[bytes]) \
+            -> list[Optional[CachedValues]]:
+        """Looks rows up
+
+        Args:
+            rows: CSV rows as dicts in the form of {field_name: value}
+            digests: digest of each row, see `row_digests`
+
+        Returns:
+            for each row, the values of its unique fields if it is known to
+            be valid, else None
+        """
+
+    def add(self, rows: Iterable[Tuple[bytes, CachedValues]]) -> None:
+        """Notes rows found to be valid; does nothing by default
+
+        Args:
+            rows: (digest, values of unique fields) of each row
+        """
+
+    def flush(self) -> None:
+        """Finishes noting the rows found to be valid by a run; does nothing
+        by default"""
+
+    def close(self) -> None:
+        """Releases what is held to note rows, once a run ends; does nothing
+        by default"""
+
+
+class RowCache(KnownRows):
+    """Rows of sources of truth known to be valid against a model, kept in an
+    SQLite database in a directory so that later runs needn't validate them
+    again.  Rows are keyed by their digest (see `row_digests`) and by the model's
+    `model_fingerprint`, so a row is validated again whenever it or the model
+    changes.  The values of each row's unique fields are kept with it, as
+    they still need to be checked against the values of other rows.
+
+    The cache may be shared by several models and by processes running at
+    the same time.  The rows of all but the `MAX_CACHED_MODELS` models used
+    most recently are deleted.  The cache is safe to delete between runs.
+    """
+    description = 'already known to be valid'
+    _path: str
+    # open connection to the database, if any
+    _db: Optional[sqlite3.Connection]
+    _model: str
+    # rows to be written, as (digest, pickled values of unique fields)
+    _pending: dict[bytes, bytes]
+
+    def __init__(self, directory: str, fingerprint: str):
+        """
+        Args:
+            directory: directory holding the cache, created if need be
+            fingerprint: fingerprint of the model rows are validated against
+
+        Raises:
+            OSError: if the directory can't be created
+            sqlite3.Error: if the cache can't be opened
+        """
+        os.makedirs(directory, exist_ok=True)
+        self._path = os.path.join(directory, CACHE_FILE)
+        self._db = None
+        self._model = fingerprint
+        self._pending = {}
+        self.hits = self.misses = 0
+        db = self._connect()
+        try:
+            with db:
+                db.execute('INSERT OR REPLACE INTO models VALUES (?, ?)',
+                           (fingerprint, time.time()))
+                stale = db.execute(
+                    'SELECT model FROM models ORDER BY last_used DESC '
+                    'LIMIT -1 OFFSET ?', (MAX_CACHED_MODELS,)).fetchall()
+                db.executemany('DELETE FROM valid_rows WHERE model = ?',
+                               stale)
+                db.executemany('DELETE FROM models WHERE model = ?', stale)
+        except sqlite3.Error:
+            self.close()
+            raise
+
+    def _connect(self) -> sqlite3.Connection:
+        """Returns the connection to the cache's database, opening it if it
+        isn't open"""
+        if self._db is None:
+            db = sqlite3.connect(self._path, timeout=_LOCK_TIMEOUT)
+            try:
+                db.execute('PRAGMA journal_mode = WAL')
+                db.execute('PRAGMA synchronous = NORMAL')
+                db.execute(f'PRAGMA mmap_size = {_MMAP_SIZE}')
+                db.executescript(_SCHEMA)
+            except sqlite3.Error:
+                db.close()
+                raise
+            self._db = db
+        return self._db
+
+    def lookup(self, rows: list[dict[str, str]], digests: list[bytes]) \
+            -> list[Optional[CachedValues]]:
+        found = {d: self._pending[d] for d in digests if d in self._pending}
+        for start in range(0, len(digests), _LOOKUP_CHUNK_SIZE):
+            chunk = digests[start:start + _LOOKUP_CHUNK_SIZE]
+            found.update(self._connect().execute(
+                'SELECT row, unique_values FROM valid_rows WHERE model = ? '
+                f'AND row IN ({', '.join('?' * len(chunk))})',
+                (self._model, *chunk)))
+        self.hits += len(found)
+        self.misses += len(digests) - len(found)
+        return [pickle.loads(found[d]) if d in found else None
+                for d in digests]
+
+    def add(self, rows: Iterable[Tuple[bytes, CachedValues]]) -> None:
+        """Adds valid rows to the cache.  Rows are buffered, and written
+        once enough of them are; see `flush`."""
+        self._pending.update(
+            (digest, pickle.dumps(values, pickle.HIGHEST_PROTOCOL))
+            for digest, values in rows)
+        if len(self._pending) >= _WRITE_BUFFER_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the buffered rows to the cache
+
+        Raises:
+            sqlite3.Error: if the rows can't be written
+        """
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        db = self._connect()
+        with db:
+            # In order, so that each page of the cache is written once
+            db.executemany(
+                'INSERT OR REPLACE INTO valid_rows VALUES (?, ?, ?)',
+                ((self._model, digest, pending[digest])
+                 for digest in sorted(pending)))
+
+    def close(self) -> None:
+        """Writes the buffered rows and closes the cache's database.  The
+        database is opened again should the cache be used again.
+
+        Raises:
+            sqlite3.Error: if the rows can't be written
+        """
+        try:
+            self.flush()
+        finally:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+# pylint: disable-next=too-few-public-methods
+class CachingValidator(BatchValidator):
+    """Validates batches of CSV rows with another `BatchValidator`, except
+    for rows that are `KnownRows`, such as those in a `RowCache`, and adds
+    the rows found to be valid to them.
+
+    The values of unique fields of cached rows are handed to the validation
+    context, which must be a `UniqueCollector`, as if the rows had been
+    validated, so that they are still checked against those of every other
+    row.  No models are returned, as cached rows aren't validated.
+    """
+    # validates rows that are not known
+    engine: BatchValidator
+    cache: KnownRows
+
+    # pylint: disable-next=super-init-not-called
+    def __init__(self, engine: BatchValidator, cache: KnownRows):
+        """
+        Args:
+            engine: validates rows that aren't cached
+            cache: rows known to be valid
+        """
+        self.engine = engine
+        self.cache = cache
+        self.validate_only = True
+
+    def validate(self, rows: list[dict[str, str]], context: Any = None) \
+            -> Tuple[Optional[list[pydantic.BaseModel]], BatchErrors]:
+        """Validates a batch of CSV rows against the model
+
+        Args:
+            rows: CSV rows as dicts in the form of {field_name: value}
+            context: `UniqueCollector` whose batch is the rows' line numbers
+
+        Returns:
+            tuple: (empty list, or None if any row in the batch is invalid,
+            errors keyed by row index within the batch)
+        """
+        if not isinstance(context, UniqueCollector):
+            raise TypeError('cached rows need a UniqueCollector context')
+        lines = context.lines
+        digests = row_digests(rows)
+        cached = self.cache.lookup(rows, digests)
+        errors, values = self._validate_misses(rows, cached, context)
+
+        # Values of unique fields of cached rows come from the cache
+        valid: list[Tuple[bytes, CachedValues]] = []
+        for idx, (row, line) in enumerate(zip(rows, lines)):
+            row_values = cached[idx]
+            if row_values is not None:
+                values[line] = [
+                    UniqueValue(field=field, value=value, line=line,
+                                input=row.get(field),
+                                cluster_name=row.get('cluster_name'))
+                    for field, value in row_values]
+            elif idx not in errors:
+                valid.append((digests[idx], [(v.field, v.value)
+                                             for v in values.get(line, ())]))
+        context.values.extend(v for line in lines
+                              for v in values.get(line, ()))
+
+        if valid:
+            self.cache.add(valid)
+        return (None if errors else []), errors
+
+    def _validate_misses(self, rows: list[dict[str, str]],
+                         cached: list[Optional[CachedValues]],
+                         context: UniqueCollector) \
+            -> Tuple[BatchErrors, dict[int, list[UniqueValue]]]:
+        """Validates the rows of a batch that aren't cached, taking the values
+        of unique fields collected from them back out of the context
+
+        Returns:
+            tuple: (errors keyed by row index within the batch, values of
+            unique fields of the rows by line)
+        """
+        misses = [idx for idx, values in enumerate(cached) if values is None]
+        start = len(context.values)
+        errors: BatchErrors = {}
+        if misses:
+            context.start_batch(context.lines[idx] for idx in misses)
+            _, miss_errors = self.engine.validate(
+                [rows[idx] for idx in misses], context)
+            errors = {misses[idx]: errs for idx, errs in miss_errors.items()}
+
+        values: dict[int, list[UniqueValue]] = {}
+        for v in context.values[start:]:
+            values.setdefault(v.line, []).append(v)
+        del context.values[start:]
+        return errors, values
+
+
+class CachedResult(NamedTuple):
+    """Outcome of a validation run, kept by a `ResultCache`"""
+    exit_code: int
+    # log records of the run, prepared as by `RecordCollector`
+    records: list[logging.LogRecord]
+    # path to the cached output CSV, if the run wrote one
+    output: Optional[str]
+
+
+def file_digest(path: str) -> str:
+    """Returns the SHA-256 hex digest of a file's content
+
+    Raises:
+        OSError: if the file can't be read
+    """
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+def result_key(source: str, fingerprint: str, **options: Any) -> str:
+    """Returns the key of a validation run's result, from the content of its
+    source CSV, the model's fingerprint and any other options that may
+    change the result
+
+    Args:
+        source: path to the source CSV
+        fingerprint: fingerprint of the model, see `model_fingerprint`
+        **options: options of the run; must be JSON-serializable
+
+    Returns:
+        hex digest
+
+    Raises:
+        OSError: if the source can't be read
+    """
+    return hashlib.sha256(json.dumps(
+        [file_digest(source), fingerprint, sorted(options.items())]
+    ).encode()).hexdigest()
+
+
+class ResultCache:
+    """Results of whole validation runs, each kept in a directory named by
+    its `result_key`: the run's exit code and log records, in
+    `_RESULT_FILE`, and the output CSV it wrote, if any, in `_OUTPUT_FILE`.
+
+    The total size of the results is kept within `max_size` bytes by
+    evicting the results used least recently, as told by the modification
+    time of their `_RESULT_FILE`.
+    """
+    _directory: str
+    max_size: int
+
+    def __init__(self, directory: str, max_size: int):
+        """
+        Args:
+            directory: directory holding the results, created if need be
+            max_size: most bytes taken by all results
+
+        Raises:
+            OSError: if the directory can't be created
+        """
+        self._directory = os.path.join(directory, 'results')
+        self.max_size = max_size
+        os.makedirs(self._directory, exist_ok=True)
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        """Looks up the result of a run, marking it as used
+
+        Args:
+            key: `result_key` of the run
+
+        Returns:
+            result of the run, or None if there is none
+        """
+        path = os.path.join(self._directory, key)
+        try:
+            with open(os.path.join(path, _RESULT_FILE),
+                      encoding='utf-8') as f:
+                result = json.load(f)
+            os.utime(os.path.join(path, _RESULT_FILE))
+        except (OSError, ValueError):
+            return None
+        output = os.path.join(path, _OUTPUT_FILE)
+        return CachedResult(
+            exit_code=result['exit_code'],
+            records=[logging.makeLogRecord(r) for r in result['records']],
+            output=output if os.path.exists(output) else None)
+
+    def put(self, key: str, result: CachedResult) -> None:
+        """Keeps the result of a run, then evicts the results used least
+        recently until all fit within `max_size`.  Results larger than
+        `max_size` on their own aren't kept.
+
+        Args:
+            key: `result_key` of the run
+            result: result of the run, with `output` the path to the output
+                CSV it wrote
+
+        Raises:
+            OSError: if the result can't be written
+        """
+        records = [{k: getattr(r, k) for k in _RECORD_ATTRIBUTES
+                    if hasattr(r, k)} for r in result.records]
+        data = json.dumps({'exit_code': result.exit_code,
+                           'records': records}).encode()
+        size = len(data)
+        if result.output is not None:
+            size += os.path.getsize(result.output)
+        path = os.path.join(self._directory, key)
+        if size > self.max_size or os.path.exists(path):
+            return
+
+        # Written to a temporary directory first, so that a result is never
+        # seen half-written
+        staging = tempfile.mkdtemp(dir=self._directory, prefix='.')
+        try:
+            if result.output is not None:
+                shutil.copyfile(result.output,
+                                os.path.join(staging, _OUTPUT_FILE))
+            with open(os.path.join(staging, _RESULT_FILE), 'wb') as f:
+                f.write(data)
+            try:
+                os.rename(staging, path)
+            except OSError:
+                # Kept by another run in the meantime
+                pass
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        self._evict()
+
+    def _evict(self) -> None:
+        """Deletes the results used least recently until all fit within
+        `max_size`"""
+        results = []
+        for entry in os.scandir(self._directory):
+            if entry.name.startswith('.'):
+                continue
+            try:
+                used = os.stat(os.path.join(entry.path, _RESULT_FILE)).st_mtime
+                size = sum(f.stat().st_size for f in os.scandir(entry.path))
+            except OSError:
+                continue
+            results.append((used, size, entry.path))
+        total = sum(size for _, size, _ in results)
+        for _, size, path in sorted(results):
+            if total <= self.max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
@@ -0,0 +1,1377 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import argparse
+import cProfile
+import csv
+import io
+import logging
+import multiprocessing
+import multiprocessing.context
+import multiprocessing.synchronize
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, Any, Iterator, Type, Optional, Union, cast, Tuple
+
+import pydantic
+from pydantic_core import ErrorDetails
+
+# pylint: disable=too-many-lines
+
+from csv_validator.arguments import LazyFileType
+from csv_validator.cache import (CachedResult, CachingValidator, KnownRows,
+                                 ResultCache, RowCache, model_fingerprint,
+                                 result_key)
+from csv_validator.defaults import (DEFAULT_BATCH_SIZE, DEFAULT_CACHE_SIZE,
+                                    DEFAULT_SUMMARY_TOP)
+from csv_validator.incremental import PreviousRevision
+from csv_validator.engine import (BatchErrors, BatchValidator,
+                                  DictionaryEncoder, EncodingValidator,
+                                  FieldEncoder)
+from csv_validator.errors import ErrorBudget, ErrorWriter, error_record
+from csv_validator.latency import RowLatency, SlowRow
+from csv_validator.loader import load_validator_model
+from csv_validator.model import BaseCluster
+from csv_validator.profiling import Profiler, timed_stage
+from csv_validator.parallel import (RecordCollector, Shard, ShardReader,
+                                    ShardResult, SHARDS_PER_WORKER,
+                                    plan_shards)
+from csv_validator.summary import ErrorSummary
+from csv_validator.uniqueness import (Duplicate, UniqueCollector, UniqueContext,
+                                      UniqueIndex, UniqueScope, UniqueValue,
+                                      not_unique_message)
+
+
+# pylint: disable-next=too-few-public-methods,too-many-instance-attributes
+class CLI:
+    """Contains the CLI workflow.
+    """
+    _source: LazyFileType
+    _output: LazyFileType
+    _verbose: int
+    _logger: logging.Logger
+    _model: Type[pydantic.BaseModel]
+    # model given to the constructor, e.g. shared by CLIs for several sources
+    _shared_model: Optional[Type[pydantic.BaseModel]]
+    _validator_module: Optional[str]
+    _batch_size: int
+    _workers: int
+    _dictionary_encode: bool
+    _columnar: bool
+    _reader_name: str
+    _cache_dir: Optional[str]
+    _cache_size: int
+    # whether rows found to be valid are cached
+    _cache_rows: bool
+    _result_cache: Optional[ResultCache]
+    _since: Optional[str]
+    _previous: Optional[PreviousRevision]
+    # whether rows are validated without constructing models, as nothing is
+    # written to an output CSV
+    _validate_only: bool
+    _engine: Optional[BatchValidator]
+    _shard: Optional[Shard]
+    _unique_values: Optional[UniqueCollector]
+    _unique_scope: Optional[UniqueScope]
+    _memory_limit: Optional[int]
+    _unique_index: Optional[UniqueIndex]
+    _reader: csv.DictReader
+    _writer: Optional[csv.DictWriter]
+    _in_fp: IO
+    _out_fp: Optional[IO]
+    # times stages and field validators with `--profile`
+    _profiler: Optional[Profiler]
+    # path to write a cProfile profile of each run to
+    _profile_output: Optional[str]
+    # latency of each row, with `--row-latency` or `--slow-row-ms`
+    _latency: Optional[RowLatency]
+    # 'text' to log errors found in rows, or 'ndjson' to write them to
+    # `_errors`, or with log records if it isn't set, as in shard workers
+    _errors_format: str
+    _errors: Optional[ErrorWriter]
+    # errors after which to stop reading, with `--max-errors` or
+    # `--max-error-rate`
+    _budget: Optional[ErrorBudget]
+    # in a shard worker, set by the parent process to stop reading shards
+    _cancelled: Optional[multiprocessing.synchronize.Event]
+    # counts errors found in rows rather than logging them, with `--summary`
+    _summary: Optional[ErrorSummary]
+
+    # pylint: disable-next=too-many-arguments,too-many-locals
+    def __init__(self, *, source: LazyFileType, output: LazyFileType,
+                 verbose: int, logger: logging.Logger,
+                 validator_module: Optional[str] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE, workers: int = 1,
+                 memory_limit: Optional[int] = None,
+                 dictionary_encode: bool = False, columnar: bool = False,
+                 reader: str = 'csv', validate_only: bool = False,
+                 cache_dir: Optional[str] = None,
+                 cache_size: int = DEFAULT_CACHE_SIZE,
+                 since: Optional[str] = None,
+                 model: Optional[Type[pydantic.BaseModel]] = None,
+                 profile: bool = False, profile_output: Optional[str] = None,
+                 row_latency: bool = False,
+                 slow_row_ms: Optional[float] = None,
+                 errors_format: str = 'text',
+                 errors_file: Optional[str] = None,
+                 max_errors: Optional[int] = None,
+                 max_error_rate: Optional[float] = None,
+                 summary: bool = False,
+                 summary_top: int = DEFAULT_SUMMARY_TOP):
+        self._source = source
+        self._output = output
+        self._verbose = verbose
+        self._logger = logger
+        self._validator_module = validator_module
+        self._batch_size = batch_size
+        self._workers = workers
+        self._memory_limit = memory_limit
+        self._dictionary_encode = dictionary_encode
+        self._columnar = columnar
+        self._reader_name = reader
+        self._validate_only = validate_only and output is None
+        self._cache_dir = cache_dir
+        self._cache_size = cache_size
+        # Rows are only cached when validated in this process, without
+        # models to write out
+        self._cache_rows = cache_dir is not None and output is None \
+            and workers == 1
+        self._result_cache = None
+        # Rows are skipped on the same terms as cached rows
+        self._since = since if output is None and workers == 1 else None
+        if since is not None and self._since is None:
+            logger.warning('Validating all rows, as --since is not used with '
+                           '-o or --workers')
+        self._previous = None
+        self._shared_model = model
+        self._engine = None
+        self._shard = None
+        self._unique_values = None
+        self._unique_scope = None
+        self._unique_index = None
+        self._out_fp = None
+        self._writer = None
+        self._profiler = Profiler() \
+            if profile or profile_output is not None else None
+        self._profile_output = profile_output
+        self._latency = None
+        if row_latency or slow_row_ms is not None:
+            if workers > 1:
+                logger.warning('Not timing rows, as --row-latency and '
+                               '--slow-row-ms are not used with --workers')
+            else:
+                self._latency = RowLatency(slow_row_ms)
+        self._errors_format = errors_format
+        self._errors = ErrorWriter(errors_file) \
+            if errors_format == 'ndjson' and errors_file is not None else None
+        self._budget = ErrorBudget(max_errors, max_error_rate) \
+            if max_errors is not None or max_error_rate is not None else None
+        self._cancelled = None
+        self._summary = ErrorSummary(summary_top) if summary else None
+
+    def run(self) -> int:
+        """Entry point for CLI; implements CLI workflow.
+
+        The model is loaded by the first run only, and the state of its
+        `unique()` validators is scoped to each run, so a `CLI` may be run
+        more than once.
+
+        With a cache directory, the result of a run is kept in a
+        `ResultCache`, and a later run of the same source with the same model
+        and options replays it: its log records are handled again, and its
+        output CSV copied to the output file.
+
+        With `--profile`, the time spent in each stage of the run, and in the
+        validator functions of each field, is logged once it ends, and with
+        `--profile-output`, a cProfile profile of the run is written too.
+
+        With `--row-latency`, the percentiles of the time taken to validate
+        each row are logged once the run ends, and with `--slow-row-ms`, rows
+        slower than that are logged with the field that took longest.  Rows
+        are then validated one at a time rather than in batches.
+
+        With `--errors-format ndjson`, errors found in rows are written to the
+        errors file as JSON rather than logged.
+
+        With `--max-errors` or `--max-error-rate`, reading stops after the row
+        whose error spends the budget, and the run is invalid.
+
+        With `--summary`, errors found in rows are counted rather than logged,
+        and a table of them is logged once the source has been read.
+
+        Returns:
+            CLI exit code as int
+        """
+        if self._latency is not None:
+            self._latency.reset()
+        if self._summary is not None:
+            self._summary.drain()
+        if self._profiler is None:
+            exit_code = self._run()
+        else:
+            exit_code = self._run_profiled(self._profiler)
+        if self._latency is not None and self._latency.histogram.count:
+            self._log_requested(self._latency.histogram.summary())
+        return exit_code
+
+    def _log_requested(self, message: str) -> None:
+        """Logs a report asked for by an option, whatever the verbosity.  It
+        is written without a level name, see `logs.LogFormatter`.
+
+        Args:
+            message: report to log
+        """
+        self._logger.log(max(logging.INFO, self._logger.getEffectiveLevel()),
+                         message, extra={'report': True})
+
+    def _run_profiled(self, profiler: Profiler) -> int:
+        """Runs the CLI with a profiler, then logs its table and writes the
+        cProfile profile if asked to
+
+        Returns:
+            CLI exit code as int
+        """
+        profiler.reset()
+        stats = None
+        if self._profile_output is not None:
+            stats = cProfile.Profile()
+            try:
+                stats.enable()
+            except ValueError as e:
+                # Only one run of the daemon can be profiled at a time
+                self._logger.warning(
+                    f"Not writing a profile to '{self._profile_output}': {e}")
+                stats = None
+
+        start = time.perf_counter()
+        try:
+            exit_code = self._run()
+        finally:
+            if stats is not None:
+                stats.disable()
+
+        self._log_requested(
+            '\n'.join(profiler.report(time.perf_counter() - start)))
+        if stats is not None and self._profile_output is not None:
+            try:
+                stats.dump_stats(self._profile_output)
+            except OSError as e:
+                self._logger.warning(f'Error writing the profile: {e}')
+        return exit_code
+
+    def _run(self) -> int:
+        """Validates the source, or replays its cached result, see `run`
+
+        Returns:
+            CLI exit code as int
+        """
+        self._unique_scope = UniqueScope()
+        self._unique_values, self._unique_index = None, None
+        self._out_fp, self._writer = None, None
+        if self._workers > 1 or self._memory_limit is not None \
+                or self._cache_rows or self._since is not None:
+            # Values of unique fields are collected and checked here, across
+            # all rows, within the memory limit.  Those of cached or
+            # unchanged rows are found without validating the rows.
+            self._unique_index = UniqueIndex(self._memory_limit)
+            if self._workers == 1:
+                self._unique_values = UniqueCollector()
+
+        if self._engine is None:
+            try:
+                with timed_stage(self._profiler, 'load model'):
+                    self._load_model()
+            except RuntimeError:
+                return 1
+
+        key = self._result_key()
+        if key is None:
+            return self._validate_source()
+        assert self._result_cache is not None
+        result = self._result_cache.get(key)
+        if result is not None:
+            return self._replay_result(result)
+
+        collector = RecordCollector()
+        self._logger.addHandler(collector)
+        try:
+            exit_code = self._validate_source()
+        finally:
+            self._logger.removeHandler(collector)
+        if exit_code in (0, -1):
+            try:
+                self._result_cache.put(key, CachedResult(
+                    exit_code=exit_code, records=collector.drain(),
+                    output=self._output.filename
+                    if self._output and exit_code == 0 else None))
+            except OSError as e:
+                self._logger.warning(f'Error caching the result: {e}')
+        return exit_code
+
+    def _validate_source(self) -> int:
+        """Validates the source CSV, see `_read_source`, then closes the rows
+        known to be valid, such as the row cache
+
+        Returns:
+            CLI exit code as int
+        """
+        try:
+            return self._read_source()
+        finally:
+            self._close_known_rows()
+
+    # pylint: disable-next=too-many-branches
+    def _read_source(self) -> int:
+        """Validates the source CSV, writing the validated rows to the output
+        CSV if one is set
+
+        Returns:
+            CLI exit code as int
+        """
+        # Begin reading the source CSV
+        self._logger.debug(f"Using source file '{self._source.filename}'")
+        try:
+            self._in_fp = self._source.open()
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self._logger.exception('Error opening source file', exc_info=e)
+            return 1
+        if self._budget is not None:
+            self._budget.start(self._source.filename)
+
+        # Set up CSV reader - presume 'excel' dialect, read in strictly.
+        # Let's exit if it can't be parsed.
+        if self._reader_name == 'arrow':
+            # Imported only when used, as importing pyarrow is slow
+            # pylint: disable-next=import-outside-toplevel
+            from csv_validator.arrow_reader import open_reader
+            self._reader = open_reader(self._in_fp, self._source.filename,
+                                       self._logger)
+        else:
+            self._reader = csv.DictReader(self._in_fp, dialect='excel',
+                                          strict=True)
+        if self._previous is not None:
+            self._load_previous_revision(self._previous)
+
+        try:
+            with timed_stage(self._profiler, 'read header'):
+                error: bool = self._validate_csv_fields()
+        except RuntimeError:
+            return 1
+
+        # If user set output CSV, set up to use it
+        try:
+            self._setup_csv_writer()
+            self._open_errors_file()
+        except RuntimeError:
+            return 1
+
+        if self._workers > 1:
+            with timed_stage(self._profiler, 'validate shards'):
+                error |= self._validate_csv_rows_parallel()
+        else:
+            # The time of the stages of each batch is left out
+            with timed_stage(self._profiler, 'parse rows'):
+                error |= self._validate_csv_rows()
+
+        if self._unique_index is not None:
+            with timed_stage(self._profiler, 'check unique values'):
+                error |= self._log_remaining_duplicates()
+
+        engine = self._engine
+        while isinstance(engine, CachingValidator):
+            self._flush_known_rows(engine.cache)
+            engine = engine.engine
+
+        self._in_fp.close()
+        try:
+            # we handle the type inference issue with this try/except
+            self._out_fp.close()  # type: ignore
+        except AttributeError:
+            pass
+        self._finish_errors()
+
+        if error:
+            self._logger.info('CSV is invalid')
+            if self._out_fp:
+                # We had validation errors, so no need to keep the output CSV
+                # file as it is incomplete
+                self._logger.info(
+                    "Encountered validation errors making output CSV "
+                    "incomplete; deleting...")
+                os.remove(self._out_fp.name)
+            return -1
+
+        self._logger.info("CSV is valid")
+        return 0
+
+    def _finish_errors(self) -> None:
+        """Closes the errors file, if any, logs the summary of errors with
+        `--summary`, and logs where reading stopped if the error budget was
+        spent"""
+        if self._errors is not None:
+            self._errors.close()
+            self._logger.info(f"Wrote {self._errors.count} errors to "
+                              f"'{self._errors.path}'")
+        if self._summary is not None and self._summary.errors:
+            self._log_requested('\n'.join(self._summary.report()))
+        if self._budget is not None and self._budget.spent:
+            self._log_requested(
+                f'Stopped reading on line {self._budget.spent_line}, after '
+                f'{self._budget.errors} errors; examined '
+                f'{self._budget.rows} rows')
+
+    def _load_model(self) -> None:
+        """Sets the model to use going forward. Defaults to BaseCluster. If
+        one is provided via args, import and set.
+
+        Raises:
+            RuntimeError: if the validator module could not be loaded, or
+                columnar validation is unavailable
+        """
+        model = self._shared_model or load_validator_model(
+            self._validator_module, self._logger)
+        self._model = cast(Type[pydantic.BaseModel],
+                           model if model else BaseCluster)
+        # Rows are validated by a copy of the model whose validator functions
+        # are timed; caches know the model by its own sources
+        if self._profiler is not None:
+            model = self._profiler.profile_model(self._model)
+        else:
+            model = self._model
+        track_rows = self._unique_values is not None
+        encoders: list[FieldEncoder] = []
+        if self._columnar:
+            # pylint: disable-next=import-outside-toplevel
+            from csv_validator.columnar import ColumnarEncoder
+            try:
+                encoders.append(ColumnarEncoder(model))
+            except RuntimeError as e:
+                self._logger.error(e)
+                raise
+        if self._dictionary_encode:
+            encoders.append(DictionaryEncoder(model))
+        if not encoders:
+            self._engine = BatchValidator(model, track_rows=track_rows,
+                                          validate_only=self._validate_only)
+        else:
+            self._engine = EncodingValidator(model, encoders,
+                                             track_rows=track_rows,
+                                             validate_only=self._validate_only)
+        if self._columnar:
+            self._logger.debug(
+                f'Checking fields in columns: '
+                f'{', '.join(encoders[0].keys) or 'none'}')
+        if self._dictionary_encode:
+            self._logger.debug(
+                f'Dictionary-encoding fields: '
+                f'{', '.join(encoders[-1].keys) or 'none'}')
+        self._open_caches()
+
+    def _open_caches(self) -> None:
+        """Opens the result and row caches in the cache directory, and skips
+        rows unchanged since the revision given by `--since`.  Where a cache
+        can't be opened, runs go on without it.
+        """
+        assert self._engine is not None
+        cache_dir = self._cache_dir
+        if cache_dir is not None:
+            try:
+                self._result_cache = ResultCache(cache_dir, self._cache_size)
+            except OSError as e:
+                self._logger.warning(
+                    f"Not caching results, as the cache in '{cache_dir}' "
+                    f"can't be opened: {e}")
+        if cache_dir is not None and self._cache_rows:
+            try:
+                cache = RowCache(cache_dir, model_fingerprint(self._model))
+            except (OSError, sqlite3.Error) as e:
+                self._logger.warning(
+                    f"Not caching rows, as the cache in '{cache_dir}' can't "
+                    f"be opened: {e}")
+            else:
+                self._logger.debug(f"Caching valid rows in '{cache_dir}'")
+                self._engine = CachingValidator(self._engine, cache)
+        if self._since is not None:
+            self._previous = PreviousRevision(self._model, self._since)
+            self._engine = CachingValidator(self._engine, self._previous)
+
+    def _result_key(self) -> Optional[str]:
+        """Returns the key of this run's result in the result cache, or None
+        if results aren't cached"""
+        if self._result_cache is None or self._since is not None \
+                or self._latency is not None or self._errors is not None:
+            # Results with `--since` depend on the state of the repository,
+            # latencies are those of the run itself, and errors written to an
+            # errors file aren't logged
+            return None
+        try:
+            return result_key(
+                self._source.filename, model_fingerprint(self._model),
+                path=os.path.abspath(self._source.filename),
+                output=self._output and os.path.abspath(self._output.filename),
+                log_level=self._logger.getEffectiveLevel(),
+                batch_size=self._batch_size, workers=self._workers,
+                memory_limit=self._memory_limit,
+                dictionary_encode=self._dictionary_encode,
+                columnar=self._columnar, reader=self._reader_name,
+                cache_rows=self._cache_rows,
+                max_errors=self._budget.max_errors if self._budget else None,
+                max_error_rate=self._budget.max_error_rate
+                if self._budget else None,
+                summary_top=self._summary.top_values
+                if self._summary else None)
+        except OSError:
+            # The source is reported as usual when it's opened
+            return None
+
+    def _replay_result(self, result: CachedResult) -> int:
+        """Replays the cached result of an earlier run with the same source,
+        model and options
+
+        Returns:
+            CLI exit code as int
+        """
+        self._logger.debug(
+            f"Replaying the cached result of validating "
+            f"'{self._source.filename}'")
+        for record in result.records:
+            self._logger.handle(record)
+        if self._output is None:
+            return result.exit_code
+        try:
+            if result.output is not None:
+                shutil.copyfile(result.output, self._output.filename)
+            elif os.path.exists(self._output.filename):
+                # The run deleted its incomplete output
+                os.remove(self._output.filename)
+        except OSError as e:
+            self._logger.exception('Error writing output file', exc_info=e)
+            return 1
+        return result.exit_code
+
+    def _load_previous_revision(self, previous: PreviousRevision) -> None:
+        """Reads the rows of the source at the revision given by `--since`;
+        if they can't be read, all rows are validated
+
+        Args:
+            previous: rows unchanged since the revision
+        """
+        try:
+            count = previous.load(self._source.filename,
+                                  cast(io.TextIOWrapper, self._in_fp).encoding)
+        except RuntimeError as e:
+            self._logger.warning(f'Validating all rows, as {e}')
+            return
+        self._logger.debug(f'Validating rows added or changed since '
+                           f'{previous.rev}, which had {count} rows')
+
+    def _flush_known_rows(self, known: KnownRows) -> None:
+        """Notes the rows found to be valid by a run, such as in the row
+        cache, and logs how many rows were skipped
+
+        Args:
+            known: rows known to be valid
+        """
+        try:
+            known.flush()
+        except sqlite3.Error as e:
+            self._logger.warning(f'Error writing to the row cache: {e}')
+        self._logger.debug(
+            f'{known.hits} of {known.hits + known.misses} rows were '
+            f'{known.description}')
+        known.hits = known.misses = 0
+
+    def _close_known_rows(self) -> None:
+        """Closes the rows known to be valid, such as the row cache, so that
+        its database isn't held open between runs"""
+        engine = self._engine
+        while isinstance(engine, CachingValidator):
+            try:
+                engine.cache.close()
+            except sqlite3.Error as e:
+                self._logger.warning(f'Error writing to the row cache: {e}')
+            engine = engine.engine
+
+    def _validate_csv_fields(self) -> bool:
+        """Validates the fields of a CSV and signals if required fields are
+        not present
+
+        Returns:
+            bool: whether validation error in CSV fields was encountered
+        """
+        # Iterate over the expected/required fields from the model and alert
+        # if any are missing in the CSV
+        validation_error = False
+        try:
+            if not self._reader.fieldnames:
+                self._logger.error('Missing CSV field names - is file empty?')
+                raise RuntimeError('missing CSV field names')
+
+            for name, field, in self._model.model_fields.items():
+                if name not in self._reader.fieldnames:
+                    if field.is_required() is False:
+                        self._logger.warning(
+                            f"Optional field '{name}' is not present in "
+                            f"{self._in_fp.name}")
+                    else:
+                        validation_error = True
+                        self._logger.error(
+                            f"Required field '{name}' is not present in "
+                            f"{self._in_fp.name}")
+        except UnicodeDecodeError as e:
+            self._logger.exception(
+                'Unicode decoding issues parsing CSV fieldnames',
+                exc_info=e)
+            raise RuntimeError('unicode decode error') from e
+
+        return validation_error
+
+    def _validate_csv_rows(self) -> bool:
+        """Reads the rows of the CSV, validating them against the model in
+        batches of `self._batch_size` rows
+
+        Returns:
+            bool: whether a validation error in CSV rows was encountered
+        """
+        error = False
+        # Rows are collected into batches and validated together; `lines`
+        # holds the source line number of each row in the batch
+        batch: list[dict[str, str]] = []
+        lines: list[int] = []
+        while True:
+            # loop over rows
+            try:
+                row: dict[str, str] = next(self._reader)
+            except csv.Error as e:
+                self._validate_csv_batch(batch, lines)
+                self._logger.exception(
+                    f'Encountered CSV parsing error, row '
+                    f'{self._reader.line_num}, {self._source.filename}',
+                    exc_info=e)
+                return True
+            except StopIteration:
+                error |= self._validate_csv_batch(batch, lines)
+                # Only the last shard of a sharded source reaches its end
+                if self._shard is None or self._shard.last:
+                    self._logger.debug(
+                        f'Reached end of CSV; {self._reader.line_num} rows')
+                return error
+
+            if None in row:
+                # The row has more values than there are fields.  It can't be
+                # validated as part of a batch, so validate what we have so far
+                # and then this row on its own, preserving row order.
+                error |= self._validate_csv_batch(batch, lines)
+                batch, lines = [], []
+                if self._stop_reading():
+                    return error
+                error |= self._validate_ragged_row(row)
+            else:
+                batch.append(row)
+                lines.append(self._reader.line_num)
+                if len(batch) < self._batch_size:
+                    continue
+                error |= self._validate_csv_batch(batch, lines)
+                batch, lines = [], []
+            if self._stop_reading():
+                return error
+
+    def _stop_reading(self) -> bool:
+        """Returns whether to stop reading the source, as its error budget is
+        spent or, in a shard worker, the parent process has cancelled the
+        run"""
+        return (self._budget is not None and self._budget.spent) \
+            or (self._cancelled is not None and self._cancelled.is_set())
+
+    def _validate_csv_rows_parallel(self) -> bool:
+        """Splits the rows of the CSV into shards and validates them in a pool
+        of `self._workers` worker processes.  Log records and output rows from
+        each shard are handled in source order, so output matches that of
+        `_validate_csv_rows`.  Sources too small to be split are validated in
+        this process.
+
+        Returns:
+            bool: whether a validation error in CSV rows was encountered
+        """
+        shards = plan_shards(self._source.filename,
+                             self._workers * SHARDS_PER_WORKER)
+        if len(shards) < 2:
+            return self._validate_csv_rows()
+
+        self._logger.debug(
+            f'Validating {len(shards)} shards with {self._workers} workers')
+
+        error = False
+        fieldnames = list(self._reader.fieldnames or ())
+        # Workers stop reading their shards once the budget is spent in the
+        # parent process, or by a single shard
+        context = _pool_context()
+        cancelled = context.Event() if self._budget else None
+        with tempfile.TemporaryDirectory() as output_dir, \
+                ProcessPoolExecutor(
+                    max_workers=self._workers, mp_context=context,
+                    initializer=_init_shard_worker,
+                    initargs=(self._source.filename, self._validator_module,
+                              self._batch_size, self._dictionary_encode,
+                              self._columnar, self._validate_only,
+                              self._errors_format,
+                              self._budget.limit if self._budget else None,
+                              cancelled,
+                              self._summary.top_values
+                              if self._summary else None,
+                              self._logger.getEffectiveLevel())) as executor:
+            futures = [
+                executor.submit(_validate_shard, shard, fieldnames,
+                                cast(io.TextIOWrapper, self._in_fp).encoding,
+                                output_dir if self._writer else None)
+                for shard in shards]
+
+            for shard, future in zip(shards, futures):
+                result: ShardResult = future.result()
+                # Values of unique fields are collected by each worker and
+                # checked here, across all shards
+                with timed_stage(self._profiler, 'check unique values'):
+                    duplicates = self._find_duplicates(result.unique_values)
+                with timed_stage(self._profiler, 'log records'):
+                    self._handle_shard_records(result.records, duplicates)
+                error |= result.error or bool(duplicates)
+
+                if self._out_fp and result.output:
+                    with open(result.output, encoding='utf-8',
+                              newline='') as part:
+                        shutil.copyfileobj(part, self._out_fp)
+
+                if self._budget is not None and self._budget.spent:
+                    # Spent by a record of this shard, maybe before the
+                    # worker's own budget was, so count its rows again
+                    self._budget.rows += self._count_shard_rows(
+                        shard, fieldnames, self._budget.spent_line)
+                elif self._budget is not None:
+                    self._budget.rows += result.rows
+                if self._summary is not None and result.summary is not None:
+                    self._summary.merge(result.summary)
+                if cancelled is not None and self._budget \
+                        and self._budget.spent:
+                    cancelled.set()
+                if not result.complete or self._stop_reading():
+                    # Parsing or the budget stopped the shard partway
+                    # through; rows in later shards would have come after it
+                    executor.shutdown(cancel_futures=True)
+                    break
+
+        return error
+
+    def _count_shard_rows(self, shard: Shard, fieldnames: list[str],
+                          line_num: Optional[int]) -> int:
+        """Counts the rows of a shard of the CSV up to a source line
+
+        Args:
+            shard: shard of the source CSV
+            fieldnames: field names from the header of the source CSV
+            line_num: source line number of the last row to count
+
+        Returns:
+            int: number of rows of the shard up to and including `line_num`
+        """
+        assert line_num is not None
+        with open(self._source.filename, 'rb') as f:
+            f.seek(shard.start)
+            data = f.read(shard.end - shard.start)
+        fp = io.TextIOWrapper(io.BytesIO(data),
+                              encoding=cast(io.TextIOWrapper,
+                                            self._in_fp).encoding)
+        reader = ShardReader(fp, fieldnames, shard.line_offset)
+        rows = 0
+        try:
+            for _ in reader:
+                if reader.line_num > line_num:
+                    break
+                rows += 1
+        except (csv.Error, UnicodeDecodeError):
+            # Reading the shard stopped on the same error when validating it
+            pass
+        return rows
+
+    def _handle_shard_records(self, records: list[logging.LogRecord],
+                              duplicates: list[Duplicate]) -> None:
+        """Handles the log records of a shard, interleaving errors for
+        duplicated values of unique fields in line order, up to the row that
+        spends the error budget, if any.
+
+        Args:
+            records: log records from validating the shard
+            duplicates: duplicated values in the shard, in line order
+        """
+        for item in _in_line_order(records, duplicates):
+            if isinstance(item, Duplicate):
+                line_num: Optional[int] = item.value.line
+            else:
+                line_num = getattr(item, 'line_num', None)
+            if self._budget is not None and self._budget.past(line_num):
+                return
+            if isinstance(item, Duplicate):
+                self._log_duplicate(item)
+                continue
+            if self._budget is not None and line_num is not None \
+                    and item.levelno >= logging.ERROR:
+                self._budget.spend(line_num)
+            error = getattr(item, 'error', None)
+            if error is not None and self._errors is not None:
+                self._errors.write(error)
+            else:
+                self._logger.handle(item)
+
+    def _find_duplicates(self, values: list[UniqueValue]) -> list[Duplicate]:
+        """Checks collected values of unique fields against those of earlier
+        rows
+
+        Args:
+            values: values collected from validated rows, in line order
+
+        Returns:
+            list of duplicated values which could be found so far
+        """
+        assert self._unique_index is not None
+        spilled = self._unique_index.spilled
+        duplicates = self._unique_index.find_duplicates(values)
+        if self._unique_index.spilled and not spilled:
+            self._logger.debug(
+                'Values of unique fields exceed the memory limit; checking '
+                'the remaining values with an external sort')
+        return duplicates
+
+    def _log_remaining_duplicates(self) -> bool:
+        """Logs errors for the duplicated values of unique fields which could
+        only be found once all rows were validated, because the values were
+        checked by an external sort
+
+        Returns:
+            bool: whether any duplicates were found
+        """
+        assert self._unique_index is not None
+        duplicates = self._unique_index.finish()
+        for dupe in duplicates:
+            if self._budget is not None and self._budget.past(dupe.value.line):
+                break
+            self._log_duplicate(dupe)
+        return bool(duplicates)
+
+    def _log_duplicate(self, dupe: Duplicate) -> None:
+        """Logs an error for a duplicated value of a unique field, in the same
+        form as the error raised by `helpers.unique()`
+
+        Args:
+            dupe: duplicated value
+        """
+        v = dupe.value
+        self._log_validation_error(
+            v.line, {'cluster_name': v.cluster_name or ''},
+            {'type': 'value_error', 'loc': (v.field,), 'input': v.input,
+             'msg': 'Value error, '
+                    f'{not_unique_message(v.value)}'})
+
+    def _validate_shard(self, shard: Shard, fieldnames: list[str],
+                        encoding: str, output_dir: Optional[str]) \
+            -> Tuple[bool, bool, Optional[str], int]:
+        """Validates the rows of a single shard of the CSV.  Called in a
+        worker process on a `CLI` set up by `_init_shard_worker`.
+
+        Args:
+            shard: shard of the source CSV to validate
+            fieldnames: field names from the header of the source CSV
+            encoding: encoding of the source CSV
+            output_dir: if set, directory to write validated rows to as a
+                headerless CSV
+
+        Returns:
+            tuple: (validation_error, whether the shard was read to its end,
+            path to output CSV or None, rows validated with an error budget)
+        """
+        self._shard = shard
+        if self._budget is not None:
+            self._budget.start(self._source.filename)
+        with open(self._source.filename, 'rb') as f:
+            f.seek(shard.start)
+            data = f.read(shard.end - shard.start)
+
+        self._in_fp = io.TextIOWrapper(io.BytesIO(data), encoding=encoding)
+        reader = ShardReader(self._in_fp, fieldnames, shard.line_offset)
+        self._reader = reader
+
+        output = None
+        if output_dir:
+            fd, output = tempfile.mkstemp(suffix='.csv', dir=output_dir)
+            self._out_fp = os.fdopen(fd, 'w', encoding='utf-8')
+            self._writer = csv.DictWriter(
+                self._out_fp, self._model.model_fields.keys(), dialect='excel')
+
+        try:
+            error = self._validate_csv_rows()
+        finally:
+            self._in_fp.close()
+            if self._out_fp:
+                self._out_fp.close()
+            self._out_fp, self._writer = None, None
+
+        rows = self._budget.rows if self._budget is not None else 0
+        return error, reader.exhausted, output, rows
+
+    def _validate_csv_batch(self, rows: list[dict[str, str]],
+                            lines: list[int]) -> bool:
+        """Given a batch of rows from a CSV, validate them against the model,
+        log any errors per row in source order, and write the validated rows
+        to the output CSV if one is set up.
+
+        Args:
+            rows: CSV rows as dicts in the form of {field_name: value}
+            lines: source line number of each row in `rows`
+
+        Returns:
+            bool: whether a validation error was encountered in the batch
+        """
+        if not rows:
+            return False
+
+        assert self._engine is not None
+        context: Optional[UniqueContext] = self._unique_scope
+        if self._unique_values:
+            self._unique_values.start_batch(lines)
+            context = self._unique_values
+        # Slow rows, logged in line order with the rows' errors
+        slow: dict[int, SlowRow] = {}
+        with timed_stage(self._profiler, 'validate rows'):
+            if self._latency is None:
+                clusters, errors = self._engine.validate(rows, context=context)
+            else:
+                clusters, errors = self._validate_rows_timed(rows, lines,
+                                                             context, slow)
+
+        # Unless validating a shard, for which the parent process checks them,
+        # check the collected values of unique fields
+        duplicates: dict[int, list[Duplicate]] = {}
+        if self._unique_index and self._unique_values:
+            with timed_stage(self._profiler, 'check unique values'):
+                for dupe in self._find_duplicates(
+                        self._unique_values.drain()):
+                    duplicates.setdefault(dupe.value.line, []).append(dupe)
+
+        with timed_stage(self._profiler, 'log records'):
+            self._log_batch(rows, lines, errors, duplicates, slow)
+        if self._budget is not None:
+            self._budget.count(lines)
+
+        if errors or duplicates:
+            return True
+
+        if self._writer and clusters:
+            # Dump the models directly to the CSV writer.  The model's
+            # serialization functions handle making each field CSV-ready.
+            # If a field isn't dumping well, add a serializer to the model.
+            # See `BaseCluster` for an example.
+            with timed_stage(self._profiler, 'dump models'):
+                dumped = [clus.model_dump() for clus in clusters]
+            with timed_stage(self._profiler, 'write output'):
+                self._writer.writerows(dumped)
+        return False
+
+    # pylint: disable-next=too-many-arguments
+    def _log_batch(self, rows: list[dict[str, str]], lines: list[int],
+                   errors: BatchErrors,
+                   duplicates: dict[int, list[Duplicate]],
+                   slow: dict[int, SlowRow]) -> None:
+        """Logs the progress, errors and slow rows of a batch of rows in
+        source order
+
+        Args:
+            rows: CSV rows as dicts in the form of {field_name: value}
+            lines: source line number of each row in `rows`
+            errors: validation errors keyed by row index within the batch
+            duplicates: duplicated values of unique fields by line
+            slow: slow rows by line
+        """
+        for idx, (row, line_num) in enumerate(zip(rows, lines)):
+            self._log_progress(line_num)
+            for dupe in duplicates.get(line_num, ()):
+                self._log_duplicate(dupe)
+            for pydantic_err in errors.get(idx, ()):
+                self._log_validation_error(line_num, row, pydantic_err)
+            self._log_slow_row(slow.get(line_num))
+            if self._budget is not None and self._budget.spent:
+                break
+
+    def _validate_rows_timed(self, rows: list[dict[str, str]],
+                             lines: list[int], context: Any,
+                             slow: dict[int, SlowRow]) \
+            -> Tuple[Optional[list[pydantic.BaseModel]], BatchErrors]:
+        """Validates a batch of rows one row at a time, timing each, as
+        `BatchValidator.validate` validates them together
+
+        Args:
+            rows: CSV rows as dicts in the form of {field_name: value}
+            lines: source line number of each row in `rows`
+            context: validation context of the batch
+            slow: dict to add slow rows to, by line
+
+        Returns:
+            tuple: (list of pydantic model objects or None if any row in the
+            batch is invalid, errors keyed by row index within the batch)
+        """
+        assert self._engine is not None
+        models: Optional[list[pydantic.BaseModel]] = []
+        errors: BatchErrors = {}
+        for idx, (row, line_num) in enumerate(zip(rows, lines)):
+            if self._unique_values:
+                self._unique_values.start_batch([line_num])
+            start = time.perf_counter()
+            row_models, row_errors = self._engine.validate([row],
+                                                           context=context)
+            slow_row = self._time_row(line_num, row,
+                                      time.perf_counter() - start)
+            if slow_row is not None:
+                slow[line_num] = slow_row
+            if row_errors:
+                errors[idx] = row_errors[0]
+                models = None
+            elif models is not None and row_models:
+                models.extend(row_models)
+        return models, errors
+
+    def _time_row(self, line_num: int, row: dict[str, str],
+                  seconds: float) -> Optional[SlowRow]:
+        """Counts the time taken to validate a row
+
+        Args:
+            line_num: source line number of the row
+            row: CSV row as a dict in the form of {field_name: value}
+            seconds: time taken to validate the row
+
+        Returns:
+            the row if it is slow, or None
+        """
+        assert self._latency is not None
+        if not self._latency.record(seconds, line_num):
+            return None
+        field, field_seconds = self._latency.slowest_field(self._model, row)
+        return SlowRow(line=line_num, cluster_name=row.get('cluster_name'),
+                       seconds=seconds, field=field,
+                       field_seconds=field_seconds)
+
+    def _log_slow_row(self, slow: Optional[SlowRow]) -> None:
+        """Logs a warning for a slow row, if any"""
+        if slow is not None:
+            self._logger.warning(slow.message(),
+                                 extra={'line_num': slow.line})
+
+    def _validate_ragged_row(self, row: dict[str, str]) -> bool:
+        """Validates a row with more values than there are fields on its own
+
+        Args:
+            row: CSV row as a dict in the form of {field_name: value}
+
+        Returns:
+            bool: whether a validation error was encountered
+        """
+        self._log_progress(self._reader.line_num)
+        if self._budget is not None:
+            self._budget.rows += 1
+        start = time.perf_counter()
+        _, row_error = self._validate_csv_row(row)
+        if self._latency is not None:
+            self._log_slow_row(self._time_row(
+                self._reader.line_num, row, time.perf_counter() - start))
+        return row_error
+
+    def _validate_csv_row(self, row: dict[str, str]) \
+            -> Tuple[Optional[pydantic.BaseModel], bool]:
+        """Given a row from a CSV, validate it against the model
+
+        Args:
+            row: CSV row as a dict in the form of {field_name: value}
+
+        Returns:
+            tuple: (pydantic_model_object or None, validation_error)
+        """
+        try:
+            # Validate the row against the model
+            clus = self._model(**row)  # type: ignore
+        except pydantic.ValidationError as e:
+            # Oops, it didn't validate. Iterate over the validation errors
+            # for each row and write some useful details to the self.logger.
+            # Set validation_error to `True` so we know to exit with a non-0
+            # status
+            for pydantic_err in e.errors():
+                self._log_validation_error(
+                    self._reader.line_num, row, pydantic_err)
+            return None, True
+        except TypeError:
+            if self._errors_format == 'ndjson' or self._summary is not None:
+                self._log_validation_error(self._reader.line_num, row, {
+                    'type': 'extra_values', 'loc': (), 'input': cast(dict, row).get(None),
+                    'msg': 'Row has more values than there are fields'})
+                return None, True
+            if self._budget is not None:
+                self._budget.spend(self._reader.line_num)
+            self._logger.error(
+                f'Line {self._reader.line_num}, {row['cluster_name']}, error: encountered '
+                f'Python TypeError, this usually means the CSV is malformed; please check this '
+                f'row for extra fields or syntax errors.',
+                extra={'line_num': self._reader.line_num})
+            return None, True
+
+        return clus, False
+
+    def _log_validation_error(self, line_num: int, row: dict[str, str],
+                              pydantic_err: ErrorDetails) -> None:
+        """Writes a single pydantic validation error for a CSV row to the
+        logger, or to the errors file with `--errors-format ndjson`, or counts
+        it with `--summary`
+
+        The record carries the line number as `line_num`, which is used to
+        order records from shards validated by worker processes.  Shard
+        workers writing JSON errors return them as the record's `error`.
+
+        Args:
+            line_num: source line number of the row
+            row: CSV row as a dict in the form of {field_name: value}
+            pydantic_err: error from `pydantic.ValidationError.errors()`
+        """
+        if self._budget is not None:
+            self._budget.spend(line_num)
+        if self._summary is not None:
+            loc = pydantic_err['loc']
+            self._summary.add(str(loc[0]) if loc else '', pydantic_err['type'],
+                              pydantic_err['input'])
+            return
+        if self._errors_format == 'ndjson':
+            record = error_record(line_num, row, pydantic_err)
+            if self._errors is not None:
+                self._errors.write(record)
+            else:
+                self._logger.error(f'Line {line_num}, validation error',
+                                   extra={'line_num': line_num,
+                                          'error': record})
+            return
+        c = f"cluster {row['cluster_name']}" if row.get(
+            'cluster_name') else 'cluster name unknown'
+        # Formatted only when written, see `logs.setup_logger`
+        self._logger.error(
+            "Line %d, %s, column '%s', error: '%s', received '%s'",
+            line_num, c, pydantic_err['loc'][0], pydantic_err['msg'],
+            pydantic_err['input'], extra={'line_num': line_num})
+
+    def _log_progress(self, line_num: int) -> None:
+        """Periodically logs how far into the source CSV validation has got
+
+        Args:
+            line_num: source line number of the row being validated
+        """
+        if line_num % 100 == 0:
+            self._logger.info('Processed %d rows in source', line_num,
+                              extra={'line_num': line_num})
+
+    def _open_errors_file(self) -> None:
+        """If an errors file is set, opens it; otherwise, no-op.
+
+        Raises:
+            RuntimeError: if the errors file could not be opened
+        """
+        if self._errors is not None:
+            self._logger.debug(f"Using errors file '{self._errors.path}'")
+            try:
+                self._errors.open()
+            except OSError as e:
+                self._logger.exception('Error opening errors file', exc_info=e)
+                raise RuntimeError('error opening file for writing') from e
+
+    def _setup_csv_writer(self) -> None:
+        """If an output file is provided, use it, and set up the writer;
+        otherwise, no-op.
+        """
+        if self._output:
+            self._logger.debug(f"Using output file '{self._output.filename}'")
+            try:
+                self._out_fp = self._output.open()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                self._logger.exception('Error opening output file', exc_info=e)
+                raise RuntimeError('error opening file for writing') from e
+
+            # uses the model's expected fields as the fields to use in the
+            # output CSV
+            self._writer = csv.DictWriter(
+                self._out_fp, self._model.model_fields.keys(), dialect='excel')
+            self._writer.writeheader()
+
+
+def _pool_context() -> multiprocessing.context.BaseContext:
+    """Returns the multiprocessing context to start shard workers with.
+    Forking while other threads run, such as those handling the requests of
+    the daemon of `validate_csv serve`, may deadlock a worker on a lock held
+    by another thread, so off the main thread workers are started by a fork
+    server instead.
+    """
+    if threading.current_thread() is threading.main_thread():
+        return multiprocessing.get_context()
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['csv_validator.cli'])
+    return context
+
+
+# State of a shard worker process, set up by `_init_shard_worker`
+_shard_worker: dict[str, Any] = {}
+
+
+# pylint: disable-next=too-many-arguments,too-many-locals
+def _init_shard_worker(source: str, validator_module: Optional[str],
+                       batch_size: int, dictionary_encode: bool,
+                       columnar: bool, validate_only: bool,
+                       errors_format: str, max_errors: Optional[int],
+                       cancelled: Optional[multiprocessing.synchronize.Event],
+                       summary_top: Optional[int], log_level: int) -> None:
+    """Initializer for shard worker processes.  Loads the validation model
+    once per process and collects log records so that they may be returned to
+    the parent process.
+
+    Args:
+        source: path to the source CSV
+        validator_module: validator module as passed to the CLI
+        batch_size: number of rows to validate per call to the model
+        dictionary_encode: whether to dictionary-encode low-cardinality fields
+        columnar: whether to check string constraints in columns
+        validate_only: whether to validate rows without constructing models
+        errors_format: format of errors found in rows; errors are returned
+            with log records either way
+        max_errors: errors after which to stop reading a shard, if any
+        cancelled: event set by the parent process to stop reading shards
+        summary_top: with `--summary`, number of values to report for each
+            column
+        log_level: effective level of the parent process' logger
+    """
+    collector = RecordCollector()
+    logger = logging.getLogger('csv_validator.shard')
+    logger.handlers = [collector]
+    logger.propagate = False
+    logger.setLevel(log_level)
+
+    cli = CLI(source=LazyFileType.default(source),
+              output=None,  # type: ignore[arg-type]
+              verbose=0, logger=logger, validator_module=validator_module,
+              batch_size=batch_size, dictionary_encode=dictionary_encode,
+              columnar=columnar, validate_only=validate_only,
+              errors_format=errors_format, max_errors=max_errors)
+    # Uniqueness can only be checked across all shards, so values of unique
+    # fields are collected and checked by the parent process
+    unique_values = UniqueCollector()
+    cli._unique_values = unique_values  # pylint: disable=protected-access
+    cli._cancelled = cancelled  # pylint: disable=protected-access
+    # Errors are counted by each worker and the counts merged by the parent
+    summary = ErrorSummary(summary_top) if summary_top is not None else None
+    cli._summary = summary  # pylint: disable=protected-access
+    cli._load_model()  # pylint: disable=protected-access
+    # The parent process has already logged loading the model
+    collector.drain()
+    _shard_worker.update(cli=cli, collector=collector,
+                         unique_values=unique_values, summary=summary)
+
+
+def _validate_shard(shard: Shard, fieldnames: list[str], encoding: str,
+                    output_dir: Optional[str]) -> ShardResult:
+    """Validates a shard of the source CSV in a worker process
+
+    Args:
+        shard: shard of the source CSV to validate
+        fieldnames: field names from the header of the source CSV
+        encoding: encoding of the source CSV
+        output_dir: if set, directory to write validated rows to
+
+    Returns:
+        result of validating the shard
+    """
+    cli: CLI = _shard_worker['cli']
+    collector: RecordCollector = _shard_worker['collector']
+    unique_values: UniqueCollector = _shard_worker['unique_values']
+    summary: Optional[ErrorSummary] = _shard_worker['summary']
+    error, complete, output, rows = cli._validate_shard(  # pylint: disable=protected-access
+        shard, fieldnames, encoding, output_dir)
+    return ShardResult(error=error, complete=complete,
+                       records=collector.drain(),
+                       unique_values=unique_values.drain(), output=output,
+                       rows=rows, summary=summary and summary.drain())
+
+
+def _in_line_order(records: list[logging.LogRecord],
+                   duplicates: list[Duplicate]) \
+        -> Iterator[Union[logging.LogRecord, Duplicate]]:
+    """Interleaves the log records of a shard with the duplicated values of
+    unique fields found in it, in line order.  A row's duplicates come after
+    its progress record and before its other errors, as when validating in a
+    single process.
+
+    Args:
+        records: log records from validating the shard
+        duplicates: duplicated values in the shard, in line order
+
+    Yields:
+        log records and duplicates
+    """
+    pending = iter(duplicates)
+    dupe = next(pending, None)
+    for record in records:
+        line_num = getattr(record, 'line_num', None)
+        while dupe and (line_num is None
+                        or dupe.value.line < line_num
+                        or (dupe.value.line == line_num
+                            and record.levelno >= logging.ERROR)):
+            yield dupe
+            dupe = next(pending, None)
+        yield record
+
+    while dupe:
+        yield dupe
+        dupe = next(pending, None)
+
+
+def run_validation(args: argparse.Namespace, logger: logging.Logger,
+                   model: Optional[Type[pydantic.BaseModel]] = None) -> int:
+    """Validates a source of truth as given by the arguments of the CLI
+
+    Args:
+        args: arguments of the CLI
+        logger: logger
+        model: model loaded from `args.validator_module` already, if any
+
+    Returns:
+        CLI exit code as int
+    """
+    cli = CLI(source=args.source, validator_module=args.validator_module,
+              output=args.output, verbose=args.verbose, logger=logger,
+              batch_size=args.batch_size, workers=args.workers,
+              memory_limit=args.memory_limit,
+              dictionary_encode=args.dictionary_encode,
+              columnar=args.columnar, reader=args.reader,
+              validate_only=args.output is None, cache_dir=args.cache_dir,
+              cache_size=args.cache_size, since=args.since, model=model,
+              profile=args.profile, profile_output=args.profile_output,
+              row_latency=args.row_latency, slow_row_ms=args.slow_row_ms,
+              errors_format=args.errors_format, errors_file=args.errors_file,
+              max_errors=args.max_errors, max_error_rate=args.max_error_rate,
+              summary=args.summary, summary_top=args.summary_top)
+
+    return cli.run()
@@ -0,0 +1,277 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import copy
+from dataclasses import dataclass
+from typing import Annotated, Any, Optional, Type
+
+import annotated_types
+import pydantic
+from pydantic.fields import FieldInfo
+
+from csv_validator.engine import EncodedRows, FieldEncoder
+
+try:
+    import pyarrow as pa  # type: ignore[import-untyped]
+    import pyarrow.compute as pc  # type: ignore[import-untyped]
+except ImportError:  # pragma: no cover
+    pa = pc = None
+
+# pylint: disable=no-member
+# pyarrow's compute functions are generated when it is imported
+
+# Values of a field are checked by pyarrow only where they are ASCII, where
+# pyarrow's whitespace and case kernels agree with Rust's, and where the
+# regular expressions of RE2 and of pydantic-core's Rust `regex` crate agree
+# but for `\s`, which only matches a vertical tab in Rust.  Other values are
+# validated by pydantic one by one.
+_VERTICAL_TAB = '\x0b'
+
+# Marks a value that failed validation
+_INVALID = object()
+
+
+@dataclass
+class _StringField:
+    """A string field checked by pyarrow, and its constraints"""
+    key: str
+    # validates values of the field that pyarrow can't check
+    adapter: pydantic.TypeAdapter
+    strip_whitespace: bool = False
+    to_lower: bool = False
+    to_upper: bool = False
+    min_length: Optional[int] = None
+    max_length: Optional[int] = None
+    pattern: Optional[str] = None
+
+
+class ColumnarEncoder(FieldEncoder):
+    """Checks the `StringConstraints` of string fields a column at a time with
+    pyarrow compute kernels, rather than value by value in pydantic-core.
+
+    Fields are checked in columns when they are plain `str`s with constraints
+    from `StringConstraints`, `Field` or the model's `str_*` config, followed
+    by any number of `AfterValidator`s, which are left for the model to run on
+    the constrained value.  Fields with `before`, `wrap` or `plain` field
+    validators, and all fields of models with `before` or `wrap` model
+    validators, are left to the model.
+
+    Requires pyarrow; see the `columnar` extra.
+    """
+    _fields: list[_StringField]
+
+    def __init__(self, model: Type[pydantic.BaseModel]):
+        if pa is None:
+            raise RuntimeError(
+                'Columnar validation requires pyarrow; install '
+                'csv_validator[columnar]')
+        self._fields = []
+        if _rewrites_input(model):
+            self.keys = []
+            return
+        config = model.model_config
+        custom = {name for d in
+                  model.__pydantic_decorators__.field_validators.values()
+                  if d.info.mode != 'after' for name in d.info.fields}
+        for name, field in model.model_fields.items():
+            if name in custom or '*' in custom:
+                continue
+            string_field = _string_field(field.alias or name, field, config)
+            if string_field:
+                self._fields.append(string_field)
+        self.keys = [f.key for f in self._fields]
+
+    def residual(self, field: FieldInfo) -> FieldInfo:
+        """Keeps the field's `AfterValidator`s, to run on the value checked
+        by the encoder"""
+        field = copy.copy(field)
+        field.annotation = Any  # type: ignore[assignment]
+        field.metadata = [m for m in field.metadata
+                          if isinstance(m, pydantic.AfterValidator)]
+        return field
+
+    def encode(self, rows: list[dict[str, str]], encoded: EncodedRows) \
+            -> None:
+        for field in self._fields:
+            if field.key in self.keys:
+                self._encode_field(field, rows, encoded)
+
+    @staticmethod
+    def _encode_field(field: _StringField, rows: list[dict[str, str]],
+                      encoded: EncodedRows) -> None:
+        """Checks one field of a batch of rows, see `FieldEncoder.encode`"""
+        raw = [row.get(field.key) for row in rows]
+        column = _column(raw)
+        plain, ok, values = _check_column(field, column)
+        changed = values is not column and not values.equals(column)
+        if pc.all(ok).as_py():
+            # Every value is valid; raw values are left as they are unless
+            # they were stripped or changed case
+            if changed:
+                for row, value in zip(encoded, values.to_pylist()):
+                    if row is not None:
+                        row[field.key] = value
+            return
+
+        checked = values.to_pylist() if changed else raw
+        for idx, (valid, is_plain) in enumerate(
+                zip(ok.to_pylist(), pc.fill_null(plain, False).to_pylist())):
+            row = encoded[idx]
+            if row is None or field.key not in row:
+                continue
+            # Values that pyarrow couldn't check are validated by pydantic
+            value = checked[idx] if valid else (
+                _INVALID if is_plain
+                else _validate_value(field.adapter, raw[idx]))
+            if value is _INVALID:
+                encoded[idx] = None
+            else:
+                row[field.key] = value
+
+
+def _column(raw: list[Any]) -> Any:
+    """Converts raw values to a pyarrow string array.  Values are null if
+    any of them is not a string that can be encoded as UTF-8."""
+    try:
+        return pa.array(raw, pa.string())
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.nulls(len(raw), pa.string())
+
+
+def _check_column(field: _StringField, column: Any) -> tuple[Any, Any, Any]:
+    """Checks the constraints of a field on a column of its raw values
+
+    Returns:
+        tuple: (whether each value could be checked by pyarrow, whether each
+        value is valid, validated values)
+    """
+    if field.pattern is not None:
+        plain = pc.and_not(pc.string_is_ascii(column),
+                           pc.match_substring(column, _VERTICAL_TAB))
+    elif field.strip_whitespace or field.to_lower or field.to_upper:
+        plain = pc.string_is_ascii(column)
+    else:
+        plain = pc.is_valid(column)
+    ok = plain
+    values = column
+    if field.strip_whitespace:
+        values = pc.ascii_trim_whitespace(values)
+    if field.min_length is not None or field.max_length is not None:
+        length = pc.utf8_length(values)
+        # Typed scalars, as pyarrow tries optional imports to convert ints
+        if field.min_length is not None:
+            ok = pc.and_(ok, pc.greater_equal(
+                length, pa.scalar(field.min_length, length.type)))
+        if field.max_length is not None:
+            ok = pc.and_(ok, pc.less_equal(
+                length, pa.scalar(field.max_length, length.type)))
+    if field.pattern is not None:
+        ok = pc.and_(ok, pc.match_substring_regex(values, field.pattern))
+    if field.to_lower:
+        values = pc.ascii_lower(values)
+    elif field.to_upper:
+        values = pc.ascii_upper(values)
+    ok = pc.fill_null(ok, False)
+
+    return plain, ok, values
+
+
+def _rewrites_input(model: Type[pydantic.BaseModel]) -> bool:
+    """Whether a model has validators that may change its raw input before its
+    fields are validated"""
+    return any(d.info.mode in ('before', 'wrap') for d in
+               model.__pydantic_decorators__.model_validators.values())
+
+
+def _string_field(key: str, field: FieldInfo, config: pydantic.ConfigDict) \
+        -> Optional[_StringField]:
+    """Finds the constraints of a field that can be checked by pyarrow
+
+    Returns:
+        the field's constraints, or None if the field can't be checked by
+        pyarrow or has no constraints
+    """
+    if field.annotation is not str:
+        return None
+    metadata = list(field.metadata)
+    while metadata and isinstance(metadata[-1], pydantic.AfterValidator):
+        metadata.pop()
+    constraints = _constraints(metadata, config)
+    if not constraints or (constraints.get('to_lower')
+                           and constraints.get('to_upper')):
+        return None
+    if 'pattern' in constraints:
+        if config.get('regex_engine') == 'python-re':
+            return None
+        try:
+            pc.match_substring_regex(pa.array([''], pa.string()),
+                                     constraints['pattern'])
+        except pa.ArrowInvalid:
+            # Not supported by RE2
+            return None
+
+    annotation = Annotated[str, *metadata] if metadata else str  # type: ignore
+    adapter = pydantic.TypeAdapter(annotation, config=pydantic.ConfigDict(**{
+        k: v for k, v in config.items()  # type: ignore[typeddict-item]
+        if k.startswith('str_') or k in ('regex_engine', 'strict')}))
+    return _StringField(key=key, adapter=adapter, **constraints)
+
+
+def _constraints(metadata: list[Any], config: pydantic.ConfigDict) \
+        -> Optional[dict[str, Any]]:
+    """Merges the string constraints of a field's metadata over those of its
+    model's config
+
+    Returns:
+        constraints that are set, keyed as in `_StringField`, or None if the
+        metadata has anything other than string constraints
+    """
+    constraints: dict[str, Any] = {
+        'strip_whitespace': config.get('str_strip_whitespace'),
+        'to_lower': config.get('str_to_lower'),
+        'to_upper': config.get('str_to_upper'),
+        'min_length': config.get('str_min_length'),
+        'max_length': config.get('str_max_length'),
+    }
+    for item in metadata:
+        if isinstance(item, pydantic.StringConstraints):
+            constraints.update(
+                (k, v) for k, v in vars(item).items()
+                if k in _StringField.__dataclass_fields__ and v is not None)
+        elif isinstance(item, annotated_types.MinLen):
+            constraints['min_length'] = item.min_length
+        elif isinstance(item, annotated_types.MaxLen):
+            constraints['max_length'] = item.max_length
+        elif isinstance(item, annotated_types.BaseMetadata) \
+                and set(vars(item)) == {'pattern'}:
+            # `Field(pattern=...)`
+            constraints['pattern'] = item.pattern  # type: ignore
+        elif not isinstance(item, pydantic.Strict):
+            return None
+
+    return {k: v for k, v in constraints.items() if v}
+
+
+def _validate_value(adapter: pydantic.TypeAdapter, raw: Any) -> Any:
+    """Validates a single value that pyarrow can't check
+
+    Returns:
+        validated value, or `_INVALID`
+    """
+    try:
+        return adapter.validate_python(raw)
+    except pydantic.ValidationError:
+        return _INVALID
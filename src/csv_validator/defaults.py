@@ -0,0 +1,27 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+# Default values of the CLI's options, kept apart from the modules using them
+# so that arguments can be parsed without importing pydantic
+
+# Number of CSV rows handed to pydantic-core in a single validation call
+DEFAULT_BATCH_SIZE = 1000
+
+# Most bytes taken by the results in a `ResultCache`, by default
+DEFAULT_CACHE_SIZE = 1024 ** 3
+
+# Number of values reported for each column by `--summary`, by default
+DEFAULT_SUMMARY_TOP = 5
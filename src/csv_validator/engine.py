@@ -0,0 +1,433 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import copy
+import enum
+import inspect
+import itertools
+import typing
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import (Annotated, Any, Iterator, NamedTuple, Optional, Tuple,
+                    Type, Union, cast)
+
+import pydantic
+from pydantic.fields import FieldInfo
+from pydantic_core import (CoreConfig, CoreSchema, ErrorDetails,
+                           SchemaValidator, core_schema)
+
+from csv_validator.uniqueness import track_rows as _track_rows
+
+# Validation errors for a batch, keyed by the row's index within the batch
+BatchErrors = dict[int, list[ErrorDetails]]
+
+
+# pylint: disable-next=too-few-public-methods
+class BatchValidator:
+    """Validates batches of CSV rows against a model in a single pydantic-core
+    call by wrapping the model in a `list` `TypeAdapter`.  This avoids the
+    per-row Python overhead of `Model(**row)` and of raising one
+    `pydantic.ValidationError` per invalid row.
+
+    Rows are validated in order, so validators with side effects, such as
+    `csv_validator.helpers.unique`, see rows in the same order as they would
+    when validated one at a time.  With `track_rows`, the validation context is
+    told when each row's validation begins; see
+    `csv_validator.uniqueness.UniqueCollector`.
+
+    With `validate_only`, rows are validated without constructing model
+    instances when nothing needs them: the model's fields are validated by the
+    inner schema of its core schema, as `model.__pydantic_validator__` does
+    before constructing an instance from the result.  Models with `after` or
+    `wrap` model validators, `model_post_init` or a custom `__init__` need
+    their instances, and are validated in full.
+    """
+    _model: Type[pydantic.BaseModel]
+    _validator: Union[pydantic.TypeAdapter, SchemaValidator]
+    validate_only: bool
+
+    def __init__(self, model: Type[pydantic.BaseModel],
+                 track_rows: bool = False, validate_only: bool = False):
+        self._model = model
+        schema = _fields_schema(model, track_rows) if validate_only else None
+        self.validate_only = schema is not None
+        if schema is not None:
+            self._validator = SchemaValidator(schema[0], schema[1])
+            return
+        item: Any = model
+        if track_rows:
+            item = Annotated[model, pydantic.WrapValidator(_track_rows)]
+        self._validator = pydantic.TypeAdapter(list[item])  # type: ignore
+
+    def validate(self, rows: list[dict[str, str]], context: Any = None) \
+            -> Tuple[Optional[list[pydantic.BaseModel]], BatchErrors]:
+        """Validates a batch of CSV rows against the model
+
+        Args:
+            rows: CSV rows as dicts in the form of {field_name: value}
+            context: validation context passed to the model's validators
+
+        Returns:
+            tuple: (list of pydantic model objects or None if any row in the
+            batch is invalid, errors keyed by row index within the batch).
+            The list is empty if `validate_only`.  The leading row index is
+            stripped from each error's `loc` so that errors look the same as
+            those raised by validating a single row.
+        """
+        try:
+            models = self._validator.validate_python(rows, context=context)
+            return ([] if self.validate_only else models), {}
+        except pydantic.ValidationError as e:
+            errors: BatchErrors = defaultdict(list)
+            for err in e.errors(include_url=False):
+                idx, *loc = err['loc']
+                err['loc'] = tuple(loc)
+                errors[int(idx)].append(err)
+            return None, dict(errors)
+
+
+def _fields_schema(model: Type[pydantic.BaseModel], track_rows: bool) \
+        -> Optional[Tuple[CoreSchema, Optional[CoreConfig]]]:
+    """Builds a core schema which validates a list of rows against the fields
+    of a model without constructing model instances
+
+    Returns:
+        tuple: (core schema, core config of the model), or None if the model
+        needs its instances to be validated
+    """
+    schema = model.__pydantic_core_schema__
+    definitions = None
+    if schema['type'] == 'definitions':
+        definitions = schema['definitions']
+        schema = schema['schema']
+    if schema['type'] != 'model' or schema.get('post_init') \
+            or schema.get('custom_init') or schema.get('root_model'):
+        return None
+
+    fields = schema['schema']
+    if track_rows:
+        fields = core_schema.with_info_wrap_validator_function(
+            _track_rows, fields)
+    rows: CoreSchema = core_schema.list_schema(fields)
+    if definitions:
+        rows = core_schema.definitions_schema(rows, definitions)
+    return rows, schema.get('config')
+
+
+# Most distinct values of a field whose results are kept by a
+# `DictionaryEncoder`; values beyond these are validated every time
+DICTIONARY_MAX_SIZE = 4096
+
+# Keys of a model's config that affect how its fields are validated, and so
+# are passed on to the adapters of fields validated on their own
+FIELD_CONFIG_KEYS = frozenset({
+    'arbitrary_types_allowed', 'coerce_numbers_to_str', 'hide_input_in_errors',
+    'regex_engine', 'str_max_length', 'str_min_length',
+    'str_strip_whitespace', 'str_to_lower', 'str_to_upper', 'strict',
+    'use_enum_values', 'validate_default'})
+
+
+def field_config(model: Type[pydantic.BaseModel]) -> pydantic.ConfigDict:
+    """Returns the config of a model to validate its fields with on their
+    own, see `FIELD_CONFIG_KEYS`"""
+    return pydantic.ConfigDict(**{  # type: ignore[typeddict-item]
+        k: v for k, v in model.model_config.items()
+        if k in FIELD_CONFIG_KEYS})
+
+
+def field_type(field: FieldInfo) -> Any:
+    """Returns the type of a field with its `Annotated` metadata, to validate
+    the field with on its own"""
+    if not field.metadata:
+        return field.annotation
+    return Annotated[field.annotation, *field.metadata]  # type: ignore
+
+
+# Marks a raw value, in a field's dictionary, that failed validation
+_INVALID = object()
+
+# Validators in `Annotated` metadata which call a Python function
+FUNCTION_VALIDATORS = (pydantic.AfterValidator, pydantic.BeforeValidator,
+                       pydantic.PlainValidator, pydantic.WrapValidator)
+
+# Validated values copied for each row rather than shared between models
+_MUTABLE_TYPES = frozenset({set, list, dict})
+
+# A batch of rows as passed to `FieldEncoder.encode`: a copy of each row, or
+# None for rows with an invalid value
+EncodedRows = list[Optional[dict[str, Any]]]
+
+
+class FieldEncoder(ABC):
+    """Validates some fields of a model for a batch of rows outside of the
+    model, in some way that is faster than the model.  See
+    `EncodingValidator`.
+    """
+    # keys of the fields validated by the encoder, as in CSV rows
+    keys: list[str]
+
+    def residual(self, field: FieldInfo) -> FieldInfo:
+        """Returns the field as it is left for the model to validate once the
+        encoder has validated it.  By default the model accepts the encoded
+        value as is.
+        """
+        return _as_any(field)
+
+    @abstractmethod
+    def encode(self, rows: list[dict[str, str]], encoded: EncodedRows) \
+            -> None:
+        """Replaces the raw values of the encoder's fields in a batch of rows
+        with their validated values.  Rows with an invalid value for any of
+        the fields are replaced by None.
+
+        Args:
+            rows: CSV rows as dicts in the form of {field_name: value}
+            encoded: a copy of each row, or None if the row is already known
+                to be invalid
+        """
+
+
+# pylint: disable-next=too-few-public-methods
+class EncodingValidator(BatchValidator):
+    """Validates batches of CSV rows like `BatchValidator`, but with some
+    fields validated by `FieldEncoder`s rather than by the model.
+
+    The remaining fields are validated by a subclass of the model in which
+    the encoded fields are `Any` (see `FieldEncoder.residual`), so that field
+    validators, model validators and serializers still run on every row.
+    Rows with an encoded value that is invalid are validated by the model
+    itself so that their errors are exactly those of the model.  When a field
+    is encoded by more than one encoder, the first one validates it.
+    """
+    _encoders: list[FieldEncoder]
+    _full: BatchValidator
+    _keys: frozenset[str]
+
+    def __init__(self, model: Type[pydantic.BaseModel],
+                 encoders: list[FieldEncoder], track_rows: bool = False,
+                 validate_only: bool = False):
+        self._full = BatchValidator(model, track_rows, validate_only)
+        owners: dict[str, FieldEncoder] = {}
+        for encoder in encoders:
+            encoder.keys = [k for k in encoder.keys if k not in owners]
+            owners.update(dict.fromkeys(encoder.keys, encoder))
+        self._encoders = [e for e in encoders if e.keys]
+        self._keys = frozenset(owners)
+        if owners:
+            model = pydantic.create_model(  # type: ignore[call-overload]
+                model.__name__, __base__=model, __module__=model.__module__,
+                **{name: (Any, owners[field.alias or name].residual(field))
+                   for name, field in model.model_fields.items()
+                   if (field.alias or name) in owners})
+        super().__init__(model, track_rows, validate_only)
+
+    def validate(self, rows: list[dict[str, str]], context: Any = None) \
+            -> Tuple[Optional[list[pydantic.BaseModel]], BatchErrors]:
+        """Validates a batch of CSV rows against the model
+
+        Args:
+            rows: CSV rows as dicts in the form of {field_name: value}
+            context: validation context passed to the model's validators
+
+        Returns:
+            tuple: (list of pydantic model objects or None if any row in the
+            batch is invalid, errors keyed by row index within the batch)
+        """
+        if not self._encoders:
+            return super().validate(rows, context)
+
+        encoded: EncodedRows = [dict(row) for row in rows]
+        for encoder in self._encoders:
+            encoder.encode(rows, encoded)
+
+        models: Optional[list[pydantic.BaseModel]] = []
+        errors: BatchErrors = {}
+        start = 0
+        # Validate runs of rows together, in order, so that validators with
+        # side effects see rows in order
+        for invalid, run in itertools.groupby(encoded, key=lambda r: r is None):
+            count = len(list(run))
+            if invalid:
+                run_models, run_errors = self._full.validate(
+                    rows[start:start + count], context)
+            else:
+                run_models, run_errors = super().validate(
+                    cast(list[dict[str, Any]], encoded[start:start + count]),
+                    context)
+                self._raw_inputs(run_errors, rows[start:start + count])
+            if models is not None and run_models is not None:
+                models.extend(run_models)
+            else:
+                models = None
+            errors.update((start + idx, errs)
+                          for idx, errs in run_errors.items())
+            start += count
+        return models, errors
+
+    def _raw_inputs(self, errors: BatchErrors,
+                    rows: list[dict[str, str]]) -> None:
+        """Reports the raw value of encoded fields in errors from validating
+        their encoded values, as the model itself would"""
+        for idx, errs in errors.items():
+            for err in errs:
+                if len(err['loc']) == 1 and err['loc'][0] in self._keys:
+                    err['input'] = rows[idx][cast(str, err['loc'][0])]
+
+
+class _DictionaryField(NamedTuple):
+    """A field validated once per distinct raw value"""
+    key: str
+    adapter: pydantic.TypeAdapter
+    # results of validating each distinct raw value, or `_INVALID`
+    results: dict[Any, Any]
+
+
+# pylint: disable-next=too-few-public-methods
+class DictionaryEncoder(FieldEncoder):
+    """Validates each distinct raw value of low-cardinality fields once,
+    rather than on every row.  Validated values are kept in a dictionary for
+    each field and used for later rows with the same raw value.
+
+    Fields are dictionary-encoded when their validation can only depend on the
+    value itself (see `_raw_value_fields`), and when it is costly enough to be
+    worth looking up instead: those with validator functions or enums.  Other
+    types are validated by pydantic-core about as fast as a value can be
+    looked up.  Validators of dictionary-encoded fields are presumed to be
+    pure functions of the value.
+    """
+    _fields: list[_DictionaryField]
+
+    def __init__(self, model: Type[pydantic.BaseModel]):
+        config = field_config(model)
+        self._fields = []
+        for key, field in _raw_value_fields(model).items():
+            parts = list(annotation_parts(
+                [field.annotation, *field.metadata]))
+            if not any(isinstance(p, FUNCTION_VALIDATORS)
+                       or isinstance(p, type) and issubclass(p, enum.Enum)
+                       for p in parts):
+                continue
+            self._fields.append(_DictionaryField(
+                key=key,
+                adapter=pydantic.TypeAdapter(field_type(field), config=config),
+                results={}))
+        self.keys = [f.key for f in self._fields]
+
+    def encode(self, rows: list[dict[str, str]], encoded: EncodedRows) \
+            -> None:
+        fields = [f for f in self._fields if f.key in self.keys]
+        for idx, row in enumerate(encoded):
+            if row is None:
+                continue
+            for key, adapter, results in fields:
+                raw = row.get(key, _INVALID)
+                if raw is _INVALID:
+                    continue
+                try:
+                    value = results[raw]
+                except KeyError:
+                    value = _validate_value(adapter, results, raw)
+                if value is _INVALID:
+                    encoded[idx] = None
+                    break
+                # Don't share mutable values between models
+                if type(value) in _MUTABLE_TYPES:
+                    value = value.copy()
+                row[key] = value
+
+
+def _validate_value(adapter: pydantic.TypeAdapter, results: dict[Any, Any],
+                    raw: Any) -> Any:
+    """Validates a raw value of a dictionary-encoded field, adding the result
+    to the field's dictionary unless it is full
+
+    Returns:
+        validated value, or `_INVALID`
+    """
+    try:
+        value = adapter.validate_python(raw)
+    except pydantic.ValidationError:
+        value = _INVALID
+    if len(results) < DICTIONARY_MAX_SIZE:
+        results[raw] = value
+    return value
+
+
+def _raw_value_fields(model: Type[pydantic.BaseModel]) -> dict[str, FieldInfo]:
+    """Finds the fields of a model whose validation can only depend on their
+    raw value: those with no `field_validator`s and none of whose own
+    validators take a `ValidationInfo`, as `helpers.unique()` does.  Models
+    with `before` or `wrap` model validators, which may change the raw
+    values, have no such fields.
+
+    Returns:
+        fields keyed by their key in CSV rows
+    """
+    decorators = model.__pydantic_decorators__
+    if any(d.info.mode in ('before', 'wrap')
+           for d in decorators.model_validators.values()):
+        return {}
+    validated = {name for d in decorators.field_validators.values()
+                 for name in d.info.fields}
+    if '*' in validated:
+        return {}
+
+    fields = {}
+    for name, field in model.model_fields.items():
+        if name in validated or any(
+                takes_info(p) for p in annotation_parts(
+                    [field.annotation, *field.metadata])
+                if isinstance(p, FUNCTION_VALIDATORS)):
+            continue
+        fields[field.alias or name] = field
+    return fields
+
+
+def annotation_parts(annotation: Any) -> Iterator[Any]:
+    """Iterates over a type annotation, or a list of them, and every type and
+    `Annotated` metadata item within it"""
+    if isinstance(annotation, (list, tuple)):
+        for a in annotation:
+            yield from annotation_parts(a)
+        return
+    yield annotation
+    # Annotated types, unions and generics, whose arguments include the
+    # metadata of `Annotated`
+    yield from annotation_parts(typing.get_args(annotation))
+
+
+def takes_info(validator: Any) -> bool:
+    """Whether a validator function takes a `ValidationInfo`, and so might
+    depend on more than the value.  Counts required positional parameters the
+    way pydantic does."""
+    try:
+        params = list(inspect.signature(validator.func).parameters.values())
+    except (TypeError, ValueError):
+        return False
+    required = sum(p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)
+                   and p.default is p.empty for p in params[1:])
+    if isinstance(validator, pydantic.WrapValidator):
+        return required > 1
+    return required > 0
+
+
+def _as_any(field: FieldInfo) -> FieldInfo:
+    """Returns a copy of a field which accepts any value as is, keeping its
+    default and alias"""
+    field = copy.copy(field)
+    field.annotation = Any  # type: ignore[assignment]
+    field.metadata = []
+    return field
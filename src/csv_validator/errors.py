@@ -0,0 +1,207 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import bisect
+import json
+import math
+import mmap
+import os
+from typing import IO, Any, Optional
+
+from pydantic_core import ErrorDetails
+
+from csv_validator.parallel import count_lines
+
+# Size of the write buffer of an errors file, so that errors are written in
+# large blocks however many there are
+_BUFFER_SIZE = 1 << 20
+
+
+def _jsonable(value: Any) -> Any:
+    """Returns a JSON-serializable form of an input value that `json` can't
+    serialize, e.g. the set of a field of type `set[IP]`"""
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    return str(value)
+
+
+_ENCODER = json.JSONEncoder(ensure_ascii=False, default=_jsonable)
+
+
+def error_record(line_num: int, row: dict[str, str],
+                 pydantic_err: ErrorDetails) -> dict[str, Any]:
+    """Returns the object of an errors file for a pydantic validation error,
+    with the same details as its log line
+
+    Args:
+        line_num: source line number of the row
+        row: CSV row as a dict in the form of {field_name: value}
+        pydantic_err: error from `pydantic.ValidationError.errors()`
+
+    Returns:
+        error as a dict of line, cluster_name, column, type, message and input
+    """
+    loc = pydantic_err['loc']
+    return {'line': line_num, 'cluster_name': row.get('cluster_name') or None,
+            'column': loc[0] if loc else None, 'type': pydantic_err['type'],
+            'message': pydantic_err['msg'], 'input': pydantic_err['input']}
+
+
+class ErrorWriter:
+    """Writes the errors found in rows to a file as newline-delimited JSON,
+    one object per error, see `error_record`.  Errors are written through a
+    large buffer, bypassing logging, so sources with millions of errors are
+    reported about as fast as they can be written.
+    """
+    path: str
+    # number of errors written
+    count: int
+    _fp: Optional[IO]
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: path to the errors file
+        """
+        self.path = path
+        self.count = 0
+        self._fp = None
+
+    def open(self) -> None:
+        """Opens the errors file, truncating it
+
+        Raises:
+            OSError: if the file can't be opened
+        """
+        # pylint: disable-next=consider-using-with
+        self._fp = open(self.path, 'w', encoding='utf-8', newline='\n',
+                        buffering=_BUFFER_SIZE)
+        self.count = 0
+
+    def write(self, record: dict[str, Any]) -> None:
+        """Writes an error
+
+        Args:
+            record: error, see `error_record`
+        """
+        assert self._fp is not None
+        self._fp.write(_ENCODER.encode(record) + '\n')
+        self.count += 1
+
+    def close(self) -> None:
+        """Flushes and closes the errors file, if open"""
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+
+class ErrorBudget:
+    """Number of errors after which a source is invalid enough that the rest
+    of it needn't be read, from `--max-errors` and `--max-error-rate`.  The
+    budget is spent by the error that reaches it, and the rest of that error's
+    row is still reported, so a run stops after the same row whether it's
+    validated in one process or in shards.
+    """
+    max_errors: Optional[int]
+    # most errors per row of the source
+    max_error_rate: Optional[float]
+    # number of errors that spends the budget, set by `start`
+    limit: int
+    errors: int
+    # number of rows validated, up to the row that spent the budget
+    rows: int
+    # source line of the error that spent the budget
+    spent_line: Optional[int]
+
+    def __init__(self, max_errors: Optional[int] = None,
+                 max_error_rate: Optional[float] = None):
+        """
+        Args:
+            max_errors: number of errors after which to stop
+            max_error_rate: number of errors per row of the source past which
+                to stop, e.g. 0.01 for 1 error in 100 rows
+        """
+        self.max_errors = max_errors
+        self.max_error_rate = max_error_rate
+        self.limit = 0
+        self.errors = 0
+        self.rows = 0
+        self.spent_line = None
+
+    def start(self, path: str) -> None:
+        """Starts counting the errors of a source, setting `limit`
+
+        Args:
+            path: path to the source CSV; its lines are counted to find the
+                limit of `max_error_rate`
+        """
+        limits = []
+        if self.max_errors is not None:
+            limits.append(self.max_errors)
+        if self.max_error_rate is not None:
+            limits.append(
+                math.floor(self.max_error_rate * _count_rows(path)) + 1)
+        self.limit = min(limits)
+        self.errors, self.rows, self.spent_line = 0, 0, None
+
+    def spend(self, line_num: int) -> None:
+        """Counts an error
+
+        Args:
+            line_num: source line number of the error's row
+        """
+        self.errors += 1
+        if self.errors >= self.limit and self.spent_line is None:
+            self.spent_line = line_num
+
+    def count(self, lines: list[int]) -> None:
+        """Counts validated rows, but for those after the row that spent the
+        budget, so that `rows` doesn't depend on how rows were batched
+
+        Args:
+            lines: source line number of each row, in order
+        """
+        if self.spent_line is None:
+            self.rows += len(lines)
+        else:
+            self.rows += bisect.bisect_right(lines, self.spent_line)
+
+    @property
+    def spent(self) -> bool:
+        """Whether the budget has been spent"""
+        return self.spent_line is not None
+
+    def past(self, line_num: Optional[int]) -> bool:
+        """Returns whether a record comes after the row that spent the budget,
+        and so shouldn't be reported
+
+        Args:
+            line_num: source line number of the record's row, or None for
+                records not about a row
+        """
+        return self.spent_line is not None \
+            and (line_num is None or line_num > self.spent_line)
+
+
+def _count_rows(path: str) -> int:
+    """Counts the rows of a source CSV, as its lines after the header; values
+    with newlines make this an overestimate"""
+    if not os.path.getsize(path):
+        return 0
+    with open(path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        lines = count_lines(mm, 0, len(mm)) + (mm[-1:] != b'\n')
+    return max(lines - 1, 0)
@@ -20,23 +20,40 @@ from typing import Callable, Optional, Set, Annotated
 
 import pydantic
 
+from csv_validator.uniqueness import UniqueContext, ValueIndex, \
+    not_unique_message
+
 
 def unique() -> Callable:
     """Validator function to be used by Pydantic for ensuring a value is unique
-    in a set.  Since this is a closure over `seen`, we're assuming that the
-    incoming data checked for uniqueness is small enough to fit in memory.
+    in a set.
+
+    When validating with a `UniqueContext` as the validation context, as the
+    CLI does, values are checked by the context, which holds the values seen
+    during that validation run only.  A `UniqueScope` checks them as they are
+    validated; a `UniqueCollector`, used when validating with multiple workers
+    or with `--memory-limit`, collects them for the CLI to check with a
+    `UniqueIndex`, which can fall back to an external sort for values that
+    don't fit in memory.
+
+    Without a context, values are checked against `seen`, a `ValueIndex` in
+    this closure, which lives as long as the validator.  It switches to
+    compact fingerprints of the values once it holds many of them, so that
+    large sources don't exhaust memory.
 
     Returns:
         Validator function
     """
-    seen = set()
+    seen = ValueIndex()
 
-    def nested[T](v: Hashable) -> T:  # type: ignore
+    def nested[T](v: Hashable, info: pydantic.ValidationInfo) -> T:  # type: ignore
         """ Performs the uniqueness check. Incoming value must be hashable
-        as we're using a set to hold all our "seen" values.
+        and picklable as we're using a `ValueIndex` to hold all our "seen"
+        values.
 
         Args:
             v: value to check for uniqueness
+            info: validation info, whose context may be a `UniqueContext`
 
         Returns:
             unchanged value of v
@@ -44,9 +61,11 @@ def unique() -> Callable:
         Raises:
             ValueError if value has already been seen, meaning it is not unique
         """
-        if v in seen:
-            raise ValueError(f'Value "{v} is not unique')
-        seen.add(v)
+        if isinstance(info.context, UniqueContext):
+            info.context.check(nested, info.field_name or '', v)
+            return v
+        if seen.add(v) is not None:
+            raise ValueError(not_unique_message(v))
         return v
 
     return nested
@@ -0,0 +1,231 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import csv
+import io
+import itertools
+import os
+import subprocess
+from collections import Counter
+from typing import Annotated, Any, NamedTuple, Optional, Type
+
+import pydantic
+
+from csv_validator.cache import (CachedValues, KnownRows, model_source_files,
+                                 row_digests)
+from csv_validator.engine import (FUNCTION_VALIDATORS, annotation_parts,
+                                  field_config, takes_info)
+from csv_validator.helpers import unique
+
+# Code of every validator returned by `helpers.unique()`
+_UNIQUE_CODE = unique().__code__
+
+# Number of rows of the earlier revision hashed at a time
+_READ_BATCH_SIZE = 1000
+
+
+class _UniqueField(NamedTuple):
+    """A field validated with `helpers.unique()`"""
+    name: str
+    key: str
+    # validates the field's raw value up to its `unique()` validator
+    adapter: pydantic.TypeAdapter
+
+
+class PreviousRevision(KnownRows):
+    """Rows of a source of truth which are unchanged since an earlier git
+    revision of it, and so are presumed to be valid, as the source was at
+    that revision.  Rows are compared by their raw content, so reordered
+    rows are unchanged too.
+
+    The values of each unchanged row's unique fields are still checked
+    against those of every other row.  They are found by validating just
+    those fields, up to their `unique()` validator, which needs them to
+    depend on nothing but their raw value: no `field_validator`s but
+    `after` ones, nor `before` or `wrap` model validators.
+
+    Rows can't be presumed valid if the model may have changed since the
+    revision, so nothing is skipped if any source file of the model in the
+    source's repository has changed; see `cache.model_source_files`.
+    Changes to files elsewhere, such as installed packages, aren't seen.
+    """
+    description = 'unchanged since the earlier revision'
+    rev: str
+    _model: Type[pydantic.BaseModel]
+    # None if unique values can't be validated on their own
+    _fields: Optional[list[_UniqueField]]
+    # digests of the rows at `rev`, counting repeated rows
+    _previous: Counter[bytes]
+
+    def __init__(self, model: Type[pydantic.BaseModel], rev: str):
+        """
+        Args:
+            model: model rows are validated against
+            rev: git revision of the source to compare with
+        """
+        self.rev = rev
+        self._model = model
+        self._fields = _unique_fields(model)
+        self._previous = Counter()
+        self.hits = self.misses = 0
+
+    def load(self, path: str, encoding: str) -> int:
+        """Reads the rows of a source of truth at the revision
+
+        Args:
+            path: path to the source CSV, in a git working tree
+            encoding: encoding of the source CSV
+
+        Returns:
+            number of rows at the revision
+
+        Raises:
+            RuntimeError: if rows of the source can't be skipped, saying why
+        """
+        self._previous = Counter()
+        if self._fields is None:
+            raise RuntimeError("values of unique fields can't be validated "
+                               "on their own")
+        directory = os.path.dirname(os.path.abspath(path))
+        top = os.fsdecode(_git(['rev-parse', '--show-toplevel'],
+                               directory).stdout.strip())
+        sources = [f for f in model_source_files(self._model)
+                   if not os.path.relpath(f, top).startswith(os.pardir)]
+        # `git diff --quiet` exits with 1 if the files differ
+        if sources and _git(['diff', '--quiet', self.rev, '--', *sources],
+                            top, ok=(0, 1)).returncode:
+            raise RuntimeError(f'the model has changed since {self.rev}')
+
+        data = _git(['show', f'{self.rev}:./{os.path.basename(path)}'],
+                    directory).stdout
+        reader = csv.DictReader(
+            io.TextIOWrapper(io.BytesIO(data), encoding=encoding),
+            dialect='excel', strict=True)
+        previous: Counter[bytes] = Counter()
+        try:
+            for batch in itertools.batched(reader, _READ_BATCH_SIZE):
+                previous.update(row_digests(list(batch)))
+        except (csv.Error, UnicodeDecodeError) as e:
+            raise RuntimeError(
+                f"the source can't be parsed at {self.rev}: {e}") from e
+        self._previous = previous
+        return previous.total()
+
+    def lookup(self, rows: list[dict[str, str]], digests: list[bytes]) \
+            -> list[Optional[CachedValues]]:
+        known: list[Optional[CachedValues]] = []
+        for row, digest in zip(rows, digests):
+            values = None
+            if self._previous[digest] > 0:
+                values = self._unique_values(row)
+            if values is None:
+                self.misses += 1
+            else:
+                self._previous[digest] -= 1
+                self.hits += 1
+            known.append(values)
+        return known
+
+    def _unique_values(self, row: dict[str, str]) -> Optional[CachedValues]:
+        """Validates the unique fields of a row
+
+        Returns:
+            values of the fields, or None if any is missing or invalid
+        """
+        values: CachedValues = []
+        for name, key, adapter in self._fields or ():
+            raw = row.get(key)
+            if raw is None:
+                return None
+            try:
+                values.append((name, adapter.validate_python(raw)))
+            except pydantic.ValidationError:
+                return None
+        return values
+
+
+def _unique_fields(model: Type[pydantic.BaseModel]) \
+        -> Optional[list[_UniqueField]]:
+    """Finds the fields of a model validated with `helpers.unique()`, with
+    adapters for their values
+
+    Returns:
+        list of fields, or None if the value of any of them may depend on
+        more than its raw value, or `unique()` is used anywhere but directly
+        on a field
+    """
+    decorators = model.__pydantic_decorators__
+    rewrites = any(d.info.mode in ('before', 'wrap')
+                   for d in decorators.model_validators.values())
+    custom = {name for d in decorators.field_validators.values()
+              if d.info.mode != 'after' for name in d.info.fields}
+    config = field_config(model)
+
+    fields = []
+    for name, field in model.model_fields.items():
+        if any(_is_unique(p) for p in annotation_parts(field.annotation)):
+            return None
+        position = next((idx for idx, item in enumerate(field.metadata)
+                         if _is_unique(item)), None)
+        if position is None:
+            continue
+        before = field.metadata[:position]
+        if rewrites or name in custom or '*' in custom or any(
+                isinstance(p, FUNCTION_VALIDATORS) and takes_info(p)
+                for p in annotation_parts(before)):
+            return None
+        annotation: Any = field.annotation
+        if before:
+            annotation = Annotated[annotation, *before]  # type: ignore
+        fields.append(_UniqueField(
+            name=name, key=field.alias or name,
+            adapter=pydantic.TypeAdapter(annotation, config=config)))
+    return fields
+
+
+def _is_unique(item: Any) -> bool:
+    """Whether an annotation or metadata item is a `helpers.unique()`
+    validator"""
+    func = getattr(item, 'func', None)
+    return isinstance(item, FUNCTION_VALIDATORS) \
+        and getattr(func, '__code__', None) is _UNIQUE_CODE
+
+
+def _git(args: list[str], cwd: str, ok: tuple[int, ...] = (0,)) \
+        -> subprocess.CompletedProcess:
+    """Runs a git command
+
+    Args:
+        args: arguments to git
+        cwd: directory to run git in
+        ok: exit codes which don't mean that the command failed
+
+    Returns:
+        completed process, with its output as bytes
+
+    Raises:
+        RuntimeError: if the command fails
+    """
+    try:
+        process = subprocess.run(['git', *args], cwd=cwd, capture_output=True,
+                                 check=False)
+    except OSError as e:
+        raise RuntimeError(f"git can't be run: {e}") from e
+    if process.returncode not in ok:
+        raise RuntimeError(
+            f"'git {' '.join(args[:2])}' failed: "
+            f"{process.stderr.decode(errors='replace').strip()}")
+    return process
@@ -0,0 +1,204 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import time
+from typing import Any, NamedTuple, Optional, Tuple, Type
+
+import pydantic
+
+from csv_validator.engine import field_config, field_type
+from csv_validator.uniqueness import UniqueScope
+
+# Latencies are counted in buckets of microseconds, with `_SUB_BUCKETS`
+# buckets for each power of two, as in an HDR histogram: values are kept to
+# within 1 / `_SUB_BUCKETS` of their size, from 1 µs to any size
+_SUB_BUCKET_BITS = 5
+_SUB_BUCKETS = 1 << _SUB_BUCKET_BITS
+_HALF_BUCKETS = _SUB_BUCKETS >> 1
+
+
+def _bucket(micros: int) -> int:
+    """Returns the index of the bucket counting a latency"""
+    if micros < _SUB_BUCKETS:
+        return micros
+    shift = micros.bit_length() - _SUB_BUCKET_BITS
+    return (shift << (_SUB_BUCKET_BITS - 1)) + (micros >> shift)
+
+
+def _bucket_limit(idx: int) -> int:
+    """Returns the highest latency, in microseconds, counted by a bucket"""
+    if idx < _SUB_BUCKETS:
+        return idx
+    shift = idx // _HALF_BUCKETS - 1
+    mantissa = idx % _HALF_BUCKETS + _HALF_BUCKETS
+    return ((mantissa + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """Counts latencies in logarithmic buckets, in constant space for any
+    number of them, to report their percentiles"""
+    # number of latencies in each bucket
+    counts: list[int]
+    count: int
+    # highest latency in seconds, and the source line it was recorded for
+    max: float
+    max_line: int
+
+    def __init__(self) -> None:
+        self.counts = []
+        self.count = 0
+        self.max = 0.0
+        self.max_line = 0
+
+    def record(self, seconds: float, line: int) -> None:
+        """Counts a latency
+
+        Args:
+            seconds: latency in seconds
+            line: source line number of the row
+        """
+        idx = _bucket(int(seconds * 1e6))
+        if idx >= len(self.counts):
+            self.counts.extend([0] * (idx + 1 - len(self.counts)))
+        self.counts[idx] += 1
+        self.count += 1
+        if seconds > self.max:
+            self.max, self.max_line = seconds, line
+
+    def percentile(self, fraction: float) -> float:
+        """Returns the latency that the given fraction of latencies are at or
+        below, to within the precision of the buckets
+
+        Args:
+            fraction: e.g. 0.99 for the 99th percentile
+
+        Returns:
+            latency in seconds, no more than the highest latency
+        """
+        rank = max(1, round(fraction * self.count))
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.max, (_bucket_limit(idx) + 1) / 1e6)
+        return self.max
+
+    def summary(self) -> str:
+        """Returns the percentiles of the latencies, in milliseconds"""
+        percentiles = ', '.join(
+            f'p{round(fraction * 100)} {self.percentile(fraction) * 1e3:.3f}'
+            for fraction in (0.5, 0.9, 0.99))
+        return (f'Row latency of {self.count} rows in ms: {percentiles}, '
+                f'max {self.max * 1e3:.3f} on line {self.max_line}')
+
+
+class SlowRow(NamedTuple):
+    """Row which took longer than `--slow-row-ms` to validate"""
+    line: int
+    cluster_name: Optional[str]
+    seconds: float
+    # key of the field that took longest on its own, if any, and its time
+    field: Optional[str]
+    field_seconds: float
+
+    def message(self) -> str:
+        """Returns the warning logged for the row"""
+        c = f'cluster {self.cluster_name}' if self.cluster_name \
+            else 'cluster name unknown'
+        longest = '' if self.field is None else \
+            f", longest in column '{self.field}' " \
+            f"({self.field_seconds * 1e3:.3f} ms)"
+        return (f'Line {self.line}, {c}, slow row: validated in '
+                f'{self.seconds * 1e3:.3f} ms{longest}')
+
+
+class RowLatency:
+    """Latencies of validating each row of a source, for `--row-latency` and
+    `--slow-row-ms`.  Rows slower than the threshold are timed again a field
+    at a time, to find the field that took longest."""
+    histogram: LatencyHistogram
+    # rows slower than this many seconds are reported, if set
+    threshold: Optional[float]
+    # adapter validating each field of the model on its own, by key in CSV
+    # rows; built when a row is first found to be slow
+    _fields: Optional[dict[str, pydantic.TypeAdapter]]
+
+    def __init__(self, slow_row_ms: Optional[float] = None):
+        """
+        Args:
+            slow_row_ms: threshold for slow rows in milliseconds, if any
+        """
+        self.histogram = LatencyHistogram()
+        self.threshold = None if slow_row_ms is None else slow_row_ms / 1e3
+        self._fields = None
+
+    def reset(self) -> None:
+        """Forgets the latencies of earlier runs"""
+        self.histogram = LatencyHistogram()
+
+    def record(self, seconds: float, line: int) -> bool:
+        """Counts the latency of a row
+
+        Args:
+            seconds: time taken to validate the row
+            line: source line number of the row
+
+        Returns:
+            whether the row is slow
+        """
+        self.histogram.record(seconds, line)
+        return self.threshold is not None and seconds > self.threshold
+
+    def slowest_field(self, model: Type[pydantic.BaseModel],
+                      row: dict[str, Any]) -> Tuple[Optional[str], float]:
+        """Validates each field of a row on its own, as the model would, with
+        a validation context of its own so that values of unique fields
+        aren't counted as seen
+
+        Args:
+            model: model the row was validated with
+            row: CSV row as a dict in the form of {field_name: value}
+
+        Returns:
+            tuple: (key of the field that took longest or None if the row has
+            no fields of the model, seconds it took)
+        """
+        if self._fields is None:
+            self._fields = _field_adapters(model)
+        slowest, longest = None, 0.0
+        for key, adapter in self._fields.items():
+            if key not in row:
+                continue
+            context: Any = UniqueScope()
+            start = time.perf_counter()
+            try:
+                adapter.validate_python(row[key], context=context)
+            except pydantic.ValidationError:
+                pass
+            seconds = time.perf_counter() - start
+            if slowest is None or seconds > longest:
+                slowest, longest = key, seconds
+        return slowest, longest
+
+
+def _field_adapters(model: Type[pydantic.BaseModel]) \
+        -> dict[str, pydantic.TypeAdapter]:
+    """Returns an adapter validating each field of a model on its own, keyed
+    by the field's key in CSV rows"""
+    config = field_config(model)
+    return {field.alias or name: pydantic.TypeAdapter(field_type(field),
+                                                      config=config)
+            for name, field in model.model_fields.items()}
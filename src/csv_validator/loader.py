@@ -0,0 +1,212 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import argparse
+import hashlib
+import importlib
+import importlib.util
+import logging
+import os
+import pathlib
+import sys
+import threading
+import types
+from typing import TYPE_CHECKING, Callable, Optional, Type
+
+if TYPE_CHECKING:
+    # Imported by models, once they're loaded, rather than by the daemon's
+    # clients
+    import pydantic
+
+# Package of validator modules loaded from files, which isn't imported
+_MODELS_PACKAGE = 'csv_validator._models'
+
+# Validates a source of truth as given by the arguments of the CLI, with a
+# model loaded already, if any, returning the CLI's exit code
+Runner = Callable[[argparse.Namespace, logging.Logger,
+                   Optional[Type['pydantic.BaseModel']]], int]
+
+
+def get_validator_module(v_mod: str) -> types.ModuleType:
+    """Takes a validator module as a string, either a path to a Python file or
+    a module name.  If the path is a file (any file), it tries to convert the
+    path into a module and load it.  If the string isn't a path, it tries to
+    import the module directly.  The imported module is returned. Raises a
+    `RuntimeError` if module import fails.
+
+    Returns:
+        object: module
+    """
+    p = pathlib.Path(v_mod)
+
+    try:
+        if p.is_file():
+            module_name = _file_module_name(p)
+            spec = importlib.util.spec_from_file_location(module_name,
+                                                          str(p.absolute()))
+            module = importlib.util.module_from_spec(spec)  # type: ignore
+            # Registered, for the source of the model to be found
+            sys.modules[module_name] = module
+            spec.loader.exec_module(module)  # type: ignore
+        else:
+            module = importlib.import_module(v_mod)
+    except ModuleNotFoundError as e:
+        raise RuntimeError('error loading module') from e
+
+    return module
+
+
+def _file_module_name(path: pathlib.Path) -> str:
+    """Returns the name to register a validator module loaded from a file
+    under, which is private to the package and unique to the file's path, so
+    that it doesn't shadow a module of the same name, such as `platform`
+
+    Args:
+        path: path to the Python file
+
+    Returns:
+        module name
+    """
+    digest = hashlib.sha256(str(path.absolute()).encode()).hexdigest()
+    return f'{_MODELS_PACKAGE}.{path.stem}_{digest[:12]}'
+
+
+def load_validator_model(validator_module: Optional[str],
+                         logger: logging.Logger) \
+        -> Optional[Type['pydantic.BaseModel']]:
+    """If a validator module is given, this function attempts to dynamically
+    load the module path with a call to `get_validator_module`.  It expects
+    to find an attribute, specifically a class, by the name
+    `SourceOfTruthModel` inside the loaded module.
+
+    Args:
+        validator_module: module name or path to Python file, as passed to
+            the CLI
+        logger: logger for loading errors
+
+    Returns:
+        pydantic.BaseModel subclass as a dynamically loaded class from the
+        provided validator module path or None if no validator module is
+        given
+
+    Raises:
+        RuntimeError: if any issues were encountered dynamically loading the
+        module and accessing its `SourceOfTruthModel` attribute
+    """
+    if not validator_module:
+        return None
+
+    logger.debug(f"Loading validator module '{validator_module}'")
+
+    try:
+        validator_mod = get_validator_module(validator_module)
+    except RuntimeError as e:
+        logger.exception(
+            f'Error dynamically loading validator '
+            f'{validator_module}. '
+            f'Check filename/path.', exc_info=e)
+        raise e
+
+    model: Type['pydantic.BaseModel']
+    try:
+        model = validator_mod.SourceOfTruthModel
+    except AttributeError as e:
+        logger.exception(
+            f'Error accessing "SourceOfTruthModel" from loaded module '
+            f'({validator_module}). Ensure validator model contains '
+            f'this class.', exc_info=e)
+        raise RuntimeError("no attribute 'SourceOfTruthModel'") from e
+
+    if not isinstance(model, type):
+        logger.error(f'Dynamically loaded `SourceOfTruthModel` object'
+                     f' from {validator_module} is not a class')
+        raise RuntimeError('SourceOfTruthModel is not a class')
+
+    return model
+
+
+class ModelCache:
+    """Models loaded by a long-lived process, such as the daemon of
+    `validate_csv serve`, keyed by their validator module.  A model
+    loaded from a file is loaded again when the file's modification time
+    changes; modules it imports are not."""
+    _models: dict[str, tuple[Optional[int], Type['pydantic.BaseModel']]]
+    _lock: threading.Lock
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def get(self, validator_module: Optional[str], logger: logging.Logger) \
+            -> Optional[Type['pydantic.BaseModel']]:
+        """Returns the model of a validator module, loading it if it isn't
+        loaded or has changed since
+
+        Args:
+            validator_module: module name or path to Python file, as passed
+                to the CLI
+            logger: logger for loading errors
+
+        Returns:
+            model, or None if no validator module is given
+
+        Raises:
+            RuntimeError: if the module can't be loaded, see
+                `loader.load_validator_model`
+        """
+        if not validator_module:
+            return None
+        try:
+            mtime: Optional[int] = os.stat(validator_module).st_mtime_ns
+        except OSError:
+            # A module name
+            mtime = None
+        # Loaded one at a time, as modules are registered in `sys.modules`
+        with self._lock:
+            loaded = self._models.get(validator_module)
+            if loaded is not None and loaded[0] == mtime:
+                logger.debug(f"Using validator module '{validator_module}' "
+                             f"loaded earlier")
+                return loaded[1]
+            model = load_validator_model(validator_module, logger)
+            assert model is not None
+            self._models[validator_module] = (mtime, model)
+            return model
+
+    def validate(self, args: argparse.Namespace, logger: logging.Logger,
+                 run: Runner) -> int:
+        """Validates a source of truth with the model of its validator
+        module, loading it if need be
+
+        Args:
+            args: arguments of the CLI
+            logger: logger for the source
+            run: validates the source of truth
+
+        Returns:
+            CLI exit code as int
+        """
+        try:
+            model = self.get(args.validator_module, logger)
+        except RuntimeError:
+            return 1
+        try:
+            return run(args, logger, model)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # Reported with the source's log, as the CLI would when it exits,
+            # rather than ending the process
+            logger.exception('Error validating source', exc_info=e)
+            return 1
@@ -0,0 +1,222 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from typing import Optional
+
+# Format of the CLI's log lines
+LOG_FORMAT = '%(levelname)-7s %(message)s'
+
+# Most records waiting to be written; past this, logging waits for them to be
+# written, so memory stays bounded when records are logged faster than they
+# can be written
+_QUEUE_SIZE = 10_000
+
+
+class LogFormatter(logging.Formatter):
+    """Formats records with `LOG_FORMAT`, but for reports asked for by an
+    option, such as the table of `--profile`, which are logged with
+    `extra={'report': True}` and written without a level name, as they are
+    logged at the level of the logger whatever it is"""
+
+    def __init__(self) -> None:
+        super().__init__(LOG_FORMAT)
+
+    def format(self, record: logging.LogRecord) -> str:
+        if getattr(record, 'report', False):
+            return record.getMessage()
+        return super().format(record)
+
+
+class _Marker:  # pylint: disable=too-few-public-methods
+    """Put on the queue of a `_BufferedQueueListener` to wait until the
+    records before it are written"""
+    written: threading.Event
+
+    def __init__(self) -> None:
+        self.written = threading.Event()
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """`QueueHandler` which leaves formatting records to the listener's
+    thread, rather than formatting them on the thread logging them.  Records
+    must only be logged with arguments that aren't changed afterwards."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        self.queue.put_nowait(record)
+        if self.queue.qsize() >= _QUEUE_SIZE:  # type: ignore[attr-defined]
+            self.wait()
+
+    def wait(self) -> None:
+        """Waits until the records logged so far have been written"""
+        marker = _Marker()
+        self.queue.put_nowait(marker)
+        marker.written.wait()
+
+
+class _BufferedStreamHandler(logging.StreamHandler):
+    """`StreamHandler` which doesn't flush its stream after each record; see
+    `_BufferedQueueListener`"""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except RecursionError:
+            raise
+        except Exception:  # pylint: disable=broad-exception-caught
+            self.handleError(record)
+
+
+class _BufferedQueueListener(logging.handlers.QueueListener):
+    """`QueueListener` which flushes its handlers only once the queue is
+    empty, or when waited for, so that records logged in quick succession are
+    written together"""
+
+    def dequeue(self, block: bool) -> logging.LogRecord:
+        if block and self.queue.empty():  # type: ignore[attr-defined]
+            self.flush()
+        return super().dequeue(block)
+
+    def handle(self, record: logging.LogRecord) -> None:
+        if isinstance(record, _Marker):
+            self.flush()
+            record.written.set()
+            return
+        super().handle(record)
+
+    def flush(self) -> None:
+        """Flushes the listener's handlers"""
+        for handler in self.handlers:
+            handler.flush()
+
+    def stop(self) -> None:
+        """Handles the records left in the queue, flushes the handlers and
+        stops the listener's thread"""
+        if self._thread is not None:  # type: ignore[attr-defined]
+            super().stop()
+            self.flush()
+
+
+# Handlers of the pipeline set up by `setup_logger`, while its listener runs:
+# the root logger's, and the listener's
+_handler: Optional[_DeferredQueueHandler] = None
+_writer: Optional[_BufferedStreamHandler] = None
+
+
+def log_level(verbosity: int) -> int:
+    """Returns the log level for a verbosity; higher = more verbose
+
+    Args:
+        verbosity: int as the level of expected verbosity
+
+    Returns:
+        log level
+    """
+    if verbosity == 1:
+        return logging.INFO
+    if verbosity >= 2:
+        return logging.DEBUG
+    return logging.WARN
+
+
+def setup_logger(verbosity: int) -> logging.Logger:
+    """Sets up logger, setting log level higher for increased verbosity
+
+    Unless the root logger has handlers already, records are written to
+    standard output by a `QueueListener` on a thread of its own, so that
+    the thread validating rows only puts them on a queue: formatting and
+    writing them, which is slow when most rows are invalid, is left to the
+    listener.  Records are written in the order they are logged, and flushed
+    whenever the queue is empty and once the process exits; `flush_logs`
+    waits for the records logged so far to be written.
+
+    Args:
+        verbosity: int as the level of expected verbosity; higher = more verbose
+
+    Returns:
+        logger
+    """
+    global _handler, _writer  # pylint: disable=global-statement
+    logger = logging.getLogger()
+    logger.setLevel(log_level(verbosity))
+    if logger.handlers:
+        return logger
+
+    _writer = _BufferedStreamHandler(sys.stdout)
+    _writer.setFormatter(LogFormatter())
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    listener = _BufferedQueueListener(records, _writer)
+    listener.start()
+    atexit.register(_stop, listener)
+    _handler = _DeferredQueueHandler(records)
+    logger.addHandler(_handler)
+    return logger
+
+
+def flush_logs() -> None:
+    """Waits for the records logged so far to be written to standard output,
+    before writing to it directly"""
+    if _handler is not None:
+        _handler.wait()
+
+
+def _stop(listener: _BufferedQueueListener) -> None:
+    """Writes the records left in the queue as the process exits"""
+    global _handler, _writer  # pylint: disable=global-statement
+    _handler, _writer = None, None
+    listener.stop()
+
+
+def _before_fork() -> None:
+    """Writes the records logged so far before forking, so that a child
+    doesn't inherit them in the buffer of standard output, and keeps the
+    listener from writing while forking"""
+    if _handler is not None and _writer is not None:
+        _handler.wait()
+        _writer.acquire()
+
+
+def _after_fork_in_parent() -> None:
+    if _writer is not None:
+        _writer.release()
+
+
+def _after_fork_in_child() -> None:
+    """Logs synchronously in a forked child process, such as a worker of a
+    pool, which doesn't have the listener's thread"""
+    global _handler, _writer  # pylint: disable=global-statement
+    if _handler is None:
+        return
+    logger = logging.getLogger()
+    logger.removeHandler(_handler)
+    _handler, _writer = None, None
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(LogFormatter())
+    logger.addHandler(handler)
+
+
+os.register_at_fork(before=_before_fork,
+                    after_in_parent=_after_fork_in_parent,
+                    after_in_child=_after_fork_in_child)
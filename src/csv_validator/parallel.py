@@ -0,0 +1,241 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import csv
+import logging
+import logging.handlers
+import mmap
+import os
+import re
+from dataclasses import dataclass, field
+from typing import IO, Optional
+
+from csv_validator.summary import ErrorSummary
+from csv_validator.uniqueness import UniqueValue
+
+# Shards smaller than this aren't worth the cost of handing to another process
+MIN_SHARD_SIZE = 64 * 1024
+
+# Number of shards planned per worker; more shards than workers keeps workers
+# busy when some shards take longer to validate than others
+SHARDS_PER_WORKER = 4
+
+# A quoted field, including its closing quote.  In the 'excel' dialect a quote
+# only opens a quoted field at the start of a field, that is at the start of
+# the file or directly after a delimiter or newline; anywhere else it is a
+# literal character.  Quotes inside a quoted field are escaped by doubling.
+QUOTED_FIELD = rb'(?<![^,\n])"(?:[^"]|"")*+"'
+
+# A quote that doesn't start a field, and so is a literal character
+LITERAL_QUOTE = rb'(?<=[^,\n])"'
+
+# A whole field, a run of unquoted characters and newlines, or a literal quote
+_FIELD = re.compile(QUOTED_FIELD + rb'|[^"]++|' + LITERAL_QUOTE)
+
+# Consumes fields as `_FIELD` does, stopping either at `endpos` or at the start
+# of a quoted field that doesn't close before `endpos`.  The last field matched
+# is captured, since cutting the source at `endpos` may have changed it: a
+# quote at `endpos - 1` that seems to close a field may really be the first of
+# an escaped pair.
+_SKIP_FIELDS = re.compile(rb'(?:(' + _FIELD.pattern + rb'))*+')
+
+# Consumes the remainder of a record, up to and including the newline that
+# ends it; newlines inside quoted fields don't end a record
+_END_OF_RECORD = re.compile(
+    rb'(?:' + QUOTED_FIELD + rb'|[^"\n]++|' + LITERAL_QUOTE + rb')*+\n')
+
+# Size of the slices read when counting lines in a memory-mapped file
+_COUNT_BLOCK_SIZE = 16 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class Shard:
+    """A byte range of a source CSV which starts and ends on a record
+    boundary"""
+    start: int
+    end: int
+    # number of lines in the source before `start`
+    line_offset: int
+    # whether the shard runs to the end of the source
+    last: bool
+
+
+@dataclass
+class ShardResult:
+    """Outcome of validating a single `Shard` in a worker process"""
+    error: bool
+    # whether the shard was read to its end, i.e. without a CSV parsing error
+    complete: bool
+    records: list[logging.LogRecord] = field(default_factory=list)
+    # values of unique fields, for checking across shards
+    unique_values: list[UniqueValue] = field(default_factory=list)
+    output: Optional[str] = None
+    # number of rows validated, counted with an error budget
+    rows: int = 0
+    # errors counted with `--summary`
+    summary: Optional[ErrorSummary] = None
+
+
+class ShardReader(csv.DictReader):
+    """`csv.DictReader` over a single shard of a source CSV.  Reads the shard
+    with the same dialect as the CLI and reports line numbers relative to the
+    start of the source rather than the start of the shard.
+    """
+    line_offset: int
+    exhausted: bool
+
+    def __init__(self, f: IO, fieldnames: list[str], line_offset: int):
+        super().__init__(f, fieldnames=fieldnames, dialect='excel',
+                         strict=True)
+        self.line_offset = line_offset
+        self.line_num = line_offset
+        self.exhausted = False
+
+    def __next__(self) -> dict[str, str]:
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self.exhausted = True
+            raise
+        self.line_num += self.line_offset
+        return row
+
+
+class RecordCollector(logging.handlers.QueueHandler):
+    """Logging handler which collects records in a list so that they may be
+    returned from a worker process and handled by the parent process' logger,
+    in order.  Records are prepared the same way as by `QueueHandler`, so they
+    are picklable.
+    """
+    records: list[logging.LogRecord]
+
+    def __init__(self):
+        super().__init__(None)  # type: ignore[arg-type]
+        self.records = []
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        self.records.append(record)
+
+    def drain(self) -> list[logging.LogRecord]:
+        """Returns and forgets the collected records
+
+        Returns:
+            list of log records, in the order they were logged
+        """
+        records, self.records = self.records, []
+        return records
+
+
+def plan_shards(path: str, shard_count: int,
+                min_shard_size: int = MIN_SHARD_SIZE) -> list[Shard]:
+    """Splits the rows of a source CSV into up to `shard_count` byte ranges of
+    roughly equal size, each starting and ending on a record boundary.  The
+    header record is not part of any shard.
+
+    Record boundaries are found the way `csv.reader` in the 'excel' dialect
+    finds them, so newlines inside quoted fields do not split records.  Line
+    endings are presumed to be `\\n` or `\\r\\n`.
+
+    Args:
+        path: path to the source CSV
+        shard_count: maximum number of shards
+        min_shard_size: minimum size of a shard in bytes
+
+    Returns:
+        list of shards in source order, or an empty list if the source has no
+        rows after its header
+    """
+    size = os.path.getsize(path)
+    if not size:
+        return []
+
+    with open(path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        header = _END_OF_RECORD.match(mm)  # type: ignore[call-overload]
+        if not header or header.end() == size:
+            return []
+
+        start = header.end()
+        line_offset = count_lines(mm, 0, start)
+        shard_count = max(1, min(shard_count,
+                                 (size - start) // max(1, min_shard_size)))
+        targets = [start + (size - start) * i // shard_count
+                   for i in range(1, shard_count)]
+
+        shards: list[Shard] = []
+        for target in targets:
+            if target <= start:
+                continue
+            # Skip ahead to the target outside of quotes, then on to the end
+            # of the record that the target falls in
+            record = _END_OF_RECORD.match(  # type: ignore[call-overload]
+                mm, skip_fields(mm, start, target))
+            if not record or record.end() == size:
+                break
+            shards.append(Shard(start=start, end=record.end(),
+                                line_offset=line_offset, last=False))
+            line_offset += count_lines(mm, start, record.end())
+            start = record.end()
+
+        shards.append(Shard(start=start, end=size, line_offset=line_offset,
+                            last=True))
+    return shards
+
+
+def skip_fields(mm: mmap.mmap, start: int, target: int) -> int:
+    """Finds the first position at or past `target` that is outside of quotes,
+    by matching whole fields from `start`
+
+    Args:
+        mm: memory-mapped file
+        start: first byte of a record
+        target: position to skip to
+
+    Returns:
+        `target` if it falls outside of quotes, otherwise the end of the first
+        field that ends past `target`, or the start of a quoted field which is
+        never closed
+    """
+    skipped = _SKIP_FIELDS.match(mm, start, target)  # type: ignore[call-overload]
+    assert skipped is not None  # matches the empty string, at least
+    pos = skipped.end()
+    last = skipped.start(1)
+    if last >= 0 and mm[last] == ord('"'):
+        # Match the last field again without cutting the source at `target`
+        pos = last
+    while pos < target:
+        whole = _FIELD.match(mm, pos)  # type: ignore[call-overload]
+        if not whole:
+            break
+        pos = whole.end()
+    return pos
+
+
+def count_lines(mm: mmap.mmap, start: int, end: int) -> int:
+    """Counts the newlines in a range of a memory-mapped file
+
+    Args:
+        mm: memory-mapped file
+        start: first byte of range
+        end: end of range, exclusive
+
+    Returns:
+        number of newlines
+    """
+    lines = 0
+    for pos in range(start, end, _COUNT_BLOCK_SIZE):
+        lines += mm[pos:min(end, pos + _COUNT_BLOCK_SIZE)].count(b'\n')
+    return lines
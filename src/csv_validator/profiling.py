@@ -0,0 +1,189 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import contextlib
+import copy
+import dataclasses
+import functools
+import time
+import types
+import typing
+from typing import Annotated, Any, Iterator, Optional, Type
+
+import pydantic
+
+from csv_validator.engine import FUNCTION_VALIDATORS, field_type
+
+
+class Profiler:
+    """Wall time of the stages of a run of the CLI, and of the validator
+    functions of each field of its model, for `--profile`.
+
+    Stages may be nested; the time of a stage excludes that of the stages
+    within it.  Validator functions are timed by wrappers in a copy of the
+    model, see `profile_model`.
+    """
+    # seconds spent in each stage, outside of the stages within it
+    stages: dict[str, float]
+    # (calls, seconds) of each validator function, by field
+    validators: dict[str, list[float]]
+    # for each stage entered and not yet left: (name, start, seconds spent
+    # in stages within it)
+    _stack: list[list[Any]]
+
+    def __init__(self) -> None:
+        self.stages = {}
+        self.validators = {}
+        self._stack = []
+
+    def reset(self) -> None:
+        """Forgets the times of earlier runs"""
+        self.stages.clear()
+        # Kept by the profiled model's validators
+        for timing in self.validators.values():
+            timing[:] = [0, 0.0]
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Context manager timing a stage
+
+        Args:
+            name: name of the stage
+        """
+        entry: list[Any] = [name, time.perf_counter(), 0.0]
+        self._stack.append(entry)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            seconds = time.perf_counter() - entry[1]
+            self.stages[name] = self.stages.get(name, 0.0) + seconds \
+                - entry[2]
+            if self._stack:
+                self._stack[-1][2] += seconds
+
+    def profile_model(self, model: Type[pydantic.BaseModel]) \
+            -> Type[pydantic.BaseModel]:
+        """Returns a subclass of a model whose fields' validator functions,
+        given in `Annotated` metadata such as `AfterValidator
+        (validate_ipv4_address)`, are timed, including those of types within
+        the fields' types, e.g. `set[IP]`.  `field_validator` methods are not
+        timed.
+
+        Args:
+            model: model to profile
+
+        Returns:
+            profiled model, which validates as the model does
+        """
+        fields: dict[str, Any] = {}
+        for name, field in model.model_fields.items():
+            annotation = field_type(field)
+            timed = self._timed_annotation(name, annotation)
+            if timed is annotation:
+                continue
+            info = copy.copy(field)
+            info.metadata = []
+            fields[name] = (timed, info)
+        if not fields:
+            return model
+        return pydantic.create_model(  # type: ignore[call-overload]
+            model.__name__, __base__=model, __module__=model.__module__,
+            **fields)
+
+    def _timed_annotation(self, field: str, annotation: Any) -> Any:
+        """Returns a type annotation with its validator functions timed, or
+        the annotation itself if it has none"""
+        args = typing.get_args(annotation)
+        if not args:
+            return annotation
+        if typing.get_origin(annotation) is Annotated:
+            return Annotated[
+                self._timed_annotation(field, args[0]),
+                *(self._timed(field, m) if isinstance(m, FUNCTION_VALIDATORS)
+                  else m for m in annotation.__metadata__)]
+        timed = tuple(self._timed_annotation(field, a) for a in args)
+        if all(t is a for t, a in zip(timed, args)):
+            return annotation
+        if isinstance(annotation, types.UnionType) \
+                or typing.get_origin(annotation) is typing.Union:
+            return typing.Union[timed]
+        try:
+            return typing.get_origin(annotation)[timed]
+        except TypeError:
+            # A generic which can't be rebuilt from its arguments
+            return annotation
+
+    def _timed(self, field: str, validator: Any) -> Any:
+        """Returns a copy of a validator whose function adds its time to
+        `validators`"""
+        func = validator.func
+        label = f'{field}: {type(validator).__name__}(' \
+                f'{getattr(func, "__qualname__", repr(func))})'
+        # A validator may be given more than once for a field
+        timing = self.validators.setdefault(label, [0, 0.0])
+
+        # `functools.wraps` keeps the function's signature, by which
+        # pydantic decides whether to pass it a `ValidationInfo`
+        @functools.wraps(func)
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timing[0] += 1
+                timing[1] += time.perf_counter() - start
+
+        return dataclasses.replace(validator, func=timed)
+
+    def report(self, seconds: float) -> list[str]:
+        """Returns a table of the time spent in each stage, and in the
+        validator functions of each field, slowest first
+
+        Args:
+            seconds: wall time of the run
+
+        Returns:
+            lines of the table
+        """
+        stages = dict(self.stages)
+        stages['other'] = max(0.0, seconds - sum(stages.values()))
+        timings = [(label, int(calls), spent) for label, (calls, spent)
+                   in self.validators.items() if calls]
+        width = max([len('field validator'), *map(len, stages),
+                     *(len(label) for label, _, _ in timings)])
+
+        lines = [f'Profile of {seconds:.3f}s:',
+                 f"  {'stage':<{width}} {'seconds':>9} {'share':>7}"]
+        for name, spent in sorted(stages.items(), key=lambda s: -s[1]):
+            share = spent / seconds if seconds else 0.0
+            lines.append(f'  {name:<{width}} {spent:>9.3f} {share:>7.1%}')
+        if timings:
+            lines.append(f"  {'field validator':<{width}} {'seconds':>9} "
+                         f"{'calls':>9} {'µs/call':>9}")
+        for label, calls, spent in sorted(timings, key=lambda t: -t[2]):
+            lines.append(f'  {label:<{width}} {spent:>9.3f} {calls:>9} '
+                         f'{spent / calls * 1e6:>9.2f}')
+        return lines
+
+
+def timed_stage(profiler: Optional[Profiler],
+                name: str) -> contextlib.AbstractContextManager:
+    """Returns a context manager timing a stage with a profiler, or doing
+    nothing without one"""
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.stage(name)
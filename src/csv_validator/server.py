@@ -0,0 +1,274 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import sys
+from typing import Any, BinaryIO, Optional
+
+from csv_validator.arguments import LazyFileType
+from csv_validator.loader import ModelCache, Runner
+from csv_validator.logs import LogFormatter, log_level
+
+# Arguments of a request which are paths, made absolute by the client as the
+# daemon may run in another directory
+_PATH_ARGUMENTS = ('output', 'cache_dir', 'profile_output', 'errors_file')
+
+# Exit code of a request the daemon can't read, as for invalid arguments
+_INVALID_REQUEST = 2
+
+
+class ValidationServer(socketserver.ThreadingUnixStreamServer):
+    """Daemon which validates sources of truth for clients on a Unix socket,
+    keeping their models loaded between requests.  Requests are validated
+    in a thread each.
+
+    A request is a line of JSON with the arguments of the CLI, see
+    `send_request`.  The daemon answers with a line of JSON per log line of
+    the request, `{"log": line}`, and a last line with its exit code,
+    `{"exit_code": code}`, as `CLI.run` would give.
+    """
+    daemon_threads = True
+    models: ModelCache
+    _run: Runner
+
+    def __init__(self, socket_path: str, run: Runner):
+        """
+        Args:
+            socket_path: path to create the socket at
+            run: validates the source of truth of each request
+        """
+        self.models = ModelCache()
+        self._run = run
+        super().__init__(socket_path, _RequestHandler)
+
+    def server_bind(self) -> None:
+        # Only the daemon's user may connect, as requests name files for the
+        # daemon to read and write
+        umask = os.umask(0o077)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+
+    def validate(self, request: dict[str, Any], logger: logging.Logger) \
+            -> int:
+        """Validates the source of truth of a request
+
+        Args:
+            request: arguments of the CLI, see `send_request`
+            logger: logger for the request, sending its records to the client
+
+        Returns:
+            CLI exit code as int
+        """
+        try:
+            args = _request_args(request)
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f'Invalid request: {e!r}')
+            return _INVALID_REQUEST
+        return self.models.validate(args, logger, self._run)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Handles a request to a `ValidationServer`"""
+    server: ValidationServer
+
+    def handle(self) -> None:
+        try:
+            request = json.loads(self.rfile.readline())
+            verbosity = int(request.get('verbose') or 0)
+        except (ValueError, AttributeError) as e:
+            _send(self.wfile, {'log': f'ERROR   Invalid request: {e!r}'})
+            _send(self.wfile, {'exit_code': _INVALID_REQUEST})
+            return
+
+        # Not registered with `logging.getLogger`, which keeps loggers for
+        # the life of the process
+        logger = logging.Logger('csv_validator.serve', log_level(verbosity))
+        handler = _ClientHandler(self.wfile)
+        handler.setFormatter(LogFormatter())
+        logger.addHandler(handler)
+        exit_code = self.server.validate(request, logger)
+        try:
+            _send(self.wfile, {'exit_code': exit_code})
+        except OSError:
+            # The client has gone
+            pass
+
+
+class _ClientHandler(logging.Handler):
+    """Sends the log lines of a request to its client"""
+    _f: BinaryIO
+
+    def __init__(self, f: BinaryIO):
+        super().__init__()
+        self._f = f
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            _send(self._f, {'log': self.format(record)})
+        except OSError:
+            # The client has gone; the request is validated to its end, as
+            # the CLI would be if its output were closed
+            pass
+        except Exception:  # pylint: disable=broad-exception-caught
+            self.handleError(record)
+
+
+def serve(socket_path: str, logger: logging.Logger, run: Runner) -> int:
+    """Runs a `ValidationServer` until it's interrupted or terminated
+
+    Args:
+        socket_path: path to create the socket at
+        logger: logger for the daemon itself
+        run: validates the source of truth of each request
+
+    Returns:
+        CLI exit code as int
+    """
+    if os.path.exists(socket_path):
+        try:
+            connect(socket_path).close()
+        except OSError:
+            # Left by a daemon which didn't exit cleanly
+            os.unlink(socket_path)
+        else:
+            logger.error(f"A daemon is already serving on '{socket_path}'")
+            return 1
+
+    # Stops the daemon as Ctrl-C does
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        server = ValidationServer(socket_path, run)
+    except OSError as e:
+        logger.error(f"Can't serve on '{socket_path}': {e}")
+        return 1
+    with server:
+        logger.info(f"Serving on '{socket_path}'")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info('Stopping')
+        finally:
+            os.unlink(socket_path)
+    return 0
+
+
+def connect(socket_path: str) -> socket.socket:
+    """Connects to a `ValidationServer`
+
+    Args:
+        socket_path: path to the daemon's socket
+
+    Returns:
+        connected socket
+
+    Raises:
+        OSError: if the daemon can't be reached
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def send_request(args: argparse.Namespace, logger: logging.Logger) \
+        -> Optional[int]:
+    """Validates a source of truth with the daemon at `args.socket`, writing
+    its log lines to standard output as the CLI would
+
+    Args:
+        args: arguments of the CLI
+        logger: logger for errors reaching the daemon
+
+    Returns:
+        CLI exit code as int, or None if the daemon can't be reached, so the
+        source should be validated in this process
+    """
+    try:
+        sock = connect(args.socket)
+    except OSError as e:
+        logger.warning(f"Validating in this process, as the daemon on "
+                       f"'{args.socket}' can't be reached: {e}")
+        return None
+
+    with sock, sock.makefile('rb') as f:
+        try:
+            sock.sendall(_encode(request_arguments(args)))
+            for line in f:
+                message = json.loads(line)
+                if 'exit_code' in message:
+                    return int(message['exit_code'])
+                sys.stdout.write(message['log'] + '\n')
+        except (OSError, ValueError) as e:
+            logger.error(f'Lost the connection to the daemon: {e}')
+            return 1
+    logger.error('Lost the connection to the daemon')
+    return 1
+
+
+def request_arguments(args: argparse.Namespace) -> dict[str, Any]:
+    """Returns the arguments of the CLI as a request to the daemon, with
+    paths made absolute
+
+    Args:
+        args: arguments of the CLI
+
+    Returns:
+        request, as JSON-serializable data
+    """
+    request = vars(args).copy()
+    del request['socket']
+    request['source'] = os.path.abspath(args.source.filename)
+    if args.output is not None:
+        request['output'] = args.output.filename
+    for name in _PATH_ARGUMENTS:
+        if request[name] is not None:
+            request[name] = os.path.abspath(request[name])
+    # A module name is imported by the daemon as it is
+    if args.validator_module and os.path.isfile(args.validator_module):
+        request['validator_module'] = os.path.abspath(args.validator_module)
+    return request
+
+
+def _request_args(request: dict[str, Any]) -> argparse.Namespace:
+    """Returns the arguments of the CLI from a request, see
+    `request_arguments`"""
+    args = argparse.Namespace(**request)
+    args.source = LazyFileType.default(request['source'])
+    if request['output'] is not None:
+        args.output = LazyFileType.default(request['output'], mode='w')
+    return args
+
+
+def _send(f: BinaryIO, message: dict[str, Any]) -> None:
+    """Writes a message as a line of JSON"""
+    f.write(_encode(message))
+    f.flush()
+
+
+def _encode(message: dict[str, Any]) -> bytes:
+    """Returns a message as a line of JSON"""
+    return json.dumps(message).encode() + b'\n'
@@ -0,0 +1,186 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+from typing import Any
+
+# Counters kept by a `HeavyHitters` for each of the top values reported
+_COUNTERS_PER_VALUE = 10
+
+# Values are kept and reported up to this many characters
+_MAX_VALUE_LENGTH = 60
+
+
+class HeavyHitters:
+    """Finds the most frequent values of a stream in constant memory, with
+    the Misra-Gries frequent items algorithm: at most `capacity` values are
+    counted, and a value not counted when all counters are taken decrements
+    every counter instead, dropping those that reach zero.  Any value making
+    up more than 1 / (`capacity` + 1) of the stream is kept, and its count is
+    at most that share of the stream below its true count.
+    """
+    capacity: int
+    counts: dict[str, int]
+    # whether any counts were decremented, so are lower bounds
+    approximate: bool
+
+    def __init__(self, capacity: int):
+        """
+        Args:
+            capacity: most values to count
+        """
+        self.capacity = capacity
+        self.counts = {}
+        self.approximate = False
+
+    def add(self, value: str) -> None:
+        """Counts a value
+
+        Args:
+            value: value from the stream
+        """
+        counts = self.counts
+        if value in counts:
+            counts[value] += 1
+        elif len(counts) < self.capacity:
+            counts[value] = 1
+        else:
+            self.approximate = True
+            self.counts = {v: c - 1 for v, c in counts.items() if c > 1}
+
+    def merge(self, other: 'HeavyHitters') -> None:
+        """Adds the counts of another stream's `HeavyHitters`, keeping the
+        guarantees of both
+
+        Args:
+            other: heavy hitters of the other stream
+        """
+        counts = dict(self.counts)
+        for value, count in other.counts.items():
+            counts[value] = counts.get(value, 0) + count
+        self.approximate |= other.approximate
+        if len(counts) > self.capacity:
+            # Subtract the count of the first value that doesn't fit
+            excess = sorted(counts.values(), reverse=True)[self.capacity]
+            counts = {v: c - excess for v, c in counts.items() if c > excess}
+            self.approximate = True
+        self.counts = counts
+
+    def top(self, k: int) -> list[tuple[str, int]]:
+        """Returns the `k` values with the highest counts, highest first"""
+        return sorted(self.counts.items(), key=lambda vc: -vc[1])[:k]
+
+
+class ErrorSummary:
+    """Counts the errors found in rows by column and error type, and the most
+    frequent values causing them in each column, in constant memory however
+    many rows are invalid, see `--summary`
+    """
+    top_values: int
+    errors: int
+    # errors by (column, error type)
+    counts: dict[tuple[str, str], int]
+    values: dict[str, HeavyHitters]
+
+    def __init__(self, top_values: int):
+        """
+        Args:
+            top_values: number of values to report for each column
+        """
+        self.top_values = top_values
+        self.errors = 0
+        self.counts = {}
+        self.values = {}
+
+    def add(self, column: str, error_type: str, value: Any) -> None:
+        """Counts an error
+
+        Args:
+            column: column the error was found in
+            error_type: type of the error, e.g. 'value_error'
+            value: input value of the error
+        """
+        self.errors += 1
+        key = (column, error_type)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        hitters = self.values.get(column)
+        if hitters is None:
+            hitters = self.values[column] = HeavyHitters(
+                self.top_values * _COUNTERS_PER_VALUE)
+        hitters.add(_value_label(value))
+
+    def merge(self, other: 'ErrorSummary') -> None:
+        """Adds the errors counted by another summary, e.g. of a shard
+
+        Args:
+            other: summary to add
+        """
+        self.errors += other.errors
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        for column, hitters in other.values.items():
+            if column in self.values:
+                self.values[column].merge(hitters)
+            else:
+                self.values[column] = hitters
+
+    def drain(self) -> 'ErrorSummary':
+        """Returns a summary of the errors counted so far, and forgets them"""
+        summary = ErrorSummary(self.top_values)
+        summary.errors, summary.counts, summary.values = \
+            self.errors, self.counts, self.values
+        self.errors, self.counts, self.values = 0, {}, {}
+        return summary
+
+    def report(self) -> list[str]:
+        """Returns a table of the number of errors by column and error type,
+        most first, and of the values with the most errors in each column.
+        Counts of values prefixed with '≥' are lower bounds.
+
+        Returns:
+            lines of the table
+        """
+        rows = [(column, error_type, str(count)) for (column, error_type),
+                count in sorted(self.counts.items(), key=lambda kc: -kc[1])]
+        values = []
+        for column in sorted(self.values):
+            hitters = self.values[column]
+            prefix = '≥' if hitters.approximate else ''
+            for idx, (value, count) in enumerate(
+                    hitters.top(self.top_values)):
+                values.append((column if idx == 0 else '', value,
+                               f'{prefix}{count}'))
+        width = max(len('column'), *(len(row[0]) for row in rows + values))
+        middle = max(len('error type'), len('top values'),
+                     *(len(row[1]) for row in rows + values))
+
+        lines = [f'Summary of {self.errors} errors:']
+        for header, table in (('error type', rows), ('top values', values)):
+            lines.append(f"  {'column':<{width}} {header:<{middle}} "
+                         f"{'errors':>9}")
+            lines.extend(f'  {first:<{width}} {second:<{middle}} {count:>9}'
+                         for first, second, count in table)
+        return lines
+
+
+def _value_label(value: Any) -> str:
+    """Returns the label an input value is counted and reported by, cut to
+    `_MAX_VALUE_LENGTH` characters so that memory stays bounded"""
+    if isinstance(value, str):
+        value = value[:_MAX_VALUE_LENGTH]
+    label = repr(value)
+    if len(label) > _MAX_VALUE_LENGTH:
+        label = label[:_MAX_VALUE_LENGTH - 1] + '…'
+    return label
@@ -0,0 +1,597 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import os
+import heapq
+import pickle
+import struct
+import sys
+import tempfile
+from abc import ABC, abstractmethod
+from array import array
+from collections.abc import Hashable
+from typing import IO, Any, Callable, Iterable, Iterator, NamedTuple, Optional
+
+import pydantic
+
+# Number of distinct values a `ValueIndex` holds exactly, in a dict, before it
+# switches to a table of fingerprints.  Below this, the dict is faster and the
+# memory it saves isn't worth having.
+COMPACT_THRESHOLD = 1_000_000
+
+# Each slot of a fingerprint table packs a 32-bit tag, taken from the value's
+# hash, above the position of the value's record in the spill file, counted in
+# `_RECORD_ALIGN` byte units.  An empty slot is 0.
+_TAG_BITS = 32
+_POSITION_MASK = (1 << _TAG_BITS) - 1
+_RECORD_ALIGN = 8
+
+# Multiplier of Fibonacci hashing, which mixes the bits of a value's hash into
+# the high bits of its tag.  The tag's low bits pick the slot at which probing
+# starts, as the table can't recompute values' hashes when it grows.
+_FIBONACCI = 0x9E3779B97F4A7C15
+_HASH_MASK = (1 << 64) - 1
+
+# Spill file record header: (length of pickled value, line)
+_RECORD_HEADER = struct.Struct('<IQ')
+
+# Approximate memory taken by a value buffered for a sorted run, beyond the
+# value itself
+_RUN_ENTRY_SIZE = 200
+
+# Number of records pickled together in a sorted run
+_RUN_CHUNK_SIZE = 4096
+
+# Most runs merged at once; more are first merged into larger runs
+_MAX_MERGE_RUNS = 64
+
+# Approximate memory taken by the line stored with each value held exactly,
+# beyond the dict's own table
+_EXACT_ENTRY_SIZE = 32
+
+# Spilled records are buffered in memory and written out in blocks this large
+_SPILL_BLOCK_SIZE = 1024 * 1024
+
+
+class UniqueValue(NamedTuple):
+    """A value of a field validated by `csv_validator.helpers.unique`, as
+    seen on one row of the source CSV"""
+    field: str
+    value: Hashable
+    line: int
+    # the field's value as read from the CSV, before validation
+    input: Any
+    # the row's `cluster_name` as read from the CSV, for reporting
+    cluster_name: Optional[str]
+
+
+class Duplicate(NamedTuple):
+    """A `UniqueValue` which was already seen on an earlier line"""
+    value: UniqueValue
+
+
+def not_unique_message(value: Hashable) -> str:
+    """Returns the error message for a value which is not unique.  It is the
+    same however the value was checked, so that errors don't depend on the
+    CLI's options.
+
+    Args:
+        value: duplicated value
+
+    Returns:
+        error message
+    """
+    return f'Value "{value} is not unique'
+
+
+# pylint: disable-next=too-few-public-methods
+class UniqueContext(ABC):
+    """Validation context which holds the state of `helpers.unique()`
+    validators for a single validation run, rather than for the life of the
+    process as the validators' own closures do.  Validating with a new context
+    for each run means that values seen in one source aren't reported as
+    duplicates in the next.
+    """
+
+    @abstractmethod
+    def check(self, key: object, field: str, value: Hashable) -> None:
+        """Checks a value of a unique field
+
+        Args:
+            key: identifies the `unique()` validator checking the value
+            field: name of the field
+            value: validated value of the field
+
+        Raises:
+            ValueError: if the value has already been seen by the validator
+        """
+
+
+class UniqueCollector(UniqueContext):
+    """Collects the values of fields validated by `helpers.unique()`, with
+    the source line of each, instead of checking them for uniqueness.  Used
+    as the validation context when rows are validated in more than one
+    process, where each process only sees some of the rows.  The collected
+    values are checked by a `UniqueIndex` once they are brought together.
+
+    The collector needs to know which row is being validated.  Wrap the model
+    with `track_rows` and call `start_batch` with the line numbers of each
+    batch of rows before validating it.
+    """
+    values: list[UniqueValue]
+    # source line number of each row in the current batch
+    lines: list[int]
+    _lines: Iterator[int]
+    _line: int
+    _row: dict[str, Any]
+
+    def __init__(self):
+        self.values = []
+        self.lines = []
+        self._lines = iter(())
+        self._line = 0
+        self._row = {}
+
+    def start_batch(self, lines: Iterable[int]) -> None:
+        """Sets the source line numbers of the next batch of rows
+
+        Args:
+            lines: source line number of each row in the batch
+        """
+        self.lines = list(lines)
+        self._lines = iter(self.lines)
+
+    def next_row(self, row: Any) -> None:
+        """Advances to the next row of the batch
+
+        Args:
+            row: row as given to the model
+        """
+        self._line = next(self._lines)
+        self._row = row if isinstance(row, dict) else {}
+
+    def add(self, field: str, value: Hashable) -> None:
+        """Records a value of a unique field for the current row
+
+        Args:
+            field: name of the field
+            value: validated value of the field
+        """
+        self.values.append(UniqueValue(
+            field=field, value=value, line=self._line,
+            input=self._row.get(field),
+            cluster_name=self._row.get('cluster_name')))
+
+    def check(self, key: object, field: str, value: Hashable) -> None:
+        self.add(field, value)
+
+    def drain(self) -> list[UniqueValue]:
+        """Returns and forgets the collected values
+
+        Returns:
+            list of values in the order they were validated
+        """
+        values, self.values = self.values, []
+        return values
+
+
+def track_rows(value: Any, handler: Callable[[Any], Any],
+               info: pydantic.ValidationInfo) -> Any:
+    """Wrap validator for a model which tells a `UniqueCollector` validation
+    context when validation of each row begins.  Does nothing when validating
+    without a collector.
+
+    Returns:
+        validated value
+    """
+    if isinstance(info.context, UniqueCollector):
+        info.context.next_row(value)
+    return handler(value)
+
+
+def _tag(value: Hashable) -> int:
+    """Returns the non-zero fingerprint tag of a value"""
+    return ((hash(value) * _FIBONACCI & _HASH_MASK) >> _TAG_BITS) or 1
+
+
+class ValueIndex:
+    """Index of the first line on which each distinct value was seen, which
+    bounds its memory use on large sources.
+
+    Up to `threshold` distinct values are held exactly in a dict.  Past that,
+    the index switches to an open-addressing `array('Q')` table in which each
+    value takes a single 64-bit slot: a 32-bit tag from the value's hash and
+    the position of the value, with its line, in a temporary spill file.  A
+    value whose tag matches a slot is compared against the exact value read
+    back from the spill file, so a duplicate is never reported falsely.  Exact
+    values read back are kept in a side table, which stays small as only
+    duplicated values and the rare tag collisions are read back.
+
+    With the table at most 3/4 full, values take 11-21 bytes of memory each,
+    rather than the 60-100 bytes of a `str` in a dict or set.
+    """
+    _threshold: int
+    _exact: Optional[dict[Hashable, int]]
+    _slots: array
+    _mask: int
+    _size: int
+    _spill: Optional[IO[bytes]]
+    _spilled: int
+    _pending: bytearray
+    _read_back: dict[int, tuple[Hashable, int]]
+    _exact_bytes: int
+
+    def __init__(self, threshold: int = COMPACT_THRESHOLD):
+        self._threshold = threshold
+        self._exact = {}
+        self._slots = array('Q')
+        self._mask = 0
+        self._size = 0
+        self._spill = None
+        self._spilled = 0
+        self._pending = bytearray()
+        self._read_back = {}
+        self._exact_bytes = 0
+
+    def __len__(self) -> int:
+        if self._exact is not None:
+            return len(self._exact)
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory used by the index, in bytes"""
+        if self._exact is not None:
+            return sys.getsizeof(self._exact) + self._exact_bytes
+        return (len(self._slots) * self._slots.itemsize + len(self._pending)
+                + sys.getsizeof(self._read_back))
+
+    def items(self) -> Iterator[tuple[Hashable, int]]:
+        """Iterates over the values in the index
+
+        Returns:
+            iterator of (value, first line) in no particular order
+        """
+        if self._exact is not None:
+            yield from self._exact.items()
+            return
+        offset = 0
+        while offset < self._spilled + len(self._pending):
+            value, line, size = self._read(offset)
+            yield value, line
+            offset += size
+
+    def add(self, value: Hashable, line: int = 0) -> Optional[int]:
+        """Adds a value to the index unless it was already seen
+
+        Args:
+            value: value to add
+            line: source line on which the value was seen
+
+        Returns:
+            line on which the value was first seen if it was already in the
+            index, else None
+        """
+        if self._exact is not None:
+            size = len(self._exact)
+            first_line = self._exact.setdefault(value, line)
+            if len(self._exact) == size:
+                return first_line
+            self._exact_bytes += sys.getsizeof(value) + _EXACT_ENTRY_SIZE
+            if size >= self._threshold:
+                self._compact()
+            return None
+
+        tag = _tag(value)
+        slots, mask = self._slots, self._mask
+        i = tag & mask
+        while slot := slots[i]:
+            if slot >> _TAG_BITS == tag:
+                seen_on = self._confirm(slot & _POSITION_MASK, value)
+                if seen_on is not None:
+                    return seen_on
+            i = (i + 1) & mask
+        slots[i] = tag << _TAG_BITS | self._write(value, line)
+        self._size += 1
+        if self._size * 4 > len(slots) * 3:
+            self._resize(len(slots) * 2)
+        return None
+
+    def _compact(self) -> None:
+        """Moves the exactly held values into a fingerprint table"""
+        exact, self._exact = self._exact or {}, None
+        self._resize(1 << max(10, (len(exact) * 2).bit_length()))
+        for value, line in exact.items():
+            self.add(value, line)
+
+    def _resize(self, capacity: int) -> None:
+        """Moves the fingerprint table's slots into a new table
+
+        Args:
+            capacity: number of slots in the new table, a power of two
+        """
+        old = self._slots
+        self._slots = slots = array('Q', bytes(8 * capacity))
+        self._mask = mask = capacity - 1
+        for slot in old:
+            if slot:
+                i = (slot >> _TAG_BITS) & mask
+                while slots[i]:
+                    i = (i + 1) & mask
+                slots[i] = slot
+
+    def _write(self, value: Hashable, line: int) -> int:
+        """Appends a value and its line to the spill file
+
+        Returns:
+            position of the value's record
+        """
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        offset = self._spilled + len(self._pending)
+        if offset // _RECORD_ALIGN > _POSITION_MASK:
+            raise OverflowError('uniqueness index spill file is full')
+        self._pending += _RECORD_HEADER.pack(len(data), line)
+        self._pending += data
+        self._pending += bytes(-len(self._pending) % _RECORD_ALIGN)
+        if len(self._pending) >= _SPILL_BLOCK_SIZE:
+            if self._spill is None:
+                self._spill = tempfile.TemporaryFile()
+            self._spill.write(self._pending)
+            self._spilled += len(self._pending)
+            self._pending.clear()
+        return offset // _RECORD_ALIGN
+
+    def _confirm(self, position: int, value: Hashable) -> Optional[int]:
+        """Compares a value with the value of a spilled record, whose tag it
+        matches
+
+        Returns:
+            line of the record if its value equals `value`, else None
+        """
+        record = self._read_back.get(position)
+        if record is None:
+            record = self._read(position * _RECORD_ALIGN)[:2]
+            self._read_back[position] = record
+        return record[1] if record[0] == value else None
+
+    def _read(self, offset: int) -> tuple[Hashable, int, int]:
+        """Reads a record back from the spill file
+
+        Returns:
+            tuple: (value, line, size of the record in bytes)
+        """
+        if offset >= self._spilled:
+            buf: bytes | bytearray = self._pending
+            start = offset - self._spilled
+        else:
+            assert self._spill is not None
+            self._spill.flush()
+            buf = os.pread(self._spill.fileno(), _RECORD_HEADER.size, offset)
+            length = _RECORD_HEADER.unpack(buf)[0]
+            buf = os.pread(self._spill.fileno(),
+                           _RECORD_HEADER.size + length, offset)
+            start = 0
+        length, line = _RECORD_HEADER.unpack_from(buf, start)
+        start += _RECORD_HEADER.size
+        size = _RECORD_HEADER.size + length
+        return (pickle.loads(buf[start:start + length]), line,
+                size + -size % _RECORD_ALIGN)
+
+
+# pylint: disable-next=too-few-public-methods
+class UniqueScope(UniqueContext):
+    """Checks the values of unique fields as they are validated, keeping one
+    `ValueIndex` per `unique()` validator"""
+    _seen: dict[object, ValueIndex]
+
+    def __init__(self):
+        self._seen = {}
+
+    def check(self, key: object, field: str, value: Hashable) -> None:
+        seen = self._seen.get(key)
+        if seen is None:
+            seen = self._seen[key] = ValueIndex()
+        if seen.add(value) is not None:
+            raise ValueError(not_unique_message(value))
+
+
+# A value in a sorted run: (field, hash of value, line, value)
+_RunRecord = tuple[str, int, int, UniqueValue]
+
+
+def _run_key(record: _RunRecord) -> tuple[str, int, int]:
+    """Returns the key which runs are sorted by"""
+    return record[0], record[1], record[2]
+
+
+def _write_run(records: Iterable[_RunRecord]) -> IO[bytes]:
+    """Writes sorted records to a temporary file, in chunks
+
+    Returns:
+        file, positioned at its start
+    """
+    f = tempfile.TemporaryFile()
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= _RUN_CHUNK_SIZE:
+            pickle.dump(chunk, f, pickle.HIGHEST_PROTOCOL)
+            chunk = []
+    if chunk:
+        pickle.dump(chunk, f, pickle.HIGHEST_PROTOCOL)
+    f.seek(0)
+    return f
+
+
+def _read_run(f: IO[bytes]) -> Iterator[_RunRecord]:
+    """Reads the records of a run written by `_write_run`, closing it once
+    all have been read"""
+    with f:
+        while True:
+            try:
+                chunk = pickle.load(f)
+            except EOFError:
+                return
+            yield from chunk
+
+
+class SortedRuns:
+    """Values of unique fields, sorted in runs of up to `run_size` bytes in
+    temporary files.  Runs are sorted by field, the value's hash, then line,
+    so that merging them brings each set of equal values together with its
+    first occurrence first.  Values are compared for equality only within a
+    set of equal hashes, so they need not be orderable.
+    """
+    _run_size: int
+    _buffer: list[_RunRecord]
+    _buffer_bytes: int
+    _runs: list[IO[bytes]]
+
+    def __init__(self, run_size: int):
+        self._run_size = run_size
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._runs = []
+
+    def add(self, values: Iterable[UniqueValue]) -> None:
+        """Adds values, writing a run whenever `run_size` bytes are buffered
+
+        Args:
+            values: values collected from validated rows
+        """
+        for v in values:
+            self._buffer.append((v.field, hash(v.value), v.line, v))
+            self._buffer_bytes += sys.getsizeof(v.value) + _RUN_ENTRY_SIZE
+            if self._buffer_bytes >= self._run_size:
+                self.flush()
+
+    def flush(self) -> None:
+        """Writes the buffered values as a sorted run"""
+        if not self._buffer:
+            return
+        self._buffer.sort(key=_run_key)
+        self._runs.append(_write_run(self._buffer))
+        self._buffer = []
+        self._buffer_bytes = 0
+
+    def find_duplicates(self) -> Iterator[Duplicate]:
+        """Merges the runs, closing them
+
+        Returns:
+            iterator of duplicated values, in no particular order
+        """
+        self.flush()
+        # Merge the runs in passes if there are too many to open at once
+        while len(self._runs) > _MAX_MERGE_RUNS:
+            merging = self._runs[:_MAX_MERGE_RUNS]
+            del self._runs[:_MAX_MERGE_RUNS]
+            self._runs.append(_write_run(heapq.merge(
+                *(_read_run(run) for run in merging), key=_run_key)))
+
+        # Each key holds the values with a single hash, in line order, so the
+        # first occurrence of each value is seen before its duplicates
+        key: Optional[tuple[str, int]] = None
+        seen: list[Hashable] = []
+        for field, value_hash, _, v in heapq.merge(
+                *(_read_run(run) for run in self._runs), key=_run_key):
+            if key != (field, value_hash):
+                key, seen = (field, value_hash), []
+            if v.value in seen:
+                yield Duplicate(value=v)
+            else:
+                seen.append(v.value)
+        self._runs = []
+
+
+class UniqueIndex:
+    """Index of the first line on which each value of each unique field was
+    seen.  Checking each collected value against the index in line order
+    finds every duplicate in O(n) overall.
+
+    With a `memory_limit`, the index switches to an external sort once it
+    would use more memory than that: the values already indexed and those
+    added afterwards are written to temporary files as sorted runs, which
+    `finish` merges to find the remaining duplicates.  Duplicates found that
+    way can only be reported once all values have been added.
+    """
+    _first_lines: dict[str, ValueIndex]
+    _memory_limit: Optional[int]
+    _runs: Optional[SortedRuns]
+
+    def __init__(self, memory_limit: Optional[int] = None):
+        self._first_lines = {}
+        self._memory_limit = memory_limit
+        self._runs = None
+
+    @property
+    def spilled(self) -> bool:
+        """Whether the index has switched to an external sort"""
+        return self._runs is not None
+
+    def find_duplicates(self, values: Iterable[UniqueValue]) \
+            -> list[Duplicate]:
+        """Adds values to the index, returning those which were already seen.
+        Values must be added in line order.
+
+        Args:
+            values: values collected from validated rows
+
+        Returns:
+            list of duplicated values, in the order they were given; empty
+            once the index has switched to an external sort
+        """
+        if self._runs is not None:
+            self._runs.add(values)
+            return []
+
+        duplicates = []
+        for v in values:
+            first_lines = self._first_lines.get(v.field)
+            if first_lines is None:
+                first_lines = self._first_lines[v.field] = ValueIndex()
+            if first_lines.add(v.value, v.line) is not None:
+                duplicates.append(Duplicate(value=v))
+
+        if self._memory_limit is not None and self._memory_limit < sum(
+                i.nbytes for i in self._first_lines.values()):
+            self._spill()
+        return duplicates
+
+    def finish(self) -> list[Duplicate]:
+        """Finds the duplicates among values added after the index switched
+        to an external sort
+
+        Returns:
+            list of duplicated values, in line order
+        """
+        if self._runs is None:
+            return []
+        runs, self._runs = self._runs, None
+        return sorted(runs.find_duplicates(),
+                      key=lambda dupe: dupe.value.line)
+
+    def _spill(self) -> None:
+        """Switches to an external sort, writing the indexed values out as
+        the first sorted run"""
+        assert self._memory_limit is not None
+        self._runs = SortedRuns(self._memory_limit)
+        first_lines, self._first_lines = self._first_lines, {}
+        self._runs.add(
+            UniqueValue(field=field, value=value, line=line, input=None,
+                        cluster_name=None)
+            for field, index in first_lines.items()
+            for value, line in index.items())
+        self._runs.flush()
@@ -0,0 +1,86 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import csv
+import importlib.util
+import logging
+import tempfile
+from unittest import TestCase, skipUnless
+
+from csv_validator.arrow_reader import ArrowReader, open_reader
+
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+LOGGER = logging.getLogger('csv_validator.test')
+
+
+def read_all(reader):
+    rows = []
+    try:
+        for row in reader:
+            rows.append((reader.line_num, row))
+    except csv.Error as e:
+        rows.append((reader.line_num, str(e)))
+    return reader.fieldnames, rows, reader.line_num
+
+
+@skipUnless(HAS_PYARROW, 'requires pyarrow')
+class TestArrowReader(TestCase):
+    def assert_same_as_csv(self, data, arrow=True):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv',
+                                         newline='') as f:
+            f.write(data)
+            f.flush()
+            with open(f.name, encoding='utf-8') as fp:
+                expected = read_all(
+                    csv.DictReader(fp, dialect='excel', strict=True))
+            with open(f.name, encoding='utf-8') as fp, \
+                    self.assertLogs(LOGGER, logging.DEBUG) as logs:
+                reader = open_reader(fp, f.name, LOGGER)
+                self.assertEqual(expected, read_all(reader))
+        self.assertEqual(arrow, 'DEBUG:csv_validator.test:Parsing source '
+                                'CSV with pyarrow' in logs.output)
+
+    def test_rows(self):
+        self.assert_same_as_csv('a,b\n1,2\n"x, ""y""",\n')
+        self.assert_same_as_csv('a,b\r\n1,2\r\n3,4')
+        self.assert_same_as_csv('a,a\n1,2\n')
+        self.assert_same_as_csv('a,b\n')
+
+    def test_fallback(self):
+        self.assert_same_as_csv('a,b\n1,2\n\n3,4\n', arrow=False)
+        self.assert_same_as_csv('a,b\n"1\n2",3\n4,5\n', arrow=False)
+        self.assert_same_as_csv('a,b\n1,2,3\n4\n', arrow=False)
+        self.assert_same_as_csv('a,b\n1,2\r3,4\n', arrow=False)
+        self.assert_same_as_csv('a,b\n1,2\n"3"4,5\n', arrow=False)
+        self.assert_same_as_csv('a,b\n1,2\n"3,4\n', arrow=False)
+        self.assert_same_as_csv('a,b\nx"y,2\n')
+
+    def test_fallback_after_first_block(self):
+        # Rows that pyarrow can't parse as the csv module does, past its
+        # first block, are read by the csv module from the start of theirs
+        rows = ''.join(f'{i:07},abcdefg\n' for i in range(100_000))
+        self.assert_same_as_csv(f'a,b\n{rows}1,2,3\n{rows}')
+        long_value = 'x' * (csv.field_size_limit() + 1)
+        self.assert_same_as_csv(f'a,b\n{rows}{long_value},2\n{rows}')
+
+    def test_open_reader(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as f:
+            f.write('a,b\n"1"2,3\n')
+            f.flush()
+            with open(f.name, encoding='utf-8') as fp:
+                reader = open_reader(fp, f.name, LOGGER)
+                self.assertNotIsInstance(reader, ArrowReader)
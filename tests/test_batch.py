@@ -0,0 +1,103 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import contextlib
+import io
+import json
+import logging
+import os
+import tempfile
+from unittest import TestCase
+
+from csv_validator.cli import run_validation
+from csv_validator.arguments import parse_batch_args
+from csv_validator.batch import find_sources, run_batch
+
+PLATFORM = 'sources_of_truth/platform'
+
+
+class TestBatch(TestCase):
+    def run_batch(self, argv):
+        stdout = io.StringIO()
+        logger = logging.getLogger('csv_validator.test')
+        with self.assertLogs(logger) as logs, \
+                contextlib.redirect_stdout(stdout):
+            # At least one record, for `assertLogs`
+            logger.info('Batch')
+            rc = run_batch(parse_batch_args(argv), logger, run_validation)
+        return rc, logs.output, stdout.getvalue().splitlines()
+
+    def test_find_sources(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            manifest = os.path.join(tempdir, 'manifest.json')
+            with open(manifest, 'w', encoding='utf-8') as f:
+                json.dump({os.path.abspath('models/platform.py'): [
+                    os.path.abspath(f'{PLATFORM}/*_valid*.csv')],
+                    '': ['*.csv']}, f)
+            with open(os.path.join(tempdir, 'a.csv'), 'w',
+                      encoding='utf-8') as f:
+                f.write('cluster_name\n')
+
+            sources = find_sources(parse_batch_args(
+                ['-m', 'models/platform.py', f'{PLATFORM}/platform_valid.csv',
+                 '--manifest', manifest]))
+
+        # Each source once per module, largest first
+        self.assertEqual(
+            [(f'{PLATFORM}/platform_valid_whitespace.csv',
+              os.path.abspath('models/platform.py')),
+             (f'{PLATFORM}/platform_valid.csv',
+              os.path.abspath('models/platform.py')),
+             (f'{PLATFORM}/platform_valid.csv', 'models/platform.py'),
+             (f'{PLATFORM}/platform_valid_optional.csv',
+              os.path.abspath('models/platform.py')),
+             ('a.csv', None)],
+            [(os.path.relpath(s.path) if s.validator_module else
+              os.path.basename(s.path), s.validator_module)
+             for s in sources])
+        self.assertEqual(sorted((s.size for s in sources), reverse=True),
+                         [s.size for s in sources])
+
+    def test_no_match(self):
+        with self.assertRaisesRegex(ValueError, 'no files match'):
+            find_sources(parse_batch_args(['no_such_dir/*.csv']))
+
+    def test_run_batch(self):
+        rc, output, summary = self.run_batch(
+            ['-m', 'models/platform.py', '--jobs', '2', f'{PLATFORM}/*.csv'])
+
+        self.assertEqual(-1, rc)
+        self.assertEqual('5 sources: 3 valid, 2 invalid, 0 failed',
+                         summary[-1])
+        self.assertEqual(
+            [('invalid', f'{PLATFORM}/platform_invalid.csv'),
+             ('invalid', f'{PLATFORM}/platform_invalid_extra_cols.csv'),
+             ('valid', f'{PLATFORM}/platform_valid.csv'),
+             ('valid', f'{PLATFORM}/platform_valid_optional.csv'),
+             ('valid', f'{PLATFORM}/platform_valid_whitespace.csv')],
+            [(line.split()[0], line.split()[-1]) for line in summary[:-1]])
+        errors = [line for line in output if line.startswith('ERROR')]
+        self.assertTrue(errors)
+        self.assertTrue(all(
+            f':{PLATFORM}/platform_invalid' in line for line in errors))
+
+    def test_failed(self):
+        rc, _, summary = self.run_batch(
+            ['--jobs', '1', 'sources_of_truth/empty.csv',
+             'sources_of_truth/dupes_invalid.csv'])
+        self.assertEqual(1, rc)
+        self.assertEqual('2 sources: 0 valid, 1 invalid, 1 failed',
+                         summary[-1])
@@ -0,0 +1,159 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Annotated
+from unittest import TestCase
+
+import pydantic
+
+from csv_validator.cache import (CachedResult, CachingValidator,
+                                 ResultCache, RowCache, model_fingerprint,
+                                 result_key, row_digests)
+from csv_validator.engine import BatchValidator
+from csv_validator.helpers import unique
+from csv_validator.model import BaseCluster
+from csv_validator.uniqueness import UniqueCollector, UniqueIndex
+
+
+class Model(pydantic.BaseModel):
+    name: Annotated[str, pydantic.AfterValidator(unique())]
+    size: int
+
+
+class CountingValidator(BatchValidator):
+    """Counts the rows it validates"""
+    count = 0
+
+    def validate(self, rows, context=None):
+        self.count += len(rows)
+        return super().validate(rows, context)
+
+
+class TestRowCache(TestCase):
+    def test_model_fingerprint(self):
+        class Other(pydantic.BaseModel):
+            name: Annotated[str, pydantic.AfterValidator(unique())]
+            size: Annotated[int, pydantic.Field(gt=0)]
+
+        fingerprint = model_fingerprint(BaseCluster)
+        self.assertEqual(fingerprint, model_fingerprint(BaseCluster))
+        self.assertNotEqual(model_fingerprint(Model), model_fingerprint(Other))
+
+        # The same in another process
+        self.assertEqual(fingerprint, subprocess.run(
+            [sys.executable, '-c',
+             'from csv_validator.cache import model_fingerprint; '
+             'from csv_validator.model import BaseCluster; '
+             'print(model_fingerprint(BaseCluster))'],
+            capture_output=True, text=True, check=True).stdout.strip())
+
+    def test_row_digests(self):
+        digests = row_digests([{'a': '1', 'b': '2'}, {'a': '12', 'b': ''},
+                               {'b': '1', 'a': '2'}, {'a': '1', 'b': '2'}])
+        self.assertEqual(3, len(set(digests)))
+        self.assertEqual(digests[0], digests[3])
+
+    def test_caching_validator(self):
+        rows = [{'name': 'a', 'size': '1'}, {'name': 'b', 'size': 'x'},
+                {'name': 'c', 'size': '3'}, {'name': 'a', 'size': '4'}]
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            runs = []
+            for _ in range(2):
+                cache = RowCache(cache_dir, model_fingerprint(Model))
+                engine = CountingValidator(Model, track_rows=True)
+                collector, index = UniqueCollector(), UniqueIndex()
+                collector.start_batch([2, 3, 4, 5])
+                _, errors = CachingValidator(engine, cache).validate(
+                    rows, collector)
+                duplicates = index.find_duplicates(collector.drain())
+                cache.close()
+                runs.append((engine.count, set(errors), [
+                    (d.value.line, d.value.input) for d in duplicates]))
+
+        # Only the invalid row is validated again
+        self.assertEqual((4, {1}, [(5, 'a')]), runs[0])
+        self.assertEqual((1, {1}, [(5, 'a')]), runs[1])
+
+    def test_reopen(self):
+        digests = row_digests([{'name': 'a', 'size': '1'}])
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = RowCache(cache_dir, model_fingerprint(Model))
+            cache.add([(digests[0], [('name', 'a')])])
+            cache.close()
+            # Used again after being closed, as by another run of the CLI
+            self.assertEqual([[('name', 'a')]], cache.lookup([{}], digests))
+            cache.close()
+
+
+class TestResultCache(TestCase):
+    def test_get_put(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            output = os.path.join(tempdir, 'output.csv')
+            with open(output, 'w', encoding='utf-8') as f:
+                f.write('a,b\n1,2\n')
+            key = result_key(output, 'model', level=logging.INFO)
+            self.assertNotEqual(
+                key, result_key(output, 'model', level=logging.DEBUG))
+
+            cache = ResultCache(os.path.join(tempdir, 'cache'), 1024)
+            self.assertIsNone(cache.get(key))
+            record = logging.makeLogRecord({
+                'levelno': logging.ERROR, 'levelname': 'ERROR',
+                'msg': 'Line 2, error', 'line_num': 2})
+            cache.put(key, CachedResult(exit_code=-1, records=[record],
+                                        output=output))
+
+            result = cache.get(key)
+            self.assertEqual(-1, result.exit_code)
+            self.assertEqual([(logging.ERROR, 'Line 2, error', 2)],
+                             [(r.levelno, r.getMessage(), r.line_num)
+                              for r in result.records])
+            with open(result.output, encoding='utf-8') as f:
+                self.assertEqual('a,b\n1,2\n', f.read())
+
+    def test_evict(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            output = os.path.join(tempdir, 'output.csv')
+            with open(output, 'w', encoding='utf-8') as f:
+                f.write('x' * 400)
+            cache = ResultCache(tempdir, 1000)
+            for key in ('a', 'b'):
+                cache.put(key, CachedResult(exit_code=0, records=[],
+                                            output=output))
+            # 'a' is used more recently than 'b', which is evicted by 'c'
+            os.utime(os.path.join(tempdir, 'results', 'b', 'result.json'),
+                     (0, 0))
+            cache.get('a')
+            cache.put('c', CachedResult(exit_code=0, records=[],
+                                        output=output))
+
+            self.assertIsNotNone(cache.get('a'))
+            self.assertIsNone(cache.get('b'))
+            self.assertIsNotNone(cache.get('c'))
+
+            # Too large to keep
+            with open(output, 'a', encoding='utf-8') as f:
+                f.write('x' * 1000)
+            cache.put('d', CachedResult(exit_code=0, records=[],
+                                        output=output))
+            self.assertIsNone(cache.get('d'))
+            self.assertIsNotNone(cache.get('c'))
@@ -14,13 +14,24 @@
 # limitations under the License.
 #
 ###############################################################################
+import csv
+import importlib.util
+import json
+import logging
+import os
 import pathlib
+import pstats
 import re
 import shutil
 import subprocess
 import tempfile
 from dataclasses import dataclass
-from unittest import TestCase
+from unittest import TestCase, skipUnless
+
+from csv_validator.arguments import LazyFileType
+from csv_validator.cache import CACHE_FILE
+from csv_validator.cli import CLI
+from csv_validator.loader import get_validator_module
 
 
 @dataclass
@@ -35,20 +46,26 @@ class ExecResult:
         self.tempdir.cleanup()
 
 
-def exec_validator(sot, model=None, output_dir=None):
+def exec_validator(sot, model=None, output_dir=None, extra_args=None,
+                   output=True):
     py = shutil.which('python3')
     args = "-m csv_validator -v ".split()
+    args += extra_args if extra_args else []
     mod = ["-m", model] if model else []
     t, outfile = None, None
     if output_dir is None:
         t = tempfile.TemporaryDirectory()
     outfile = f"{t.name}/output.csv"
-    out = ["-o", outfile]
+    # without an output file, rows are validated without constructing models
+    out = ["-o", outfile] if output else []
+    # fix set iteration order so that output may be compared between runs
+    env = {**os.environ, 'PYTHONHASHSEED': '0'}
     p = subprocess.Popen(
         [py, *args, *mod, *out, sot],
         stderr=subprocess.PIPE,
         stdout=subprocess.PIPE,
-        text=True)
+        text=True,
+        env=env)
     stdout, stderr = p.communicate()
     return ExecResult(
         process=p,
@@ -58,6 +75,41 @@ def exec_validator(sot, model=None, output_dir=None):
         outfile=pathlib.Path(outfile))
 
 
+def generate_sot(path, sources, rows):
+    """Writes a CSV of `rows` rows cycling through the rows of `sources`,
+    giving each row a unique cluster name"""
+    src_rows = []
+    for source in sources:
+        with open(source, newline='') as f:
+            src_rows.extend(csv.DictReader(f))
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, list(src_rows[0].keys()))
+        writer.writeheader()
+        for i in range(rows):
+            row = dict(src_rows[i % len(src_rows)])
+            row['cluster_name'] = f'cluster-{i}'
+            writer.writerow(row)
+
+
+# Invalid sources of truth, with the validator module to check them with
+INVALID_SOURCES = [
+    ('sources_of_truth/header_invalid.csv', None),
+    ('sources_of_truth/very_invalid.csv', None),
+    ('sources_of_truth/dupes_invalid.csv', None),
+    ('sources_of_truth/dupes_long_invalid.csv', None),
+    ('sources_of_truth/example/invalid.csv', 'models/example_model.py'),
+    ('sources_of_truth/cluster_registry/cluster_reg_sot_invalid.csv',
+     'models/cluster_registry.py'),
+    ('sources_of_truth/cluster_registry/'
+     'cluster_reg_sot_invalid_unknown_cols.csv', 'models/cluster_registry.py'),
+    ('sources_of_truth/cluster_registry/'
+     'cluster_reg_sot_invalid_whitespace.csv', 'models/cluster_registry.py'),
+    ('sources_of_truth/platform/platform_invalid.csv', 'models/platform.py'),
+    ('sources_of_truth/platform/platform_invalid_extra_cols.csv',
+     'models/platform.py'),
+]
+
+
 class TestCLI(TestCase):
     def test_empty_sot(self):
         r = exec_validator('sources_of_truth/empty.csv')
@@ -115,6 +167,61 @@ class TestCLI(TestCase):
 
         r.cleanup()
 
+    def test_sot_dupes_long_small_batches(self):
+        r = exec_validator('sources_of_truth/dupes_long_invalid.csv',
+                           extra_args=['--batch-size', '7'])
+
+        self.assertEqual(255, r.process.returncode, "wrong exit code")
+        dupes = re.findall("^ERROR.*not unique", r.stdout, flags=re.MULTILINE)
+        self.assertEqual(50, len(dupes), "mismatched number of dupes")
+        self.assertIn("CSV is invalid", r.stdout)
+        self.assertEqual("", r.stderr)
+        self.assertFalse(r.outfile.exists())
+
+        r.cleanup()
+
+    def test_sot_dupes_long_workers(self):
+        r = exec_validator('sources_of_truth/dupes_long_invalid.csv',
+                           extra_args=['--workers', '3'])
+
+        self.assertEqual(255, r.process.returncode, "wrong exit code")
+        dupes = re.findall("^ERROR.*not unique'",
+                           r.stdout, flags=re.MULTILINE)
+        self.assertEqual(50, len(dupes), "mismatched number of dupes")
+        self.assertIn("CSV is invalid", r.stdout)
+        self.assertEqual("", r.stderr)
+        self.assertFalse(r.outfile.exists())
+
+        r.cleanup()
+
+    def test_sot_dupes_long_memory_limit(self):
+        r = exec_validator('sources_of_truth/dupes_long_invalid.csv',
+                           extra_args=['--memory-limit', '1K'])
+
+        self.assertEqual(255, r.process.returncode, "wrong exit code")
+        dupes = re.findall("^ERROR.*not unique'",
+                           r.stdout, flags=re.MULTILINE)
+        self.assertEqual(50, len(dupes), "mismatched number of dupes")
+        self.assertIn("CSV is invalid", r.stdout)
+        self.assertEqual("", r.stderr)
+        self.assertFalse(r.outfile.exists())
+
+        r.cleanup()
+
+    def test_example_invalid_batch_size_one(self):
+        r = exec_validator('sources_of_truth/example/invalid.csv',
+                           'models/example_model.py',
+                           extra_args=['--batch-size', '1'])
+
+        self.assertEqual(255, r.process.returncode, "wrong exit code")
+        found = re.findall("^ERROR", r.stdout, flags=re.MULTILINE)
+        self.assertEqual(42, len(found))
+        self.assertIn("CSV is invalid", r.stdout)
+        self.assertEqual("", r.stderr)
+        self.assertFalse(r.outfile.exists())
+
+        r.cleanup()
+
     def test_example_valid(self):
         r = exec_validator('sources_of_truth/example/valid.csv',
                            'models/example_model.py')
@@ -307,3 +414,500 @@ class TestCLI(TestCase):
         self.assertTrue(r.outfile.exists())
 
         r.cleanup()
+
+    def test_validate_only(self):
+        for sot, model in INVALID_SOURCES:
+            with self.subTest(sot=sot):
+                full = exec_validator(sot, model)
+                only = exec_validator(sot, model, output=False)
+
+                self.assertNotEqual(0, only.process.returncode)
+                self.assertEqual(full.process.returncode,
+                                 only.process.returncode)
+                found = re.findall("^(?:ERROR|WARNING).*", only.stdout,
+                                   flags=re.MULTILINE)
+                self.assertTrue(found)
+                self.assertEqual(re.findall("^(?:ERROR|WARNING).*",
+                                            full.stdout, flags=re.MULTILINE),
+                                 found)
+                self.assertEqual("", only.stderr)
+
+                full.cleanup()
+                only.cleanup()
+
+    def test_workers_valid(self):
+        with tempfile.TemporaryDirectory() as t:
+            sot = f'{t}/valid.csv'
+            generate_sot(sot, ['sources_of_truth/example/valid.csv'], 5000)
+
+            seq = exec_validator(sot, 'models/example_model.py',
+                                 extra_args=['--workers', '1'])
+            par = exec_validator(sot, 'models/example_model.py',
+                                 extra_args=['--workers', '3'])
+
+            self.assertEqual(0, par.process.returncode, "wrong exit code")
+            self.assertEqual(seq.stdout, par.stdout)
+            self.assertEqual("", par.stderr)
+            # Rows are copied from the shards byte for byte, keeping their
+            # CRLF line endings
+            self.assertEqual(seq.outfile.read_bytes(),
+                             par.outfile.read_bytes())
+
+            seq.cleanup()
+            par.cleanup()
+
+    def test_workers_invalid(self):
+        with tempfile.TemporaryDirectory() as t:
+            sot = f'{t}/invalid.csv'
+            generate_sot(sot, ['sources_of_truth/example/valid.csv',
+                               'sources_of_truth/example/invalid.csv'], 5000)
+
+            seq = exec_validator(sot, 'models/example_model.py')
+            par = exec_validator(sot, 'models/example_model.py',
+                                 extra_args=['--workers', '3'])
+
+            self.assertEqual(255, par.process.returncode, "wrong exit code")
+            self.assertEqual(seq.stdout, par.stdout)
+            self.assertIn("CSV is invalid", par.stdout)
+            self.assertEqual("", par.stderr)
+            self.assertFalse(par.outfile.exists())
+
+            seq.cleanup()
+            par.cleanup()
+
+    def test_workers_duplicates(self):
+        with tempfile.TemporaryDirectory() as t:
+            sot = f'{t}/dupes.csv'
+            generate_sot(sot, ['sources_of_truth/example/valid.csv'], 5000)
+            # Every 250th row repeats the name of the row 100 rows before it
+            with open(sot, newline='') as f:
+                rows = list(csv.DictReader(f))
+            for i in range(250, len(rows), 250):
+                rows[i]['cluster_name'] = rows[i - 100]['cluster_name']
+            with open(sot, 'w', newline='') as f:
+                writer = csv.DictWriter(f, list(rows[0].keys()))
+                writer.writeheader()
+                writer.writerows(rows)
+
+            seq = exec_validator(sot, 'models/example_model.py')
+            par = exec_validator(sot, 'models/example_model.py',
+                                 extra_args=['--workers', '3'])
+
+            self.assertEqual(255, par.process.returncode, "wrong exit code")
+            dupes = re.findall("^ERROR.*not unique", seq.stdout,
+                               flags=re.MULTILINE)
+            self.assertEqual(19, len(dupes))
+            self.assertEqual(seq.stdout, par.stdout)
+
+            seq.cleanup()
+            par.cleanup()
+
+    def test_dictionary_encode_valid(self):
+        with tempfile.TemporaryDirectory() as t:
+            sot = f'{t}/valid.csv'
+            generate_sot(sot, ['sources_of_truth/example/valid.csv'], 2000)
+
+            plain = exec_validator(sot, 'models/example_model.py')
+            dict_enc = exec_validator(sot, 'models/example_model.py',
+                                      extra_args=['--dictionary-encode'])
+
+            self.assertEqual(0, dict_enc.process.returncode)
+            self.assertEqual(plain.stdout, dict_enc.stdout)
+            self.assertEqual("", dict_enc.stderr)
+            self.assertEqual(plain.outfile.read_text(),
+                             dict_enc.outfile.read_text())
+
+            plain.cleanup()
+            dict_enc.cleanup()
+
+    def test_dictionary_encode_invalid(self):
+        with tempfile.TemporaryDirectory() as t:
+            sot = f'{t}/invalid.csv'
+            generate_sot(sot, ['sources_of_truth/example/valid.csv',
+                               'sources_of_truth/example/invalid.csv'], 2000)
+
+            plain = exec_validator(sot, 'models/example_model.py')
+            dict_enc = exec_validator(
+                sot, 'models/example_model.py',
+                extra_args=['--dictionary-encode', '--batch-size', '7'])
+
+            self.assertEqual(255, dict_enc.process.returncode)
+            self.assertEqual(plain.stdout, dict_enc.stdout)
+            self.assertEqual("", dict_enc.stderr)
+            self.assertFalse(dict_enc.outfile.exists())
+
+            plain.cleanup()
+            dict_enc.cleanup()
+
+    @skipUnless(importlib.util.find_spec('pyarrow'), 'requires pyarrow')
+    def test_columnar_invalid(self):
+        with tempfile.TemporaryDirectory() as t:
+            sot = f'{t}/invalid.csv'
+            generate_sot(sot, ['sources_of_truth/platform/platform_valid.csv',
+                               'sources_of_truth/platform/platform_invalid.csv'],
+                         2000)
+
+            plain = exec_validator(sot, 'models/platform.py')
+            columnar = exec_validator(
+                sot, 'models/platform.py',
+                extra_args=['--columnar', '--batch-size', '7'])
+
+            self.assertEqual(255, columnar.process.returncode)
+            self.assertEqual(plain.stdout, columnar.stdout)
+            self.assertEqual("", columnar.stderr)
+            self.assertFalse(columnar.outfile.exists())
+
+            plain.cleanup()
+            columnar.cleanup()
+
+    @skipUnless(importlib.util.find_spec('pyarrow'), 'requires pyarrow')
+    def test_arrow_reader(self):
+        with tempfile.TemporaryDirectory() as t:
+            sot = f'{t}/invalid.csv'
+            generate_sot(sot, ['sources_of_truth/example/valid.csv',
+                               'sources_of_truth/example/invalid.csv'], 2000)
+
+            plain = exec_validator(sot, 'models/example_model.py')
+            arrow = exec_validator(sot, 'models/example_model.py',
+                                   extra_args=['--reader', 'arrow'])
+
+            self.assertEqual(255, arrow.process.returncode)
+            self.assertEqual(plain.stdout, arrow.stdout)
+            self.assertEqual("", arrow.stderr)
+
+            plain.cleanup()
+            arrow.cleanup()
+
+    def test_source_named_like_command(self):
+        with tempfile.TemporaryDirectory() as t:
+            for command in ('serve', 'batch'):
+                shutil.copyfile('sources_of_truth/platform/platform_valid.csv',
+                                f'{t}/{command}')
+                p = subprocess.run(
+                    [shutil.which('python3'), '-m', 'csv_validator', '-v',
+                     '-m', os.path.abspath('models/platform.py'), command],
+                    cwd=t, capture_output=True, text=True, check=False)
+
+                self.assertEqual(0, p.returncode, p.stdout)
+                self.assertIn("CSV is valid", p.stdout)
+
+    def test_max_errors_memory_limit(self):
+        # Duplicates found by the external sort come after the last row, so
+        # the error budget can't stop reading at them
+        for budget in (['--max-errors', '3'], ['--max-error-rate', '0.1']):
+            result = exec_validator(
+                'sources_of_truth/example/invalid.csv',
+                'models/example_model.py',
+                extra_args=[*budget, '--memory-limit', '1K'])
+
+            self.assertEqual(2, result.process.returncode)
+            self.assertIn('--max-errors and --max-error-rate are not used '
+                          'with --memory-limit', result.stderr)
+            result.cleanup()
+
+    def test_reports_without_level(self):
+        # Reports asked for by options are written at the default verbosity,
+        # without the WARNING label of its level
+        p = subprocess.run(
+            [shutil.which('python3'), '-m', 'csv_validator', '-m',
+             'models/example_model.py', '--summary', '--profile',
+             'sources_of_truth/example/invalid.csv'],
+            capture_output=True, text=True, check=False)
+
+        self.assertEqual(255, p.returncode)
+        lines = p.stdout.splitlines()
+        self.assertTrue(lines[0].startswith('Summary of '), lines[0])
+        self.assertTrue([line for line in lines
+                         if line.startswith('Profile of ')])
+        self.assertFalse([line for line in lines if 'WARNING' in line])
+
+    def test_lazy_imports(self):
+        # Neither --help nor invalid arguments import pydantic; see also
+        # benchmarks/startup.py
+        for args in (['--help'], ['no_such_file.csv']):
+            p = subprocess.run(
+                [shutil.which('python3'), '-X', 'importtime', '-m',
+                 'csv_validator', *args],
+                capture_output=True, text=True, check=False)
+            self.assertNotEqual('', p.stderr)
+            imported = [line.split('|')[-1].strip()
+                        for line in p.stderr.splitlines()
+                        if line.startswith('import time:')]
+            self.assertIn('csv_validator.arguments', imported)
+            self.assertNotIn('pydantic', imported)
+            self.assertNotIn('csv_validator.cli', imported)
+
+    def test_model_named_like_module(self):
+        # A model loaded from models/platform.py doesn't shadow the standard
+        # library's platform module, imported after it
+        p = subprocess.run(
+            [shutil.which('python3'), '-c',
+             'from csv_validator.loader import get_validator_module\n'
+             'get_validator_module("models/platform.py")\n'
+             'import platform\n'
+             'print(platform.system())'],
+            capture_output=True, text=True, check=False)
+        self.assertEqual('', p.stderr)
+        self.assertEqual(0, p.returncode)
+
+
+class TestCLIInProcess(TestCase):
+    def run_cli(self, cli):
+        logger = logging.getLogger('csv_validator.test')
+        with self.assertLogs(logger, level=logging.INFO) as logs:
+            rc = cli.run()
+        return rc, logs.output
+
+    def make_cli(self, sot, model=None, output=None, **kwargs):
+        return CLI(source=LazyFileType.default(sot), output=output, verbose=1,
+                   logger=logging.getLogger('csv_validator.test'), model=model,
+                   **kwargs)
+
+    def test_shared_model(self):
+        model = get_validator_module(
+            'models/cluster_registry.py').SourceOfTruthModel
+        for _ in range(3):
+            cli = self.make_cli(
+                'sources_of_truth/cluster_registry/cluster_reg_sot_valid.csv',
+                model)
+            rc, output = self.run_cli(cli)
+            self.assertEqual(0, rc, output)
+
+    def test_run_again(self):
+        cli = self.make_cli('sources_of_truth/dupes_invalid.csv')
+        for _ in range(2):
+            rc, output = self.run_cli(cli)
+            self.assertEqual(-1, rc)
+            dupes = [line for line in output if 'not unique' in line]
+            self.assertEqual(2, len(dupes), output)
+
+    def test_cache_dir(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            outputs = []
+            for _ in range(2):
+                cli = self.make_cli('sources_of_truth/dupes_long_invalid.csv',
+                                    cache_dir=cache_dir)
+                rc, output = self.run_cli(cli)
+                self.assertEqual(-1, rc)
+                outputs.append(output)
+
+            dupes = [line for line in outputs[1] if 'not unique' in line]
+            self.assertEqual(50, len(dupes), outputs[1])
+            self.assertEqual(outputs[0], outputs[1])
+
+    def test_cache_dir_closed(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cli = self.make_cli('sources_of_truth/dupes_long_invalid.csv',
+                                cache_dir=cache_dir)
+            rc, _ = self.run_cli(cli)
+            self.assertEqual(-1, rc)
+            # The write-ahead log is removed once the last connection to the
+            # row cache is closed
+            self.assertEqual([CACHE_FILE], [
+                f for f in os.listdir(cache_dir) if f.startswith(CACHE_FILE)])
+
+    def test_result_cache(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            cache_dir = os.path.join(tempdir, 'cache')
+            outfile = os.path.join(tempdir, 'output.csv')
+            runs = []
+            for sot in ['sources_of_truth/platform/platform_valid.csv'] * 2 \
+                    + ['sources_of_truth/platform/platform_invalid.csv'] * 2:
+                cli = self.make_cli(
+                    sot, get_validator_module(
+                        'models/platform.py').SourceOfTruthModel,
+                    output=LazyFileType.default(outfile, mode='w'),
+                    cache_dir=cache_dir)
+                rc, output = self.run_cli(cli)
+                content = None
+                if os.path.exists(outfile):
+                    content = pathlib.Path(outfile).read_text()
+                    os.remove(outfile)
+                runs.append((rc, output, content))
+
+            self.assertEqual(2, len(os.listdir(
+                os.path.join(cache_dir, 'results'))))
+
+        self.assertEqual(0, runs[0][0])
+        self.assertIsNotNone(runs[0][2])
+        self.assertEqual(runs[0], runs[1])
+        self.assertEqual(-1, runs[2][0])
+        self.assertIsNone(runs[2][2])
+        self.assertEqual(runs[2], runs[3])
+
+    def test_since(self):
+        with tempfile.TemporaryDirectory() as repo:
+            sot = os.path.join(repo, 'sot.csv')
+            with open('sources_of_truth/cluster_registry/'
+                      'cluster_reg_sot_valid.csv', encoding='utf-8') as f:
+                lines = f.readlines()
+            # An invalid row, which is presumed valid at the revision
+            invalid = lines[1].replace('US75911CLS01', 'not a cluster name')
+            pathlib.Path(sot).write_text(''.join(lines + [invalid]))
+            for args in (['init', '-q'], ['add', 'sot.csv'],
+                         ['commit', '-q', '-m', 'sot']):
+                subprocess.run(['git', '-c', 'user.name=test', '-c',
+                                'user.email=test@example.com', *args],
+                               cwd=repo, capture_output=True, check=True)
+            # A changed row, with the name of an unchanged one
+            changed = lines[2].replace('prod-us', 'prod-eu')
+            pathlib.Path(sot).write_text(''.join(lines + [changed]))
+
+            rc, output = self.run_cli(self.make_cli(
+                sot, get_validator_module(
+                    'models/cluster_registry.py').SourceOfTruthModel,
+                since='HEAD'))
+
+        self.assertEqual(-1, rc)
+        errors = [line for line in output if line.startswith('ERROR')]
+        self.assertEqual(1, len(errors), output)
+        self.assertIn('"us41273cls01 is not unique', errors[0])
+        self.assertIn('Line 16', errors[0])
+
+    def test_profile(self):
+        model = get_validator_module('models/platform.py').SourceOfTruthModel
+        with tempfile.TemporaryDirectory() as tempdir:
+            stats = os.path.join(tempdir, 'profile.pstats')
+            rc, output = self.run_cli(self.make_cli(
+                'sources_of_truth/platform/platform_valid.csv', model,
+                output=LazyFileType.default(
+                    os.path.join(tempdir, 'out.csv'), mode='w'),
+                profile_output=stats))
+            self.assertEqual(0, rc, output)
+            self.assertTrue(pstats.Stats(stats).total_calls)
+
+        profile = output[-1]
+        self.assertIn('Profile of', profile)
+        for stage in ('load model', 'parse rows', 'validate rows',
+                      'dump models', 'write output'):
+            self.assertIn(f'  {stage} ', profile)
+        # Validators within the field's type are timed too, once per address
+        self.assertRegex(
+            profile, r'dns_servers: AfterValidator\(validate_ipv4_address\)'
+                     r' +[0-9.]+ +28 ')
+
+    def test_slow_rows(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            sot = os.path.join(tempdir, 'sot.csv')
+            generate_sot(sot, ['sources_of_truth/platform/platform_valid.csv'],
+                         200)
+            with open(sot, newline='') as f:
+                rows = list(csv.DictReader(f))
+            # A slow row, with many DNS servers, and an invalid one after it
+            rows[99]['dns_servers'] = ','.join(
+                f'10.0.{i // 256}.{i % 256}' for i in range(8000))
+            rows[100]['cluster_name'] = 'x' * 40
+            with open(sot, 'w', newline='') as f:
+                writer = csv.DictWriter(f, list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+
+            rc, output = self.run_cli(self.make_cli(
+                sot, get_validator_module('models/platform.py')
+                .SourceOfTruthModel, slow_row_ms=10))
+
+        self.assertEqual(-1, rc)
+        logged = [line for line in output if 'Processed' not in line]
+        self.assertRegex(logged[0], r"^WARNING:[^:]+:Line 101, cluster "
+                                    r"cluster-99, slow row: validated in "
+                                    r"[0-9.]+ ms, longest in column "
+                                    r"'dns_servers'")
+        self.assertIn('Line 102', logged[1])
+        self.assertIn('Row latency of 200 rows in ms', output[-1])
+
+    def test_errors_ndjson(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            sot = os.path.join(tempdir, 'sot.csv')
+            generate_sot(sot, ['sources_of_truth/example/valid.csv',
+                               'sources_of_truth/example/invalid.csv'], 5000)
+            rc, logged = self.run_cli(self.make_cli(
+                sot, validator_module='models/example_model.py'))
+            self.assertEqual(-1, rc)
+            errors = [line for line in logged if line.startswith('ERROR')]
+
+            written = []
+            for workers in (1, 3):
+                path = os.path.join(tempdir, f'errors-{workers}.ndjson')
+                rc, output = self.run_cli(self.make_cli(
+                    sot, validator_module='models/example_model.py',
+                    workers=workers, errors_format='ndjson',
+                    errors_file=path))
+                self.assertEqual(-1, rc)
+                self.assertFalse(
+                    [line for line in output if line.startswith('ERROR')])
+                with open(path, encoding='utf-8') as f:
+                    written.append([json.loads(line) for line in f])
+
+        self.assertEqual(written[0], written[1])
+        self.assertEqual(len(errors), len(written[0]))
+        # Errors are written with the details of their log lines
+        first = written[0][0]
+        self.assertEqual(['line', 'cluster_name', 'column', 'type', 'message',
+                          'input'], list(first))
+        self.assertIn(f"Line {first['line']}, cluster {first['cluster_name']}"
+                      f", column '{first['column']}', error: "
+                      f"'{first['message']}'", errors[0])
+
+    def test_max_errors(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            sot = os.path.join(tempdir, 'sot.csv')
+            generate_sot(sot, ['sources_of_truth/example/valid.csv',
+                               'sources_of_truth/example/invalid.csv'], 5000)
+            rc, logged = self.run_cli(self.make_cli(
+                sot, validator_module='models/example_model.py'))
+            errors = [line.split(':', 2)[2] for line in logged
+                      if line.startswith('ERROR')]
+
+            outputs = []
+            for workers in (1, 3):
+                rc, output = self.run_cli(self.make_cli(
+                    sot, validator_module='models/example_model.py',
+                    workers=workers, max_errors=5))
+                self.assertEqual(-1, rc)
+                outputs.append(output)
+
+            # Reading stops after the row with the 5th error
+            line = re.match(r'Line (\d+),', errors[4]).group(1)
+            with open(sot, encoding='utf-8') as f:
+                reader = csv.DictReader(f)
+                examined = sum(1 for _ in reader
+                               if reader.line_num <= int(line))
+
+        stopped = [error for idx, error in enumerate(errors)
+                   if idx < 5 or error.startswith(f'Line {line},')]
+        for output in outputs:
+            self.assertEqual(stopped, [line.split(':', 2)[2] for line in output
+                                       if line.startswith('ERROR')])
+            self.assertRegex(output[-2], rf'Stopped reading on line {line}, '
+                                         rf'after {len(stopped)} errors; '
+                                         rf'examined {examined} rows')
+
+    def test_summary(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            sot = os.path.join(tempdir, 'sot.csv')
+            generate_sot(sot, ['sources_of_truth/example/valid.csv',
+                               'sources_of_truth/example/invalid.csv'], 5000)
+            rc, logged = self.run_cli(self.make_cli(
+                sot, validator_module='models/example_model.py'))
+            errors = [line for line in logged if line.startswith('ERROR')]
+
+            outputs = []
+            for workers in (1, 3):
+                rc, output = self.run_cli(self.make_cli(
+                    sot, validator_module='models/example_model.py',
+                    workers=workers, summary=True, summary_top=2))
+                self.assertEqual(-1, rc)
+                self.assertFalse(
+                    [line for line in output if line.startswith('ERROR')])
+                outputs.append(output[-2])
+
+        self.assertEqual(outputs[0], outputs[1])
+        summary = outputs[0].splitlines()
+        self.assertIn(f'Summary of {len(errors)} errors:', summary[0])
+        # Counts by column and error type add up to all errors
+        counts = []
+        for line in summary[2:]:
+            if line.split()[0] == 'column':
+                break
+            counts.append(int(line.split()[-1]))
+        self.assertEqual(len(errors), sum(counts))
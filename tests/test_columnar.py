@@ -0,0 +1,99 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import importlib.util
+from typing import Annotated
+from unittest import TestCase, skipUnless
+
+import pydantic
+
+from csv_validator.engine import BatchValidator, EncodingValidator
+from csv_validator.helpers import unique
+from csv_validator.model import BaseCluster
+from csv_validator.uniqueness import UniqueScope
+
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+
+def strip(v):
+    return v.strip()
+
+
+class Model(pydantic.BaseModel, str_strip_whitespace=True):
+    name: Annotated[
+        str, pydantic.StringConstraints(to_lower=True, max_length=5),
+        pydantic.AfterValidator(unique())]
+    code: str = pydantic.Field(pattern=r'^[A-Z]{2}\d$')
+    shout: Annotated[str, pydantic.StringConstraints(to_upper=True,
+                                                     min_length=2)] = 'HI'
+    word: Annotated[str, pydantic.StringConstraints(pattern=r'\bok\b')]
+    other: Annotated[str, pydantic.BeforeValidator(strip)]
+
+    @pydantic.field_validator('word')
+    @classmethod
+    def check_word(cls, v):
+        if v == 'not ok':
+            raise ValueError('not ok')
+        return v
+
+
+def summarise(errors):
+    return {idx: [(e['type'], e['loc'], e['msg'], e['input']) for e in errs]
+            for idx, errs in errors.items()}
+
+
+@skipUnless(HAS_PYARROW, 'requires pyarrow')
+class TestColumnarEncoder(TestCase):
+    def setUp(self):
+        # pylint: disable-next=import-outside-toplevel
+        from csv_validator.columnar import ColumnarEncoder
+        self.encoder = ColumnarEncoder
+
+    def test_keys(self):
+        self.assertEqual(['cluster_name'], self.encoder(BaseCluster).keys)
+        self.assertEqual(['name', 'code', 'shout', 'word'],
+                         self.encoder(Model).keys)
+
+    def test_validate(self):
+        rows = [
+            {'name': ' Ab ', 'code': 'XY1', 'word': 'is ok', 'other': ' x '},
+            {'name': 'ÀBC', 'code': 'XY2', 'shout': 'yo', 'word': 'ok',
+             'other': ''},
+            {'name': 'toolong', 'code': 'XY3', 'word': 'ok', 'other': ''},
+            {'name': 'c', 'code': 'xy4', 'word': 'ok', 'other': ''},
+            {'name': 'd', 'code': 'XY5\n', 'word': 'ok\t', 'other': ''},
+            {'name': 'e', 'code': 'XY6', 'shout': ' y ', 'word': 'ok',
+             'other': ''},
+            {'name': 'AB', 'code': 'XY7', 'word': 'okay', 'other': ''},
+            {'name': 'ab', 'code': 'XY8', 'word': 'not ok', 'other': ''},
+            {'name': 'f', 'code': None, 'word': 'ok', 'other': ''},
+            {'name': 'g ', 'code': 'XY9', 'word': ' ok ', 'other': ''},
+        ]
+        expected = BatchValidator(Model).validate(rows, UniqueScope())
+        models, errors = EncodingValidator(
+            Model, [self.encoder(Model)]).validate(rows, UniqueScope())
+
+        self.assertIsNone(models)
+        self.assertEqual(summarise(expected[1]), summarise(errors))
+
+        valid = [rows[i] for i in (0, 1, 4, 9)]
+        expected = BatchValidator(Model).validate(valid, UniqueScope())
+        models, errors = EncodingValidator(
+            Model, [self.encoder(Model)]).validate(valid, UniqueScope())
+        self.assertEqual({}, errors)
+        self.assertEqual([m.model_dump() for m in expected[0]],
+                         [m.model_dump() for m in models])
+        self.assertIsInstance(models[0], Model)
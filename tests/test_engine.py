@@ -0,0 +1,118 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+from typing import Annotated, Literal
+from unittest import TestCase
+
+import pydantic
+
+from csv_validator.engine import (BatchValidator, DictionaryEncoder,
+                                  EncodingValidator)
+from csv_validator.helpers import unique
+from csv_validator.model import BaseCluster
+from csv_validator.uniqueness import UniqueScope
+
+
+def lower(v):
+    return v.lower()
+
+
+class Model(pydantic.BaseModel):
+    name: Annotated[str, pydantic.AfterValidator(unique())]
+    colour: Annotated[Literal['red', 'blue'], pydantic.BeforeValidator(lower)]
+    size: Annotated[str, pydantic.BeforeValidator(lower)]
+    plain: str
+
+    @pydantic.field_validator('size')
+    @classmethod
+    def check_size(cls, v, info):
+        if v == 'huge' and info.data.get('colour') == 'red':
+            raise ValueError('too big for red')
+        return v
+
+
+def dictionary_validator(model):
+    return EncodingValidator(model, [DictionaryEncoder(model)])
+
+
+class TestDictionaryEncoder(TestCase):
+    def test_encoded_fields(self):
+        self.assertEqual(['cluster_tags'],
+                         DictionaryEncoder(BaseCluster).keys)
+        self.assertEqual(['colour'], DictionaryEncoder(Model).keys)
+
+    def test_before_model_validator(self):
+        class Cleaned(Model):
+            @pydantic.model_validator(mode='before')
+            @classmethod
+            def clean(cls, data):
+                return data
+
+        self.assertEqual([], DictionaryEncoder(Cleaned).keys)
+
+    def test_validate(self):
+        rows = [{'name': f'n{i}', 'colour': colour, 'size': size, 'plain': ''}
+                for i, (colour, size) in enumerate(
+                    [('Red', 'S'), ('RED', 'huge'), ('Blue', 'huge'),
+                     ('Red', 'S'), ('Green', 'S'), ('red', 'S')])]
+
+        models, errors = dictionary_validator(Model).validate(
+            rows, context=UniqueScope())
+
+        self.assertIsNone(models)
+        self.assertEqual({1, 4}, set(errors))
+        self.assertEqual('too big for red', errors[1][0]['ctx']['error'].args[0])
+        self.assertEqual(('colour',), errors[4][0]['loc'])
+
+        models, errors = dictionary_validator(Model).validate(
+            rows[:1] + rows[2:4], context=UniqueScope())
+        self.assertEqual({}, errors)
+        self.assertEqual(['red', 'blue', 'red'], [m.colour for m in models])
+        self.assertIsInstance(models[0], Model)
+
+
+class TestBatchValidator(TestCase):
+    rows = [{'name': 'a', 'colour': 'Red', 'size': 'huge', 'plain': ''},
+            {'name': 'a', 'colour': 'Blue', 'size': 'S'},
+            {'name': 'b', 'colour': 'Green', 'size': 'S', 'plain': ''}]
+
+    def test_validate_only(self):
+        validator = BatchValidator(Model, validate_only=True)
+        self.assertTrue(validator.validate_only)
+
+        models, errors = validator.validate(self.rows, context=UniqueScope())
+        _, expected = BatchValidator(Model).validate(
+            self.rows, context=UniqueScope())
+        self.assertIsNone(models)
+        self.assertEqual(
+            {idx: [(e['type'], e['loc']) for e in errs]
+             for idx, errs in expected.items()},
+            {idx: [(e['type'], e['loc']) for e in errs]
+             for idx, errs in errors.items()})
+
+        models, errors = validator.validate(
+            [{'name': 'a', 'colour': 'Red', 'size': 'S', 'plain': ''}],
+            context=UniqueScope())
+        self.assertEqual(([], {}), (models, errors))
+
+    def test_validate_only_after_model_validator(self):
+        class Checked(Model):
+            @pydantic.model_validator(mode='after')
+            def check(self):
+                return self
+
+        self.assertFalse(
+            BatchValidator(Checked, validate_only=True).validate_only)
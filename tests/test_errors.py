@@ -0,0 +1,78 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from csv_validator.errors import ErrorBudget, ErrorWriter
+
+
+class TestErrorWriter(TestCase):
+    def test_write(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            writer = ErrorWriter(os.path.join(tempdir, 'errors.ndjson'))
+            writer.open()
+            writer.write({'line': 2, 'input': {'10.0.0.2', '10.0.0.1'}})
+            writer.write({'line': 3, 'input': 'ünïcode'})
+            writer.close()
+            with open(writer.path, encoding='utf-8') as f:
+                lines = f.readlines()
+
+        self.assertEqual(2, writer.count)
+        self.assertEqual({'line': 2, 'input': ['10.0.0.1', '10.0.0.2']},
+                         json.loads(lines[0]))
+        self.assertIn('ünïcode', lines[1])
+
+
+class TestErrorBudget(TestCase):
+    def test_max_errors(self):
+        budget = ErrorBudget(max_errors=2)
+        budget.start('sources_of_truth/example/valid.csv')
+        budget.spend(5)
+        self.assertFalse(budget.spent)
+        self.assertFalse(budget.past(9))
+        # The rest of the row that spent the budget is still reported
+        budget.spend(9)
+        budget.spend(9)
+        self.assertEqual((True, 3), (budget.spent, budget.errors))
+        self.assertFalse(budget.past(9))
+        self.assertTrue(budget.past(10))
+        self.assertTrue(budget.past(None))
+
+    def test_count(self):
+        budget = ErrorBudget(max_errors=1)
+        budget.start('sources_of_truth/example/valid.csv')
+        budget.count([2, 3, 4])
+        budget.spend(6)
+        # Rows after the one that spent the budget aren't counted
+        budget.count([5, 6, 8, 9])
+        self.assertEqual(5, budget.rows)
+
+    def test_max_error_rate(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, 'sot.csv')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('cluster_name\n' + '\n'.join(
+                    f'cluster-{i}' for i in range(250)))
+            # More than 2.5 errors in 250 rows, or 10 errors
+            budget = ErrorBudget(max_error_rate=0.01)
+            budget.start(path)
+            self.assertEqual(3, budget.limit)
+            budget = ErrorBudget(max_errors=10, max_error_rate=0.1)
+            budget.start(path)
+            self.assertEqual(10, budget.limit)
@@ -0,0 +1,110 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import os
+import subprocess
+import tempfile
+from typing import Annotated
+from unittest import TestCase
+
+import pydantic
+
+from csv_validator.cache import row_digests
+from csv_validator.helpers import unique
+from csv_validator.incremental import PreviousRevision
+from csv_validator.loader import get_validator_module
+
+MODEL = '''
+from typing import Annotated
+
+import pydantic
+
+from csv_validator.helpers import unique
+
+
+class Model(pydantic.BaseModel):
+    name: Annotated[str, pydantic.AfterValidator(unique())]
+    size: int
+'''
+
+
+class Model(pydantic.BaseModel):
+    name: Annotated[str, pydantic.StringConstraints(to_lower=True),
+                    pydantic.AfterValidator(unique())]
+    size: int
+
+
+def git(repo, *args):
+    subprocess.run(['git', '-c', 'user.name=test', '-c',
+                    'user.email=test@example.com', *args],
+                   cwd=repo, capture_output=True, check=True)
+
+
+def write(repo, name, content):
+    with open(os.path.join(repo, name), 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+class TestPreviousRevision(TestCase):
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(tempdir.cleanup)
+        self.repo = tempdir.name
+        self.path = os.path.join(self.repo, 'sot.csv')
+        git(self.repo, 'init', '-q')
+        write(self.repo, 'sot.csv', 'name,size\nA,1\nb,2\nc,3\nc,3\n')
+        git(self.repo, 'add', 'sot.csv')
+        git(self.repo, 'commit', '-q', '-m', 'sot')
+
+    def test_lookup(self):
+        rows = [{'name': 'b', 'size': '2'}, {'name': 'A', 'size': '1'},
+                {'name': 'd', 'size': '4'}, {'name': 'c', 'size': '3'},
+                {'name': 'c', 'size': '3'}, {'name': 'c', 'size': '3'}]
+        previous = PreviousRevision(Model, 'HEAD')
+        self.assertEqual(4, previous.load(self.path, 'utf-8'))
+
+        # Reordered rows are unchanged, and repeated rows are unchanged as
+        # many times as they were at the revision
+        known = previous.lookup(rows, row_digests(rows))
+        self.assertEqual([[('name', 'b')], [('name', 'a')], None,
+                          [('name', 'c')], [('name', 'c')], None], known)
+        self.assertEqual((4, 2), (previous.hits, previous.misses))
+
+    def test_unsupported_model(self):
+        class Rewritten(Model):
+            @pydantic.field_validator('name', mode='before')
+            @classmethod
+            def strip(cls, value):
+                return value.strip()
+
+        with self.assertRaisesRegex(RuntimeError, 'on their own'):
+            PreviousRevision(Rewritten, 'HEAD').load(self.path, 'utf-8')
+
+    def test_model_changed(self):
+        write(self.repo, 'model.py', MODEL)
+        git(self.repo, 'add', 'model.py')
+        git(self.repo, 'commit', '-q', '-m', 'model')
+        model = get_validator_module(
+            os.path.join(self.repo, 'model.py')).Model
+        previous = PreviousRevision(model, 'HEAD~')
+        with self.assertRaisesRegex(RuntimeError, 'model has changed'):
+            previous.load(self.path, 'utf-8')
+        self.assertEqual(
+            4, PreviousRevision(model, 'HEAD').load(self.path, 'utf-8'))
+
+    def test_unknown_revision(self):
+        with self.assertRaisesRegex(RuntimeError, 'git show'):
+            PreviousRevision(Model, 'nothing').load(self.path, 'utf-8')
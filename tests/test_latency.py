@@ -0,0 +1,61 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+from unittest import TestCase
+
+from csv_validator.latency import LatencyHistogram, RowLatency
+from csv_validator.loader import get_validator_module
+
+
+class TestLatencyHistogram(TestCase):
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        # 1 µs to 10 ms
+        for micros in range(1, 10_001):
+            histogram.record(micros / 1e6, micros)
+
+        self.assertEqual(10_000, histogram.count)
+        self.assertEqual((0.01, 10_000), (histogram.max, histogram.max_line))
+        for fraction in (0.5, 0.9, 0.99):
+            # Within the precision of the buckets
+            self.assertAlmostEqual(fraction * 0.01,
+                                   histogram.percentile(fraction),
+                                   delta=fraction * 0.01 / 16)
+        self.assertEqual(0.01, histogram.percentile(1.0))
+        # Buckets grow logarithmically
+        self.assertLess(len(histogram.counts), 250)
+        self.assertRegex(histogram.summary(),
+                         r'^Row latency of 10000 rows in ms: p50 5\.[0-9]{3}, '
+                         r'p90 9\.[0-9]{3}, p99 10\.000, max 10\.000 on line '
+                         r'10000$')
+
+
+class TestRowLatency(TestCase):
+    def test_slowest_field(self):
+        model = get_validator_module('models/platform.py').SourceOfTruthModel
+        latency = RowLatency(slow_row_ms=10)
+        self.assertFalse(latency.record(0.001, 2))
+        self.assertTrue(latency.record(0.02, 3))
+
+        row = {'cluster_name': 'US75911CLS01', 'cluster_group': 'prod-us',
+               'cluster_tags': 'corp',
+               'dns_servers': ','.join(f'10.0.{i // 256}.{i % 256}'
+                                       for i in range(5000))}
+        # Values of unique fields aren't counted as seen
+        for _ in range(2):
+            field, seconds = latency.slowest_field(model, row)
+            self.assertEqual('dns_servers', field)
+            self.assertGreater(seconds, 0)
@@ -0,0 +1,54 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import subprocess
+import sys
+from unittest import TestCase
+
+SCRIPT = '''
+import logging
+import multiprocessing
+import sys
+
+from csv_validator.logs import flush_logs, setup_logger
+
+
+def child():
+    logging.getLogger().error('from child')
+
+
+logger = setup_logger(1)
+for i in range(25_000):
+    logger.info('record %d', i)
+logger.debug('not written %s', 'debug')
+flush_logs()
+sys.stdout.write('direct\\n')
+process = multiprocessing.get_context('fork').Process(target=child)
+process.start()
+process.join()
+logger.warning('last')
+'''
+
+
+class TestSetupLogger(TestCase):
+    def test_pipeline(self):
+        result = subprocess.run([sys.executable, '-c', SCRIPT],
+                                capture_output=True, text=True, check=True)
+        lines = result.stdout.splitlines()
+        # Records are written in order, once each, and all of them by exit
+        self.assertEqual([f'INFO    record {i}' for i in range(25_000)] +
+                         ['direct', 'ERROR   from child', 'WARNING last'],
+                         lines)
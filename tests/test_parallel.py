@@ -0,0 +1,97 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import csv
+import io
+import pathlib
+import tempfile
+from unittest import TestCase
+
+from csv_validator.parallel import ShardReader, plan_shards
+
+FIELDS = ['cluster_name', 'cluster_group', 'cluster_tags']
+
+
+def write_sot(path, rows):
+    # quotes inside an unquoted field are literal characters, so write these
+    # rows by hand rather than with `csv.writer`, which would quote them
+    with open(path, 'w', newline='') as f:
+        f.write(','.join(FIELDS) + '\r\n')
+        for row in rows:
+            f.write(','.join(row) + '\r\n')
+
+
+def read_shards(path, shards):
+    data = pathlib.Path(path).read_bytes()
+    rows = []
+    for shard in shards:
+        fp = io.TextIOWrapper(io.BytesIO(data[shard.start:shard.end]),
+                              encoding='utf-8')
+        reader = ShardReader(fp, FIELDS, shard.line_offset)
+        rows.extend((reader.line_num, row) for row in reader)
+    return rows
+
+
+def read_whole(path):
+    with open(path) as f:
+        reader = csv.DictReader(f, dialect='excel', strict=True)
+        return [(reader.line_num, row) for row in reader]
+
+
+class TestPlanShards(TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = f'{self.tempdir.name}/sot.csv'
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_quoted_newlines(self):
+        rows = []
+        for i in range(500):
+            tags = ['', '"a,b"', '"multi\nline"', '"he said ""hi""\n"'][i % 4]
+            group = 'literal"quote' if i % 3 else 'dev'
+            rows.append([f'cluster-{i}', group, tags])
+        write_sot(self.path, rows)
+
+        expected = read_whole(self.path)
+        for shard_count in (1, 2, 7, 50):
+            shards = plan_shards(self.path, shard_count, min_shard_size=1)
+            self.assertEqual(shard_count, len(shards))
+            self.assertTrue(shards[-1].last)
+            self.assertEqual(expected, read_shards(self.path, shards))
+
+    def test_escaped_quote_at_split(self):
+        # a quoted field starting with an escaped quote, so that some split
+        # points fall between its opening quote and an escaped quote
+        rows = [[f'cluster-{i}', 'dev', '"""a\nb"""'] for i in range(20)]
+        write_sot(self.path, rows)
+
+        expected = read_whole(self.path)
+        for shard_count in range(2, 120):
+            shards = plan_shards(self.path, shard_count, min_shard_size=1)
+            self.assertEqual(expected, read_shards(self.path, shards))
+
+    def test_min_shard_size(self):
+        write_sot(self.path, [[f'cluster-{i}', 'dev', ''] for i in range(100)])
+
+        shards = plan_shards(self.path, 8)
+        self.assertEqual(1, len(shards))
+
+    def test_header_only(self):
+        write_sot(self.path, [])
+
+        self.assertEqual([], plan_shards(self.path, 8, min_shard_size=1))
@@ -0,0 +1,107 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import json
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+from unittest import TestCase, skipUnless
+
+from csv_validator.arguments import parse_args
+from csv_validator.cli import run_validation
+from tests.test_cli import generate_sot
+
+# Set to run the performance tests, or to `update` to record their results
+# in the baseline file instead of checking them
+PERFORMANCE = os.environ.get('CSV_VALIDATOR_PERFORMANCE', '')
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'performance_baseline.json')
+
+ROWS = 100_000
+
+# Bundled models and a valid source of truth for each
+MODELS = {
+    'models/cluster_registry.py':
+        'sources_of_truth/cluster_registry/cluster_reg_sot_valid.csv',
+    'models/platform.py': 'sources_of_truth/platform/platform_valid.csv',
+    'models/example_model.py': 'sources_of_truth/example/valid.csv',
+}
+
+
+@skipUnless(PERFORMANCE, 'set CSV_VALIDATOR_PERFORMANCE to run')
+class TestPerformance(TestCase):
+    """Validates generated sources of `ROWS` rows for each bundled model in
+    this process, and checks the rows per second and the peak memory
+    allocated against the baseline file, within its tolerance"""
+
+    @classmethod
+    def setUpClass(cls):
+        with open(BASELINE, encoding='utf-8') as f:
+            cls.baseline = json.load(f)
+        cls.tempdir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        cls.sources = {}
+        for module, source in MODELS.items():
+            path = os.path.join(cls.tempdir.name, os.path.basename(source))
+            generate_sot(path, [source], ROWS)
+            cls.sources[module] = path
+        cls.logger = logging.getLogger('performance')
+        cls.logger.addHandler(logging.NullHandler())
+        cls.logger.propagate = False
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tempdir.cleanup()
+        if PERFORMANCE == 'update':
+            with open(BASELINE, 'w', encoding='utf-8') as f:
+                json.dump(cls.baseline, f, indent=2)
+                f.write('\n')
+
+    def validate(self, module):
+        args = parse_args([self.sources[module], '-m', module])
+        self.assertEqual(0, run_validation(args, self.logger))
+
+    def check(self, module, name, value, higher_is_better):
+        if PERFORMANCE == 'update':
+            self.baseline['models'].setdefault(module, {})[name] = value
+            return
+        expected = self.baseline['models'][module][name]
+        tolerance = self.baseline['tolerance']
+        if higher_is_better:
+            self.assertGreaterEqual(value, expected * (1 - tolerance), name)
+        else:
+            self.assertLessEqual(value, expected * (1 + tolerance), name)
+
+    def test_rows_per_second(self):
+        for module in MODELS:
+            with self.subTest(module):
+                start = time.perf_counter()
+                self.validate(module)
+                rows_per_second = ROWS / (time.perf_counter() - start)
+                self.check(module, 'rows_per_second', round(rows_per_second),
+                           True)
+
+    def test_peak_memory(self):
+        for module in MODELS:
+            with self.subTest(module):
+                tracemalloc.start()
+                try:
+                    self.validate(module)
+                    _, peak = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+                self.check(module, 'peak_memory', peak, False)
@@ -0,0 +1,64 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import time
+from typing import Annotated, Optional
+from unittest import TestCase
+
+import pydantic
+
+from csv_validator.helpers import IP, unique
+from csv_validator.profiling import Profiler
+from csv_validator.uniqueness import UniqueScope
+
+
+class Model(pydantic.BaseModel):
+    name: Annotated[str, pydantic.AfterValidator(unique())]
+    servers: Optional[set[IP]] = None
+    size: int = 0
+
+
+class TestProfiler(TestCase):
+    def test_nested_stages(self):
+        profiler = Profiler()
+        with profiler.stage('outer'):
+            with profiler.stage('inner'):
+                time.sleep(0.05)
+        self.assertGreaterEqual(profiler.stages['inner'], 0.05)
+        self.assertLess(profiler.stages['outer'], 0.05)
+
+    def test_profile_model(self):
+        profiler = Profiler()
+        profiled = profiler.profile_model(Model)
+        self.assertTrue(issubclass(profiled, Model))
+
+        context = UniqueScope()
+        row = {'name': 'a', 'servers': ['1.1.1.1', '10.0.0.0/8']}
+        self.assertEqual(
+            Model.model_validate(row, context=UniqueScope()).model_dump(),
+            profiled.model_validate(row, context=context).model_dump())
+        with self.assertRaisesRegex(pydantic.ValidationError, 'not unique'):
+            profiled.model_validate(row, context=context)
+
+        calls = {label: calls
+                 for label, (calls, _) in profiler.validators.items()}
+        self.assertEqual(
+            {'name: AfterValidator(unique.<locals>.nested)': 2,
+             'servers: AfterValidator(validate_ipv4_address)': 4}, calls)
+        profiler.reset()
+        self.assertEqual(0, profiler.validators['servers: AfterValidator('
+                                                'validate_ipv4_address)'][0])
+        self.assertNotIn('field validator', '\n'.join(profiler.report(1.0)))
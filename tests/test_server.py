@@ -0,0 +1,141 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import contextlib
+import csv
+import io
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+
+from csv_validator.cli import run_validation
+from csv_validator.arguments import parse_args
+from csv_validator.logs import LogFormatter
+from csv_validator.loader import ModelCache
+from csv_validator.server import ValidationServer, send_request
+
+
+def run_locally(argv):
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(LogFormatter())
+    logger = logging.Logger('csv_validator.test', logging.INFO)
+    logger.addHandler(handler)
+    rc = run_validation(parse_args(argv), logger)
+    return rc, stream.getvalue()
+
+
+class TestValidationServer(TestCase):
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()  # pylint: disable=R1732
+        self.addCleanup(tempdir.cleanup)
+        self.tempdir = tempdir.name
+        self.socket = os.path.join(self.tempdir, 'validate.sock')
+        self.server = ValidationServer(self.socket, run_validation)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def request(self, argv):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            rc = send_request(parse_args([*argv, '--socket', self.socket]),
+                              logging.getLogger('csv_validator.test'))
+        return rc, stdout.getvalue()
+
+    def test_same_as_cli(self):
+        for sot in ('platform_valid', 'platform_invalid'):
+            argv = ['-v', '-m', 'models/platform.py',
+                    f'sources_of_truth/platform/{sot}.csv']
+            self.assertEqual(run_locally(argv), self.request(argv))
+
+    def test_concurrent_requests(self):
+        results = [None] * 4
+
+        def request(idx):
+            sot = ('platform_valid', 'platform_invalid')[idx % 2]
+            results[idx] = self.request(
+                ['-m', 'models/platform.py',
+                 f'sources_of_truth/platform/{sot}.csv'])[0]
+
+        threads = [threading.Thread(target=request, args=(idx,))
+                   for idx in range(len(results))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([0, -1, 0, -1], results)
+
+    def test_workers(self):
+        # Workers of a request are started from a fork server rather than
+        # forked from the request's thread
+        sot = os.path.join(self.tempdir, 'sot.csv')
+        with open('sources_of_truth/example/valid.csv', newline='') as f:
+            rows = list(csv.DictReader(f))
+        with open(sot, 'w', newline='') as f:
+            writer = csv.DictWriter(f, list(rows[0].keys()))
+            writer.writeheader()
+            for i in range(2000):
+                writer.writerow({**rows[i % len(rows)],
+                                 'cluster_name': f'cluster-{i}'})
+
+        argv = ['-m', 'models/example_model.py', '--workers', '2', sot]
+        rc, stdout = self.request(['-vv', *argv])
+        self.assertEqual(0, rc)
+        self.assertRegex(stdout, r'Validating \d+ shards with 2 workers')
+        self.assertEqual(run_locally(['-v', *argv]),
+                         self.request(['-v', *argv]))
+
+    def test_output(self):
+        output = os.path.join(self.tempdir, 'output.csv')
+        rc, _ = self.request(['-m', 'models/platform.py', '-o', output,
+                              'sources_of_truth/platform/platform_valid.csv'])
+        self.assertEqual(0, rc)
+        self.assertTrue(os.path.exists(output))
+
+    def test_load_error(self):
+        rc, stdout = self.request(['-m', 'no_such_module',
+                                   'sources_of_truth/empty.csv'])
+        self.assertEqual(1, rc)
+        self.assertIn('Error dynamically loading validator', stdout)
+
+    def test_unreachable(self):
+        with self.assertLogs('csv_validator.test', logging.WARNING):
+            self.assertIsNone(send_request(
+                parse_args(['sources_of_truth/empty.csv', '--socket',
+                            os.path.join(self.tempdir, 'missing.sock')]),
+                logging.getLogger('csv_validator.test')))
+
+
+class TestModelCache(TestCase):
+    def test_reload(self):
+        logger = logging.getLogger('csv_validator.test')
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, 'model.py')
+            shutil.copyfile('models/platform.py', path)
+            models = ModelCache()
+            model = models.get(path, logger)
+            self.assertIs(model, models.get(path, logger))
+
+            # Loaded again once the module changes
+            os.utime(path, ns=(0, 0))
+            self.assertIsNot(model, models.get(path, logger))
+        self.assertIsNone(models.get(None, logger))
@@ -0,0 +1,76 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+import random
+from unittest import TestCase
+
+from csv_validator.summary import ErrorSummary, HeavyHitters
+
+
+class TestHeavyHitters(TestCase):
+    def test_frequent_values(self):
+        rng = random.Random(0)
+        # Two frequent values among 100000 distinct ones
+        stream = ['a'] * 3000 + ['b'] * 2000 + [str(i) for i in range(100_000)]
+        rng.shuffle(stream)
+        halves = HeavyHitters(50), HeavyHitters(50)
+        hitters = HeavyHitters(50)
+        for idx, value in enumerate(stream):
+            hitters.add(value)
+            halves[idx % 2].add(value)
+            self.assertLessEqual(len(hitters.counts), 50)
+
+        halves[0].merge(halves[1])
+        for sketch in (hitters, halves[0]):
+            (first, first_count), (second, second_count) = sketch.top(2)
+            self.assertEqual(('a', 'b'), (first, second))
+            # Counts are at most the stream's length / (capacity + 1) low
+            self.assertGreaterEqual(first_count, 3000 - len(stream) // 51)
+            self.assertLessEqual(first_count, 3000)
+            self.assertGreaterEqual(second_count, 2000 - len(stream) // 51)
+            self.assertTrue(sketch.approximate)
+            self.assertLessEqual(len(sketch.counts), 50)
+
+    def test_exact(self):
+        hitters = HeavyHitters(3)
+        for value in 'abacab':
+            hitters.add(value)
+        self.assertEqual([('a', 3), ('b', 2), ('c', 1)], hitters.top(5))
+        self.assertFalse(hitters.approximate)
+
+
+class TestErrorSummary(TestCase):
+    def test_report(self):
+        summary = ErrorSummary(top_values=1)
+        for value in ('x', 'y', 'y'):
+            summary.add('dns_servers', 'value_error', value)
+        shard = ErrorSummary(top_values=1)
+        shard.add('cluster_name', 'string_too_long', 'x' * 100)
+        summary.merge(shard.drain())
+        self.assertEqual(0, shard.errors)
+
+        report = summary.report()
+        self.assertEqual([
+            ['Summary', 'of', '4', 'errors:'],
+            ['column', 'error', 'type', 'errors'],
+            ['dns_servers', 'value_error', '3'],
+            ['cluster_name', 'string_too_long', '1'],
+            ['column', 'top', 'values', 'errors'],
+            ['cluster_name', f"'{'x' * 58}…", '1'],
+            ['dns_servers', "'y'", '2'],
+        ], [line.split() for line in report])
+        # Columns are aligned
+        self.assertEqual(1, len({len(line) for line in report[1:]}))
@@ -0,0 +1,86 @@
+###############################################################################
+# Copyright 2024 Google, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+###############################################################################
+from unittest import TestCase
+
+from csv_validator.uniqueness import UniqueIndex, UniqueValue, ValueIndex
+
+
+class Colliding(str):
+    """A str whose hash is the same as every other, so that all of them share
+    a fingerprint tag"""
+    __slots__ = ()
+
+    def __hash__(self):
+        return 42
+
+
+class TestValueIndex(TestCase):
+    def test_exact(self):
+        index = ValueIndex(threshold=100)
+        self.assertIsNone(index.add('a', 2))
+        self.assertIsNone(index.add('b', 3))
+        self.assertEqual(2, index.add('a', 4))
+        self.assertEqual(2, len(index))
+
+    def test_compact(self):
+        index = ValueIndex(threshold=100)
+        # enough values to write several blocks to the spill file
+        for i in range(50000):
+            self.assertIsNone(index.add(f'cluster-{i:030d}', i + 2))
+        for i in range(0, 50000, 997):
+            self.assertEqual(i + 2, index.add(f'cluster-{i:030d}', 0))
+        self.assertIsNone(index.add('cluster-new', 0))
+        self.assertEqual(50001, len(index))
+
+    def test_tag_collisions(self):
+        index = ValueIndex(threshold=0)
+        for i in range(200):
+            self.assertIsNone(index.add(Colliding(f'cluster-{i}'), i + 2))
+        for i in range(200):
+            self.assertEqual(i + 2, index.add(Colliding(f'cluster-{i}'), 0))
+        self.assertEqual(200, len(index))
+
+
+def unique_values(names, first_line=2):
+    return [UniqueValue(field='cluster_name', value=name, line=line,
+                        input=name, cluster_name=name)
+            for line, name in enumerate(names, first_line)]
+
+
+class TestUniqueIndex(TestCase):
+    def test_in_memory(self):
+        index = UniqueIndex()
+        dupes = index.find_duplicates(unique_values(['a', 'b', 'a']))
+        dupes += index.find_duplicates(unique_values(['b', 'c'], 5))
+
+        self.assertEqual([4, 5], [d.value.line for d in dupes])
+        self.assertFalse(index.spilled)
+        self.assertEqual([], index.finish())
+
+    def test_memory_limit(self):
+        names = [f'cluster-{i % 700}' for i in range(1000)]
+        # with a one byte limit, every value after the first batch goes to a
+        # run of its own, so that the runs are merged in more than one pass
+        index = UniqueIndex(memory_limit=1)
+        dupes = index.find_duplicates(unique_values(names[:100]))
+        self.assertTrue(index.spilled)
+        dupes += index.find_duplicates(unique_values(names[100:], 102))
+        dupes += index.finish()
+
+        self.assertEqual(list(range(702, 1002)),
+                         [d.value.line for d in dupes])
+        self.assertEqual('cluster-0', dupes[0].value.input)